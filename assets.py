@@ -0,0 +1,92 @@
+"""
+Shared textures for the sprites of the game.
+
+Every texture the game can show is loaded once, before the game starts, and
+then handed out as the same Texture object to every sprite that uses it.
+The hit and miss counters show whether anything still had to be loaded
+during gameplay; after preload() misses should stay at zero.
+"""
+
+import glob
+
+import arcade
+
+from constants import (
+    PLAYER_NORMAL_GRAPHICS, PLAYER_TAKING_DAMAGE_GRAPHICS,
+    LIFE_UP_GRAPHICS, SCORE_UP_GRAPHICS, PLAYER_SHOT_GRAPHICS, UFO_GRAPHICS,
+    FIRE_GRAPHICS, SHIELD_GRAPHICS,
+)
+from obstacle_field import OBSTACLE_TYPES
+
+PLAYER_SHIP_GRAPHICS = sorted(glob.glob("images/playerShip*.png"))
+PILL_GRAPHICS = sorted(glob.glob("images/Power-ups/pill_*.png"))
+
+# the sprites are only drawn, collisions use the hit boxes of hitboxes.py,
+# so arcade does not need to trace the outline of every texture
+HIT_BOX_ALGORITHM = "None"
+
+
+def game_graphics():
+    """
+    Paths of every image the game can show
+    """
+    paths = [info["graphics"] for info in OBSTACLE_TYPES.values()]
+    paths += PLAYER_SHIP_GRAPHICS + PILL_GRAPHICS + UFO_GRAPHICS + FIRE_GRAPHICS + SHIELD_GRAPHICS
+    paths += [
+        PLAYER_NORMAL_GRAPHICS, PLAYER_TAKING_DAMAGE_GRAPHICS,
+        LIFE_UP_GRAPHICS, SCORE_UP_GRAPHICS, PLAYER_SHOT_GRAPHICS,
+    ]
+    # keep the order, drop duplicates
+    return list(dict.fromkeys(paths))
+
+
+class AssetRegistry:
+    """
+    Cache of loaded textures, keyed by image path
+    """
+
+    def __init__(self):
+        self.textures = {}
+        # lookups answered from the cache and lookups that had to load
+        self.hits = 0
+        self.misses = 0
+
+    def preload(self, paths=None):
+        """
+        Load the given images, by default every image the game can show.
+
+        Preloading does not count as hits or misses.
+        """
+        if paths is None:
+            paths = game_graphics()
+        for path in paths:
+            if path not in self.textures:
+                self.textures[path] = arcade.load_texture(path, hit_box_algorithm=HIT_BOX_ALGORITHM)
+
+    def texture(self, path):
+        """
+        The shared texture of an image, loading it on a miss
+        """
+        texture = self.textures.get(path)
+        if texture is None:
+            self.misses += 1
+            texture = arcade.load_texture(path, hit_box_algorithm=HIT_BOX_ALGORITHM)
+            self.textures[path] = texture
+        else:
+            self.hits += 1
+        return texture
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        return {
+            "textures": len(self.textures),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# the registry every sprite of the game takes its textures from
+registry = AssetRegistry()
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the game, run them from the repository root, for example
+
+    python -m benchmarks.collisions
+"""
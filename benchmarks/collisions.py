@@ -0,0 +1,155 @@
+"""
+Cost of the player collision query as the number of obstacles grows.
+
+Compares the arcade.check_for_collision_with_list path the game used to
+take, a brute force test over the whole ObstacleField and the spatial hash
+broad phase. The grid query only grows with the number of obstacles near
+the player, which still rises with the obstacle count here because the
+screen does not get any bigger. The hit box column is the grid query
+followed by the exact test against the cached, rotated hit boxes the game
+uses, with rotating obstacles and player. Run from the repository root:
+
+    python -m benchmarks.collisions
+"""
+
+import argparse
+import time
+
+import arcade
+import numpy as np
+
+from constants import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, SPRITE_SCALING, OBSTACLE_SPEED, PLAYER_NORMAL_GRAPHICS, HIT_BOX_ANGLE_STEP,
+)
+from hitboxes import hit_box_cache
+from obstacle_field import ObstacleField, OBSTACLE_TYPES
+from simulation import PlayerState
+
+COUNTS = [65, 250, 1000, 2500, 10000]
+
+
+def time_per_call(function, repeat):
+    """
+    Average seconds per call of function
+    """
+    start = time.perf_counter()
+    for i in range(repeat):
+        function(i)
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_field(count, use_spatial_hash, repeat, seed):
+    """
+    Seconds per query, seconds per grid update and candidates per query
+    for a field of count obstacles
+    """
+    field = ObstacleField(seed=seed, use_spatial_hash=use_spatial_hash)
+    field.spawn(count, speed=OBSTACLE_SPEED)
+    player = PlayerState(field.timers)
+    rng = np.random.default_rng(seed)
+    points = np.column_stack((
+        rng.uniform(0, SCREEN_WIDTH, repeat), rng.uniform(0, SCREEN_HEIGHT, repeat)
+    )).tolist()
+
+    def query(i):
+        x, y = points[i]
+        field.colliding(x, y, player.radius, harmful_only=True)
+
+    query_time = time_per_call(query, repeat)
+    candidates = sum(len(field.nearby(x, y, player.radius)) for x, y in points) / repeat
+
+    update_time = None
+    if use_spatial_hash:
+        # cost of keeping the grid up to date as the obstacles move
+        def move(i):
+            field.spatial_hash.move(field.center_x[:field.size], field.center_y[:field.size])
+            field.center_x[:field.size] += field.change_x[:field.size]
+            field.center_y[:field.size] += field.change_y[:field.size]
+
+        field.update(1 / 60)
+        update_time = time_per_call(move, repeat)
+
+    return query_time, update_time, candidates
+
+
+def bench_hit_boxes(count, repeat, seed, angle_step):
+    """
+    Seconds per hit box query, turning the player and the obstacles a bit
+    between queries
+    """
+    field = ObstacleField(seed=seed)
+    field.spawn(count, speed=OBSTACLE_SPEED)
+    hit_boxes = hit_box_cache(angle_step)
+    reach = hit_boxes.reach(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING)
+    rng = np.random.default_rng(seed)
+    points = np.column_stack((
+        rng.uniform(0, SCREEN_WIDTH, repeat), rng.uniform(0, SCREEN_HEIGHT, repeat), rng.uniform(0, 360, repeat)
+    )).tolist()
+    # fill the caches before timing
+    field.colliding_hit_box(0, 0, *hit_boxes.polygon(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING, 0), reach, hit_boxes)
+
+    def query(i):
+        x, y, angle = points[i]
+        field.angle[:field.size] += 1
+        polygon, normals = hit_boxes.polygon(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING, angle)
+        field.colliding_hit_box(x, y, polygon, normals, reach, hit_boxes)
+
+    return time_per_call(query, repeat)
+
+
+def bench_arcade(count, repeat, seed):
+    """
+    Seconds per arcade.check_for_collision_with_list call
+    """
+    rng = np.random.default_rng(seed)
+    obstacle_list = arcade.SpriteList()
+    for i in range(count):
+        type = int(rng.integers(1, len(OBSTACLE_TYPES) + 1))
+        sprite = arcade.Sprite(OBSTACLE_TYPES[type]["graphics"], SPRITE_SCALING * int(rng.integers(4, 10)))
+        sprite.center_x = rng.uniform(0, SCREEN_WIDTH)
+        sprite.center_y = rng.uniform(0, SCREEN_HEIGHT)
+        obstacle_list.append(sprite)
+    player = arcade.Sprite(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING)
+    points = np.column_stack((
+        rng.uniform(0, SCREEN_WIDTH, repeat), rng.uniform(0, SCREEN_HEIGHT, repeat)
+    )).tolist()
+
+    def query(i):
+        player.position = points[i]
+        # method 3 checks every sprite, the GPU method needs a window
+        arcade.check_for_collision_with_list(player, obstacle_list, method=3)
+
+    return time_per_call(query, repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=500, help="queries per measurement")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--skip-arcade", action="store_true", help="leave out the slow arcade baseline")
+    parser.add_argument("--angle-step", type=float, default=HIT_BOX_ANGLE_STEP, help="degrees between hit box rotations")
+    args = parser.parse_args()
+
+    print("{:>9} {:>12} {:>12} {:>12} {:>12} {:>14} {:>11}".format(
+        "obstacles", "arcade us", "brute us", "grid us", "hit box us", "grid move us", "candidates"
+    ))
+    for count in COUNTS:
+        arcade_time = None
+        if not args.skip_arcade:
+            arcade_time = bench_arcade(count, max(args.repeat // 10, 10), args.seed)
+        brute_time, _, _ = bench_field(count, False, args.repeat, args.seed)
+        grid_time, move_time, candidates = bench_field(count, True, args.repeat, args.seed)
+        hit_box_time = bench_hit_boxes(count, args.repeat, args.seed, args.angle_step)
+        print("{:>9} {:>12} {:>12.1f} {:>12.1f} {:>12.1f} {:>14.1f} {:>11.1f}".format(
+            count,
+            "-" if arcade_time is None else "{:.1f}".format(arcade_time * 1e6),
+            brute_time * 1e6,
+            grid_time * 1e6,
+            hit_box_time * 1e6,
+            move_time * 1e6,
+            candidates,
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""
+Parity check between the two training environments.
+
+VectorGameEnv reimplements the rules of the game in arrays, GameEnv runs
+the game's own simulation. First the player of a VectorGameEnv is put at
+random spots next to the obstacles of a game, coming from up to three
+steps away, and every spot where the env and the simulation disagree
+about whether it touched one on the way there is a mismatch. Then both play random games at several step rates, and how
+long the games last, how often the player gets hit and how many power
+ups it picks are compared. The two draw from different random streams,
+so single games differ, but averaged over enough of them they must agree.
+
+Exits with an error on any mismatch, or if an average is further apart
+than the tolerance plus three standard errors of the difference, rare
+things like power ups need many games to tell. Run from the repository
+root:
+
+    python -m benchmarks.env_parity
+    python -m benchmarks.env_parity --games 300 --rates 60 30
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from constants import SPRITE_SCALING, PLAYER_NORMAL_GRAPHICS, PLAYER_SPEED_X, SWEEP_MIN_MOVE
+from env import GameEnv, VectorGameEnv, NUMBER_OF_ACTIONS, NEAREST_OBSTACLES
+from obstacle_field import MAX_OBSTACLE_STEP
+from simulation import GameSimulation, InputState
+
+RATES = [60, 30]
+# largest difference allowed between the means of the two envs, as a fraction of GameEnv's
+TOLERANCE = 0.15
+# steps a game is played before the player is placed, for the obstacles to turn harmful and spin
+WARM_UP = 200
+SQRT_2 = np.sqrt(2)
+
+
+def mismatches(samples, seed):
+    """
+    Spots out of samples where VectorGameEnv and GameSimulation disagree
+    about whether the player touches a harmful obstacle
+    """
+    simulation = GameSimulation(seed=seed)
+    simulation.step(1 / 60, InputState(action=True))
+    for _ in range(WARM_UP):
+        simulation.step(1 / 60)
+    field = simulation.obstacles
+    hit_boxes = simulation.hit_boxes
+    n = field.size
+
+    # one game with the simulation's obstacles
+    env = VectorGameEnv(1, seed=seed, max_obstacles=max(n, NEAREST_OBSTACLES))
+    reach = hit_boxes.reach(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING)
+    env.x[0, :n] = field.center_x[:n]
+    env.y[0, :n] = field.center_y[:n]
+    env.angle[0, :n] = field.angle[:n]
+    env.change_x[0, :n] = field.change_x[:n]
+    env.change_y[0, :n] = field.change_y[:n]
+    env.shape[0, :n] = hit_boxes.obstacle_shapes(field.type[:n], field.scale[:n])
+    env.bound_squared[0, :n] = (field.reach[:n] + reach) ** 2
+    candidates = (field.alive[:n] & ~field.is_harmless[:n])[None, :]
+    simulation.close()
+
+    harmful = np.flatnonzero(candidates[0])
+    rng = np.random.default_rng(seed)
+    found = 0
+    for _ in range(samples):
+        # somewhere the bounding circles of the player and a harmful obstacle overlap
+        near = harmful[rng.integers(len(harmful))]
+        distance = rng.uniform(0, field.reach[near] + reach)
+        direction = rng.uniform(0, 2 * np.pi)
+        x = field.center_x[near] + distance * np.cos(direction)
+        y = field.center_y[near] + distance * np.sin(direction)
+        angle = rng.uniform(-180, 180)
+        # coming from somewhere up to three steps away, at up to 30 steps/s
+        # the player moves far enough to be swept
+        steps = int(rng.integers(1, 4))
+        distance = rng.uniform(0, PLAYER_SPEED_X * SQRT_2 * steps)
+        direction = rng.uniform(0, 2 * np.pi)
+        start_x = x - distance * np.cos(direction)
+        start_y = y - distance * np.sin(direction)
+
+        # as GameSimulation._check_for_collisions
+        points, normals = hit_boxes.polygon(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING, angle)
+        if distance + MAX_OBSTACLE_STEP * steps >= SWEEP_MIN_MOVE:
+            hits = field.sweeping_hit_box(
+                start_x, start_y, x, y, points, normals, reach, hit_boxes, steps, harmful_only=True,
+            )
+        else:
+            hits = field.colliding_hit_box(x, y, points, normals, reach, hit_boxes, harmful_only=True)
+        env.player_x[0] = x
+        env.player_y[0] = y
+        env.player_angle[0] = angle
+        got = env._colliding(candidates, np.array([start_x]), np.array([start_y]), steps)[0]
+        found += bool(got) != (len(hits) > 0)
+    return found
+
+
+def play_single(games, rate, seed):
+    """
+    Seconds played, hits taken and power ups picked in each of games
+    games of GameEnv
+    """
+    rng = np.random.default_rng(seed)
+    env = GameEnv(delta_time=1 / rate)
+    results = []
+    for game in range(games):
+        env.reset(seed=seed + game)
+        simulation = env.simulation
+        damage_events = simulation.damage_events
+        power_ups_picked = simulation.power_ups_picked
+        steps = 0
+        done = False
+        while not done:
+            _, _, done, _ = env.step(int(rng.integers(NUMBER_OF_ACTIONS)))
+            steps += 1
+        results.append((
+            steps / rate, simulation.damage_events - damage_events, simulation.power_ups_picked - power_ups_picked,
+        ))
+    env.close()
+    return np.array(results)
+
+
+def play_vector(games, rate, seed):
+    """
+    The same for games games of VectorGameEnv, played all at once. Only
+    the first game of every env counts: the first games to end of a
+    longer run would be the short ones.
+    """
+    rng = np.random.default_rng(seed)
+    env = VectorGameEnv(games, seed=seed, delta_time=1 / rate)
+    env.reset()
+    damage_events = np.zeros(games, dtype=np.int64)
+    power_ups_picked = np.zeros(games, dtype=np.int64)
+    results = np.zeros((games, 3))
+    playing = np.ones(games, dtype=bool)
+    while playing.any():
+        _, _, dones, infos = env.step(rng.integers(0, NUMBER_OF_ACTIONS, games))
+        damage_events += infos["damaged"]
+        power_ups_picked += infos["power_ups_picked"]
+        ended = dones & playing
+        results[ended, 0] = infos["final_steps"][ended] / rate
+        results[ended, 1] = damage_events[ended]
+        results[ended, 2] = power_ups_picked[ended]
+        playing &= ~dones
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--games", type=int, default=200, help="games played in every env at every rate")
+    parser.add_argument("--samples", type=int, default=20000, help="spots the player is placed at")
+    parser.add_argument("--rates", type=int, nargs="+", default=RATES, help="steps per second")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    found = mismatches(args.samples, args.seed)
+    print("{} of {} spots next to obstacles where the envs disagree about a hit".format(found, args.samples))
+
+    print("{:>5} {:<20} {:>10} {:>14} {:>10}".format("rate", "per game", "GameEnv", "VectorGameEnv", "difference"))
+    apart = []
+    for rate in args.rates:
+        single = play_single(args.games, rate, args.seed)
+        vector = play_vector(args.games, rate, args.seed)
+        for column, name in enumerate(("seconds", "hits", "power ups")):
+            expected = single[:, column].mean()
+            got = vector[:, column].mean()
+            difference = (got - expected) / expected
+            error = np.hypot(single[:, column].std(), vector[:, column].std()) / np.sqrt(args.games)
+            print("{:>5} {:<20} {:>10.2f} {:>14.2f} {:>+9.0%}".format(rate, name, expected, got, difference))
+            if abs(got - expected) > args.tolerance * expected + 3 * error:
+                apart.append("{} at {} steps/s".format(name, rate))
+
+    failed = False
+    if found:
+        print("the envs do not collide the same")
+        failed = True
+    if apart:
+        print("the envs are further apart than {:.0%} in: {}".format(args.tolerance, ", ".join(apart)))
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("the envs collide the same and agree within {:.0%}".format(args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
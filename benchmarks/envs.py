@@ -0,0 +1,60 @@
+"""
+Aggregate steps per second of the training environments.
+
+Steps GameEnv, one game at a time, and VectorGameEnv at several batch
+sizes with random actions and prints the environment steps per second
+summed over all games. Run from the repository root:
+
+    python -m benchmarks.envs
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from env import GameEnv, VectorGameEnv, NUMBER_OF_ACTIONS
+
+BATCH_SIZES = [1, 16, 64, 256, 1024]
+
+
+def bench_single(steps, seed):
+    env = GameEnv(seed=seed)
+    env.reset()
+    actions = np.random.default_rng(seed).integers(0, NUMBER_OF_ACTIONS, steps).tolist()
+    start = time.perf_counter()
+    for action in actions:
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+    elapsed = time.perf_counter() - start
+    env.close()
+    return steps / elapsed
+
+
+def bench_vector(num_envs, steps, seed):
+    env = VectorGameEnv(num_envs, seed=seed)
+    env.reset()
+    actions = np.random.default_rng(seed).integers(0, NUMBER_OF_ACTIONS, (steps, num_envs))
+    start = time.perf_counter()
+    for step_actions in actions:
+        env.step(step_actions)
+    return steps * num_envs / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--steps", type=int, default=1000, help="steps of every env")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:>14} {:>8} {:>14}".format("env", "games", "env steps/s"))
+    print("{:>14} {:>8} {:>14.0f}".format("GameEnv", 1, bench_single(args.steps, args.seed)))
+    for num_envs in BATCH_SIZES:
+        print("{:>14} {:>8} {:>14.0f}".format(
+            "VectorGameEnv", num_envs, bench_vector(num_envs, args.steps, args.seed)
+        ))
+
+
+if __name__ == "__main__":
+    main()
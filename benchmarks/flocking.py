@@ -0,0 +1,80 @@
+"""
+Cost of steering a flock of UFOs as it grows.
+
+Steers flocks of a growing number of UFOs chasing a moving target and
+prints the time per steering step with neighbors found through the grid
+and, for the smaller flocks, by testing every UFO against every other one.
+The flocks first steer for a while so they have bunched up like they do in
+the game. Run from the repository root:
+
+    python -m benchmarks.flocking
+    python -m benchmarks.flocking --counts 100 1000 10000 --brute-limit 0
+"""
+
+import argparse
+import math
+
+from benchmarks.collisions import time_per_call
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT
+from enemies import Flock
+
+COUNTS = [50, 100, 250, 500, 1000, 2500, 5000]
+DELTA_TIME = 1 / 60
+
+
+def target(i):
+    """
+    A target circling the middle of the screen like a dodging player
+    """
+    angle = i * DELTA_TIME
+    return (
+        SCREEN_WIDTH / 2 + math.cos(angle) * SCREEN_WIDTH / 4,
+        SCREEN_HEIGHT / 2 + math.sin(angle) * SCREEN_HEIGHT / 4,
+    )
+
+
+def bench_flock(count, use_grid, repeat, warmup, seed):
+    """
+    Seconds per steering step and neighbors per UFO for a flock of count
+    """
+    flock = Flock(capacity=count, seed=seed, use_grid=use_grid)
+    flock.spawn(count)
+    for i in range(warmup):
+        flock.steer(*target(i), DELTA_TIME)
+
+    pairs = []
+
+    def step(i):
+        flock.steer(*target(warmup + i), DELTA_TIME)
+        pairs.append(flock.neighbor_pairs)
+
+    seconds = time_per_call(step, repeat)
+    return seconds, sum(pairs) / len(pairs) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=COUNTS, help="flock sizes")
+    parser.add_argument("--repeat", type=int, default=100, help="steps per measurement")
+    parser.add_argument("--warmup", type=int, default=120, help="steps before measuring")
+    parser.add_argument("--brute-limit", type=int, default=1000, help="largest flock to brute force")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:>6} {:>12} {:>12} {:>14} {:>10}".format("ufos", "grid us", "brute us", "grid us/ufo", "neighbors"))
+    for count in args.counts:
+        grid_time, neighbors = bench_flock(count, True, args.repeat, args.warmup, args.seed)
+        brute_time = None
+        if count <= args.brute_limit:
+            brute_time, _ = bench_flock(count, False, args.repeat, args.warmup, args.seed)
+        print("{:>6} {:>12.1f} {:>12} {:>14.2f} {:>10.1f}".format(
+            count,
+            grid_time * 1e6,
+            "-" if brute_time is None else "{:.1f}".format(brute_time * 1e6),
+            grid_time * 1e6 / count,
+            neighbors,
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+The load governor holding a long game within the frame budget.
+
+Plays a game that never ends through many levels, once without and once
+with a LoadGovernor, and prints the obstacles on the field and the load
+every few seconds of game time. Updates are timed for real. There is no
+window to draw, so drawing is modelled as a fixed cost per obstacle. Run
+from the repository root:
+
+    python -m benchmarks.governor
+    python -m benchmarks.governor --draw-cost 40 --seconds 60
+
+The defaults play far enough into the game and draw slowly enough for the
+load to go over budget without the governor.
+"""
+
+import argparse
+import time
+
+from benchmarks.run import DELTA_TIME, start_game
+from governor import LoadGovernor
+from simulation import GameSimulation
+
+
+def play(seconds, draw_cost, seed, report_every, governor=None):
+    simulation = GameSimulation(seed=seed)
+    start_game(simulation)
+    frame_budget = DELTA_TIME
+    over_budget = 0
+    steps = int(seconds / DELTA_TIME)
+
+    print("{:>6} {:>6} {:>8} {:>10} {:>6}  {}".format("time", "level", "wanted", "obstacles", "load", "state"))
+    for step in range(steps):
+        if governor is not None:
+            governor.apply(simulation, DELTA_TIME)
+        start = time.perf_counter()
+        simulation.step(DELTA_TIME)
+        update_time = time.perf_counter() - start
+        draw_time = len(simulation.obstacles) * draw_cost
+        if update_time + draw_time > frame_budget:
+            over_budget += 1
+
+        if governor is not None:
+            governor.record_update(update_time)
+            governor.record_draw(draw_time)
+            load = governor.load
+            state = governor.state
+        else:
+            load = (update_time + draw_time) / frame_budget
+            state = "-"
+        if (step + 1) % int(report_every / DELTA_TIME) == 0:
+            print("{:>6.0f} {:>6} {:>8} {:>10} {:>6.2f}  {}".format(
+                (step + 1) * DELTA_TIME, simulation.current_level, simulation.number_of_obstacles,
+                len(simulation.obstacles), load, state,
+            ))
+
+    simulation.close()
+    print("frames over budget: {} of {}".format(over_budget, steps))
+    if governor is not None:
+        print("time limited: {:.1f} s".format(governor.limited_time))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=150, help="game time to play")
+    parser.add_argument("--draw-cost", type=float, default=80, help="microseconds to draw one obstacle")
+    parser.add_argument("--report-every", type=float, default=10, help="seconds of game time between lines")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    draw_cost = args.draw_cost / 1e6
+    print("without governor")
+    play(args.seconds, draw_cost, args.seed, args.report_every)
+    print()
+    print("with governor")
+    play(args.seconds, draw_cost, args.seed, args.report_every, LoadGovernor(frame_budget=DELTA_TIME))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Bandwidth of the networked game over localhost.
+
+Runs a GameServer and a few NetClients in one process over real UDP
+sockets on localhost, with LossySockets making the packets both ways late
+and some lost, in a game kept at 1000 meteors with the pilot flying in
+circles. With --co-op the second client flies the wingman, in circles of
+its own. Time is simulated, so a run takes as long as the machine needs,
+not as long as the game. Prints the bandwidth every client received per
+second next to what sending every state in full would take, and how many
+states were full ones or could not be used. Every state a client put
+together is checked against the one the server sent, the run exits with
+an error if any differ, or if the wingman did not get its seat or fly on
+its client's input. Run from the repository root:
+
+    python -m benchmarks.network
+    python -m benchmarks.network --co-op
+    python -m benchmarks.network --obstacles 1000 --clients 3 --latency 0.05 --jitter 0.02 --loss 0.05
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.run import GOD_MODE_LIVES, circling, fill_obstacles
+from constants import IN_GAME, SIMULATION_RATE, NET_SEND_EVERY
+from net_client import NetClient
+from netcode import PILOT, SPECTATOR, WINGMAN, PACKET_OVERHEAD, LossySocket, state_packets, udp_socket
+from server import GameServer, ROLE_NAMES
+from simulation import GameSimulation, InputState, NO_INPUT
+
+START = InputState(action=True)
+
+
+def run(args):
+    now = 0.0
+
+    def clock():
+        return now
+
+    def lossy(seed):
+        return LossySocket(udp_socket(), args.latency, args.jitter, args.loss, seed=seed, clock=clock)
+
+    simulation = GameSimulation(seed=args.seed, shooting=args.shooting, ufos=args.ufos, co_op=args.co_op)
+    server = GameServer(simulation, lossy(args.seed), args.rate, args.send_every, clock=clock)
+    # the first client flies, in co-op the second one too, whichever says
+    # hello first gets the ship
+    pilots = 2 if args.co_op else 1
+    clients = [
+        NetClient(server.address, PILOT if index < pilots else SPECTATOR, lossy(args.seed + 1 + index), clock=clock)
+        for index in range(args.clients)
+    ]
+    step_time = 1 / args.rate
+
+    def tick(inputs, wingman_inputs=NO_INPUT):
+        nonlocal now
+        now += step_time
+        server.poll()
+        server.step()
+        for client in clients:
+            client.poll()
+            if client.role == PILOT:
+                client.send_input(inputs)
+            else:
+                client.send_input(wingman_inputs if client.role == WINGMAN else NO_INPUT)
+
+    def flying(step):
+        # the wingman circles half a turn behind the pilot
+        return circling(step, fire=args.shooting), circling(step + args.rate // 2, fire=args.shooting)
+
+    # connect and start the game, a lost press is simply pressed again
+    while simulation.mode != IN_GAME:
+        tick(START if simulation.tick % 30 == 0 else InputState())
+    simulation.player.player_lives = GOD_MODE_LIVES
+    if simulation.wingman is not None:
+        simulation.wingman.player_lives = GOD_MODE_LIVES
+    fill_obstacles(simulation, args.obstacles)
+    for step in range(args.rate):
+        tick(*flying(step))
+    wingman = simulation.wingman
+    wingman_start = None if wingman is None else (wingman.center_x, wingman.center_y)
+    wingman_moved = False
+
+    received = [(client.bytes_received, client.packets_received) for client in clients]
+    stats = [client.stats() for client in clients]
+    full_bytes = 0
+    states = 0
+    mismatched = [0] * len(clients)
+    checked = [client.newest for client in clients]
+    frame_seconds = 0.0
+    steps = int(args.seconds * args.rate)
+    for step in range(steps):
+        tick(*flying(step))
+        if wingman is not None:
+            wingman_moved = wingman_moved or (wingman.center_x, wingman.center_y) != wingman_start
+        if simulation.tick % args.send_every == 0:
+            # what sending this state in full would have taken
+            full = server.history[simulation.tick]
+            full_bytes += sum(
+                len(packet) + PACKET_OVERHEAD for packet in state_packets(full.tick, None, full.encode())
+            )
+            states += 1
+        for index, client in enumerate(clients):
+            if client.newest != checked[index]:
+                checked[index] = client.newest
+                sent = server.history[client.newest].columns
+                got = client.states[client.newest].columns
+                if any(not np.array_equal(sent[key], got[key]) for key in sent):
+                    mismatched[index] += 1
+            start = time.perf_counter()
+            client.frame()
+            frame_seconds += time.perf_counter() - start
+
+    seconds = steps * step_time
+    print("{} meteors, {} steps/s, a state every {} steps, latency {:.0f} ms + up to {:.0f} ms, {:.0%} loss".format(
+        len(simulation.obstacles), args.rate, args.send_every, args.latency * 1000, args.jitter * 1000, args.loss
+    ))
+    print("{:>7} {:>10} {:>9} {:>10} {:>9} {:>7} {:>9} {:>11}".format(
+        "client", "role", "KB/s", "packets/s", "states/s", "full", "unusable", "mismatched"
+    ))
+    for index, client in enumerate(clients):
+        bytes_received = client.bytes_received - received[index][0]
+        packets = client.packets_received - received[index][1]
+        after = client.stats()
+        print("{:>7} {:>10} {:>9.1f} {:>10.1f} {:>9.1f} {:>7} {:>9} {:>11}".format(
+            client.id, ROLE_NAMES.get(client.role, "none"),
+            (bytes_received + packets * PACKET_OVERHEAD) / seconds / 1024, packets / seconds,
+            (after["states_received"] - stats[index]["states_received"]) / seconds,
+            after["full_states"] - stats[index]["full_states"],
+            after["states_unusable"] - stats[index]["states_unusable"], mismatched[index],
+        ))
+    print("every state in full: {:.1f} KB/s per client".format(full_bytes / seconds / 1024))
+    print("building a frame to draw: {:.3f} ms".format(frame_seconds / (steps * len(clients)) * 1000))
+
+    failures = []
+    if sum(mismatched):
+        failures.append("clients put together states that differ from what the server sent")
+    if args.co_op:
+        if not any(client.role == WINGMAN for client in clients):
+            failures.append("no client got the wingman")
+        elif not wingman_moved:
+            failures.append("the wingman did not fly on its client's input")
+
+    for client in clients:
+        client.close()
+    server.close()
+    simulation.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--obstacles", type=int, default=1000)
+    parser.add_argument(
+        "--clients", type=int, default=2, help="the first one flies, in co-op the second one too, the others watch"
+    )
+    parser.add_argument("--seconds", type=float, default=10.0, help="seconds of game measured")
+    parser.add_argument("--rate", type=int, default=SIMULATION_RATE, help="simulation steps per second")
+    parser.add_argument("--send-every", type=int, default=NET_SEND_EVERY, help="steps per state sent")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds every packet is held back")
+    parser.add_argument("--jitter", type=float, default=0.02, help="up to this many more seconds, at random")
+    parser.add_argument("--loss", type=float, default=0.05, help="fraction of the packets that are lost")
+    parser.add_argument("--shooting", action="store_true")
+    parser.add_argument("--ufos", action="store_true")
+    parser.add_argument("--co-op", action="store_true", help="the second client flies a wingman")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    failures = run(args)
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""
+Scalability benchmark suite for the game logic.
+
+Drives a headless GameSimulation through scripted scenarios with a fixed
+seed and reports ticks per second, p50/p99 tick latency and peak traced
+memory for each. With --check the results are compared against a stored
+baseline and the run fails if any scenario got slower or bigger than the
+tolerance allows. Run from the repository root:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --check
+    python -m benchmarks.run --update-baseline
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from constants import IN_GAME, SCREEN_WIDTH, SCREEN_HEIGHT, PLAYER_SHOT_SPEED, SHOT_LIFETIME
+from simulation import GameSimulation, InputState, PowerUpState
+
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+DELTA_TIME = 1 / 60
+# lives given to the player so a scenario is not cut short by dying
+GOD_MODE_LIVES = 10 ** 9
+# differences too small to count as a regression whatever the tolerance,
+# timer noise dominates tiny latencies
+ABSOLUTE_SLACK = {"p50_ms": 0.05, "p99_ms": 0.1, "peak_memory_mb": 1.0}
+# the same for the mean time of a tick behind ticks_per_second, a scenario
+# of well under a microsecond a tick like start_screen is all noise
+TICK_SLACK_MS = 0.01
+
+NO_INPUT = InputState()
+START = InputState(action=True)
+
+
+def start_game(simulation):
+    """
+    Leave the start screen and keep the player alive
+    """
+    simulation.step(DELTA_TIME, START)
+    simulation.player.player_lives = GOD_MODE_LIVES
+
+
+def fill_obstacles(simulation, count):
+    """
+    Replace the level with count obstacles and keep refilling to that many
+    """
+    simulation.number_of_obstacles = count
+    simulation.obstacles.clear()
+    simulation.obstacles.spawn(count, speed=simulation.obstacle_speed)
+
+
+def circling(tick, action=False, fire=False):
+    """
+    Input steering the player in a slow circle
+    """
+    phase = (tick // 30) % 4
+    return InputState(
+        left=phase == 0, up=phase == 1, right=phase == 2, down=phase == 3, action=action, fire=fire
+    )
+
+
+def start_screen(simulation):
+    return lambda tick: NO_INPUT
+
+
+def level_1(simulation):
+    start_game(simulation)
+    return circling
+
+
+def synthetic(count):
+    def scenario(simulation):
+        start_game(simulation)
+        fill_obstacles(simulation, count)
+        return circling
+    return scenario
+
+
+def dashing(simulation):
+    start_game(simulation)
+    return lambda tick: circling(tick, action=True)
+
+
+def power_up_storm(simulation):
+    start_game(simulation)
+
+    def storm(tick):
+        # keep a few hundred power ups around
+        while len(simulation.power_ups) < 300:
+            simulation.power_ups.append(PowerUpState(simulation.power_up_rng, simulation.timers))
+        return circling(tick)
+    return storm
+
+
+def bullet_hell(obstacles, shots, effects=False):
+    def scenario(simulation):
+        start_game(simulation)
+        fill_obstacles(simulation, obstacles)
+        simulation.shooting = True
+        simulation.effects = effects
+        rng = np.random.default_rng(simulation.seed)
+
+        def barrage(tick):
+            # top the player's volleys up with shots from all over the screen
+            missing = shots - len(simulation.shots)
+            if missing > 0:
+                for x, y, angle in zip(
+                    rng.uniform(0, SCREEN_WIDTH, missing).tolist(),
+                    rng.uniform(0, SCREEN_HEIGHT, missing).tolist(),
+                    rng.uniform(0, 360, missing).tolist(),
+                ):
+                    simulation.shots.fire(x, y, [angle], PLAYER_SHOT_SPEED, SHOT_LIFETIME)
+            return circling(tick, fire=True)
+        return barrage
+    return scenario
+
+
+def ufo_swarm(ufos):
+    def scenario(simulation):
+        start_game(simulation)
+        simulation.ufos_enabled = True
+
+        def swarm(tick):
+            # replace the UFOs that rammed the player
+            simulation.ufos.spawn(ufos - len(simulation.ufos))
+            return circling(tick)
+        return swarm
+    return scenario
+
+
+# name: (setup returning the input for every tick, ticks to run)
+SCENARIOS = {
+    "start_screen": (start_screen, 5000),
+    "level_1": (level_1, 2000),
+    "obstacles_1k": (synthetic(1000), 1000),
+    "obstacles_10k": (synthetic(10000), 300),
+    "obstacles_50k": (synthetic(50000), 100),
+    "dashing": (dashing, 2000),
+    "power_up_storm": (power_up_storm, 1000),
+    "bullet_hell": (bullet_hell(2000, 5000), 600),
+    "ufo_swarm": (ufo_swarm(500), 1000),
+    "explosions": (bullet_hell(2000, 5000, effects=True), 600),
+}
+
+
+def run_scenario(name, seed, scale=1.0, trace_memory=False):
+    """
+    Step a fresh simulation through a scenario, return the tick durations
+    in seconds and the peak traced memory in bytes
+    """
+    setup, ticks = SCENARIOS[name]
+    ticks = max(int(ticks * scale), 1)
+
+    if trace_memory:
+        tracemalloc.start()
+
+    simulation = GameSimulation(seed=seed)
+    input_for = setup(simulation)
+    durations = np.zeros(ticks)
+    step = simulation.step
+    for tick in range(ticks):
+        inputs = input_for(tick)
+        start = time.perf_counter()
+        step(DELTA_TIME, inputs)
+        durations[tick] = time.perf_counter() - start
+
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    if simulation.mode != IN_GAME and name != "start_screen":
+        raise RuntimeError("scenario {} left the game".format(name))
+    simulation.close()
+    return durations, peak
+
+
+def measure(name, seed, scale=1.0):
+    """
+    Results of one scenario: ticks per second, tick latency in
+    milliseconds and peak memory in megabytes
+    """
+    durations, _ = run_scenario(name, seed, scale)
+    # memory is traced in a shorter second run, tracing slows everything down
+    _, peak = run_scenario(name, seed, scale * 0.2, trace_memory=True)
+    return {
+        "ticks_per_second": float(len(durations) / durations.sum()),
+        "p50_ms": float(np.percentile(durations, 50) * 1000),
+        "p99_ms": float(np.percentile(durations, 99) * 1000),
+        "peak_memory_mb": peak / 2 ** 20,
+    }
+
+
+def regressions(results, baseline, tolerance):
+    """
+    Descriptions of every result worse than the baseline by more than
+    tolerance, a fraction
+    """
+    found = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        tick_ms = 1000 / result["ticks_per_second"]
+        if tick_ms > 1000 / expected["ticks_per_second"] / (1 - tolerance) + TICK_SLACK_MS:
+            found.append("{}: {:.0f} ticks/s, baseline {:.0f}".format(
+                name, result["ticks_per_second"], expected["ticks_per_second"]
+            ))
+        for key, slack in ABSOLUTE_SLACK.items():
+            if result[key] > expected[key] * (1 + tolerance) + slack:
+                found.append("{}: {} {:.3f}, baseline {:.3f}".format(name, key, result[key], expected[key]))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scenarios", nargs="*", metavar="SCENARIO",
+                        help="scenarios to run, all by default: " + ", ".join(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the ticks of every scenario")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3,
+                        help="allowed regression as a fraction of the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error("unknown scenarios: " + ", ".join(unknown))
+
+    print("{:<16} {:>12} {:>10} {:>10} {:>10}".format("scenario", "ticks/s", "p50 ms", "p99 ms", "peak MB"))
+    results = {}
+    for name in names:
+        result = measure(name, args.seed, args.scale)
+        results[name] = result
+        print("{:<16} {:>12.0f} {:>10.3f} {:>10.3f} {:>10.1f}".format(
+            name, result["ticks_per_second"], result["p50_ms"], result["p99_ms"], result["peak_memory_mb"]
+        ))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            pass
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("baseline written to", args.baseline)
+
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.tolerance)
+        if found:
+            print("regressions beyond {:.0%}:".format(args.tolerance))
+            for line in found:
+                print("  " + line)
+            sys.exit(1)
+        print("no regressions beyond {:.0%}".format(args.tolerance))
+
+
+if __name__ == "__main__":
+    main()
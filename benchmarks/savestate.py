@@ -0,0 +1,96 @@
+"""
+Cost of save states as the field grows.
+
+Fills a game with more and more obstacles, a few of them still harmless,
+and prints how big its save state is, how long saving it into a reused
+buffer takes, how long reading it back takes and how long restoring it
+into the game takes. Reading maps the arrays rather than copying them, so
+it should not depend on the number of obstacles at all. Exits with an
+error if saving 10k obstacles takes a millisecond or more. Run from the
+repository root:
+
+    python -m benchmarks.savestate
+    python -m benchmarks.savestate --counts 1000 10000 50000 --repeat 200
+"""
+
+import argparse
+import sys
+import time
+
+from benchmarks.run import DELTA_TIME, fill_obstacles, start_game
+from savestate import SaveState, save
+from simulation import GameSimulation, InputState
+
+COUNTS = [1000, 10000, 50000]
+# held for the first steps, so the state has shots in it
+FIRING = InputState(fire=True)
+# saving this many obstacles has to take less than BUDGET_MS
+BUDGET_COUNT = 10000
+BUDGET_MS = 1.0
+
+
+def best(function, repeat):
+    """
+    Fastest of repeat calls of function, in milliseconds, and its result
+    """
+    fastest = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        seconds = time.perf_counter() - start
+        if fastest is None or seconds < fastest:
+            fastest = seconds
+    return fastest * 1000, result
+
+
+def measure(count, repeat, seed):
+    """
+    Bytes of the save state of a game with count obstacles, and the
+    milliseconds to save, read and restore it
+    """
+    simulation = GameSimulation(seed=seed, shooting=True, ufos=True, effects=True)
+    start_game(simulation)
+    fill_obstacles(simulation, count)
+    for _ in range(30):
+        simulation.step(DELTA_TIME, FIRING)
+
+    buffer = bytearray()
+
+    def saving():
+        nonlocal buffer
+        view = save(simulation, buffer)
+        buffer = view.obj
+        return view
+
+    save_ms, view = best(saving, repeat)
+    data = bytes(view)
+    read_ms, state = best(lambda: SaveState(data), repeat)
+    restore_ms, _ = best(lambda: state.restore(simulation), max(repeat // 10, 1))
+    simulation.close()
+    return len(data), save_ms, read_ms, restore_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--counts", type=int, nargs="+", default=COUNTS, help="obstacles in the field")
+    parser.add_argument("--repeat", type=int, default=100, help="times every operation is timed, the best counts")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:>10} {:>10} {:>10} {:>10} {:>11}".format("obstacles", "KB", "save ms", "read ms", "restore ms"))
+    over_budget = False
+    for count in args.counts:
+        size, save_ms, read_ms, restore_ms = measure(count, args.repeat, args.seed)
+        print("{:>10} {:>10.1f} {:>10.3f} {:>10.3f} {:>11.3f}".format(
+            count, size / 1024, save_ms, read_ms, restore_ms
+        ))
+        if count == BUDGET_COUNT and save_ms >= BUDGET_MS:
+            over_budget = True
+
+    if over_budget:
+        print("saving {} obstacles took {} ms or more".format(BUDGET_COUNT, BUDGET_MS))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Cost of recording games and reading the leaderboard.
+
+Records made up games into a fresh scores database through a ScoreStore
+and prints how long record() kept the caller, how many games a second the
+writer thread got to the disk, and how long reading the top ten and the
+rank of a score took once the database holds them all. The rank counts
+the games ahead, so it is timed at scores further and further down, and
+so is how long request_rank(), which the game uses, keeps the caller.
+Exits with an error if the top ten take a millisecond or more, if the
+leaderboard query does not go through the score index, or if
+request_rank() keeps the caller a millisecond or more. Run from the
+repository root:
+
+    python -m benchmarks.scores
+    python -m benchmarks.scores --sessions 3000000 --repeat 500
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from constants import LEADERBOARD_SIZE
+from scores import TOP, ScoreStore
+
+# reading the top ten, and asking for a rank, have to take less than BUDGET_MS
+BUDGET_MS = 1.0
+
+
+def made_up_game(rng, started_at):
+    score = int(rng.expovariate(1 / 20000))
+    frame_ms = rng.uniform(8.0, 20.0)
+    return (
+        started_at, rng.uniform(10.0, 600.0), rng.getrandbits(63),
+        score, score // 2000, score // 10,
+        rng.randrange(10), rng.randrange(50), rng.randrange(10), rng.randrange(200), rng.randrange(20),
+        score // 20, frame_ms, frame_ms, frame_ms * 2, frame_ms * 4,
+        rng.randrange(2), rng.randrange(2), rng.randrange(2),
+    )
+
+
+def timed(function, repeat):
+    """
+    Median of repeat calls of function, in milliseconds
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return float(np.median(times)) * 1000
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    failed = False
+    with tempfile.TemporaryDirectory() as directory:
+        store = ScoreStore(os.path.join(directory, "scores.db"))
+        rows = [made_up_game(rng, 1.7e9 + index) for index in range(args.sessions)]
+
+        # how long the game loop is held up by recording a game
+        record_times = np.empty(len(rows))
+        start = time.perf_counter()
+        for index, row in enumerate(rows):
+            before = time.perf_counter()
+            store.record(row)
+            record_times[index] = time.perf_counter() - before
+        queued = time.perf_counter() - start
+        store.flush()
+        written = time.perf_counter() - start
+
+        print("{} games recorded, {} failed".format(store.written, store.failed))
+        print("record(): {:.2f} us median, {:.2f} us 99th percentile, {:.2f} us at most".format(
+            *(np.percentile(record_times, (50, 99, 100)) * 1e6)
+        ))
+        print("writer thread: {:.0f} games/s ({:.1f} s queueing, {:.1f} s until all were written)".format(
+            len(rows) / written, queued, written
+        ))
+
+        plan = store._reader.execute("EXPLAIN QUERY PLAN " + TOP, (LEADERBOARD_SIZE,)).fetchall()
+        plan = " / ".join(step[-1] for step in plan)
+        print("leaderboard query plan:", plan)
+        if "sessions_by_score" not in plan:
+            print("the leaderboard does not use the score index")
+            failed = True
+
+        top_ms = timed(lambda: store.top(LEADERBOARD_SIZE), args.repeat)
+        print("top {}: {:.3f} ms".format(LEADERBOARD_SIZE, top_ms))
+        if top_ms >= BUDGET_MS:
+            print("reading the top {} takes {:.3f} ms, over the {} ms budget".format(
+                LEADERBOARD_SIZE, top_ms, BUDGET_MS
+            ))
+            failed = True
+        print("top 100: {:.3f} ms".format(timed(lambda: store.top(100), args.repeat)))
+        best = store.top(1)[0].score
+        # the rank counts the games ahead, so it costs more the further down
+        for score in (best, best // 10, best // 100, 0):
+            rank_ms = timed(lambda: store.rank(score), max(args.repeat // 50, 3))
+            print("rank of {} ({} games ahead): {:.3f} ms".format(score, store.rank(score) - 1, rank_ms))
+
+        # the game asks the writer thread instead, and only waits for the
+        # question to be queued
+        futures = []
+        request_ms = timed(lambda: futures.append(store.request_rank(0)), args.repeat)
+        start = time.perf_counter()
+        for future in futures:
+            future.result()
+        answered_ms = (time.perf_counter() - start) * 1000 / len(futures)
+        print("request_rank(): {:.3f} ms for the caller, answered {:.3f} ms apart on the writer thread".format(
+            request_ms, answered_ms
+        ))
+        if request_ms >= BUDGET_MS:
+            print("request_rank() keeps the caller {:.3f} ms, over the {} ms budget".format(request_ms, BUDGET_MS))
+            failed = True
+        store.close()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000000, help="games recorded")
+    parser.add_argument("--repeat", type=int, default=200, help="times every query is timed")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if run(args):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Tunneling check for the swept collisions.
+
+Plays short scripted encounters, dashes past and through power ups, the
+player grazing meteors that fly past and passing a meteor with room to
+spare, at several step rates, and finds out for each whether the player
+touched what it is about three ways:
+
+* before: the check the game had before the simulation, arcade's
+  check_for_collision_with_list between the sprites where they are at
+  the end of every step
+* swept: the simulation's collisions, tested along the paths of every step
+* end only: the simulation's collisions, only where things are at the end
+  of every step
+
+The reference for each is the same test at ten times the highest step
+rate, fine enough to catch every touch. Some encounters are known to slip
+through the check from before at some step rates, 60 included, and are
+checked to still do so, to show the bug the swept collisions fix. Exits
+with an error if an encounter no longer slips through the check from
+before where it should, or if the swept collisions get any wrong. Run
+from the repository root:
+
+    python -m benchmarks.tunneling
+    python -m benchmarks.tunneling --rates 60 30 20 15
+"""
+
+import argparse
+import sys
+
+import arcade
+import numpy as np
+
+from constants import (
+    SPRITE_SCALING, POWER_UP_SCALING, PLAYER_NORMAL_GRAPHICS, LIFE_UP_GRAPHICS, SCORE_UP_GRAPHICS,
+)
+from obstacle_field import FRAGMENT_TYPE, OBSTACLE_MIN_SCALE, OBSTACLE_TYPES, SpawnTable
+from simulation import GameSimulation, InputState, PowerUpState, LIFE_UP
+
+RATES = [60, 30, 20]
+# seconds every encounter is played for
+DURATION = 0.5
+START = (300.0, 300.0)
+
+RIGHT = InputState(right=True)
+DASH_RIGHT = InputState(right=True, action=True)
+UP_RIGHT = InputState(up=True, right=True)
+
+
+def place_meteor(simulation, x, y, speed_x, speed_y):
+    """
+    A harmful small fragment at (x, y) flying (speed_x, speed_y) per step
+    """
+    table = SpawnTable()
+    table.spawn_on_edge = True
+    table.type = np.array([FRAGMENT_TYPE])
+    table.scale = np.array([SPRITE_SCALING * OBSTACLE_MIN_SCALE])
+    table.center_x = np.array([x])
+    table.center_y = np.array([y])
+    table.speed_x = np.array([float(speed_x)])
+    table.speed_y = np.array([float(speed_y)])
+    table.speed_noise = np.ones(1)
+    table.change_angle = np.zeros(1)
+    simulation.obstacles.materialize(table)
+
+
+def place_power_up(simulation, x, y):
+    power_up = PowerUpState(simulation.power_up_rng, simulation.timers)
+    power_up.center_x = x
+    power_up.center_y = y
+    simulation.power_ups.append(power_up)
+
+
+def dash_through_power_up(simulation):
+    place_power_up(simulation, START[0] + 155, START[1])
+    return lambda tick: DASH_RIGHT if tick == 0 else RIGHT
+
+
+def dash_past_power_up(simulation):
+    place_power_up(simulation, START[0] + 260, START[1] + 38)
+    return lambda tick: DASH_RIGHT if tick == 0 else RIGHT
+
+
+def dash_clipping_power_up(simulation):
+    place_power_up(simulation, START[0] + 97.5, START[1] + 42)
+    return lambda tick: DASH_RIGHT if tick == 0 else RIGHT
+
+
+def dash_clipping_power_up_below(simulation):
+    place_power_up(simulation, START[0] + 83.5, START[1] - 44)
+    return lambda tick: DASH_RIGHT if tick == 0 else RIGHT
+
+
+def graze_oncoming_meteor(simulation):
+    place_meteor(simulation, START[0] + 130, START[1] + 30, -2, 0)
+    return lambda tick: RIGHT
+
+
+def cross_meteor(simulation):
+    place_meteor(simulation, START[0] + 114, START[1] + 118, -2, 0)
+    return lambda tick: UP_RIGHT
+
+
+def pass_meteor(simulation):
+    place_meteor(simulation, START[0] + 140, START[1] + 70, -2, 0)
+    return lambda tick: RIGHT
+
+
+# name: (setup placing things around the player and returning its input,
+# what is counted, step rates the check from before misses it at)
+ENCOUNTERS = {
+    "dash_through_power_up": (dash_through_power_up, "power_ups_picked", (20,)),
+    "dash_past_power_up": (dash_past_power_up, "power_ups_picked", (30, 20)),
+    "dash_clipping_power_up": (dash_clipping_power_up, "power_ups_picked", (60, 30, 20)),
+    "dash_clipping_power_up_below": (dash_clipping_power_up_below, "power_ups_picked", (60, 30, 20)),
+    "graze_oncoming_meteor": (graze_oncoming_meteor, "damage_events", ()),
+    "cross_meteor": (cross_meteor, "damage_events", (20,)),
+    "pass_meteor": (pass_meteor, "damage_events", ()),
+}
+
+
+class SpritesBefore:
+    """
+    Sprites of the player and of what an encounter placed, kept where the
+    simulation has them, to test them like the game did before it had a
+    simulation
+    """
+
+    def __init__(self, simulation):
+        self.player = arcade.Sprite(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING)
+        self.power_ups = arcade.SpriteList()
+        for power_up in simulation.power_ups:
+            graphics = LIFE_UP_GRAPHICS if power_up.kind == LIFE_UP else SCORE_UP_GRAPHICS
+            sprite = arcade.Sprite(graphics, POWER_UP_SCALING)
+            sprite.center_x = power_up.center_x
+            sprite.center_y = power_up.center_y
+            self.power_ups.append(sprite)
+        field = simulation.obstacles
+        self.slots = np.flatnonzero(field.alive[:field.size])
+        self.obstacles = arcade.SpriteList()
+        for slot in self.slots:
+            self.obstacles.append(arcade.Sprite(OBSTACLE_TYPES[int(field.type[slot])]["graphics"], field.scale[slot]))
+
+    def touching(self, simulation, counted):
+        """
+        Whether the player touches what is counted where everything is now
+        """
+        player = simulation.player
+        self.player.center_x = player.center_x
+        self.player.center_y = player.center_y
+        self.player.angle = player.angle
+        if counted == "power_ups_picked":
+            return bool(arcade.check_for_collision_with_list(self.player, self.power_ups))
+
+        field = simulation.obstacles
+        for slot, sprite in zip(self.slots, self.obstacles):
+            sprite.center_x = field.center_x[slot]
+            sprite.center_y = field.center_y[slot]
+            sprite.angle = field.angle[slot]
+        # dashing through meteors does no harm, as it did before
+        return not player.is_dashing and bool(arcade.check_for_collision_with_list(self.player, self.obstacles))
+
+
+def play(name, rate, swept, before=False):
+    """
+    Whether the player touched what the encounter is about, played at
+    rate steps per second. With before it is found by the check from
+    before, otherwise by the simulation, sweeping with swept.
+    """
+    setup, counted, _ = ENCOUNTERS[name]
+    simulation = GameSimulation(seed=1)
+    simulation.swept_collisions = swept
+    simulation.step(1 / rate, InputState(action=True))
+
+    # nothing but the player and what the encounter places
+    simulation.number_of_obstacles = 0
+    simulation.spawn_scheduler.clear()
+    simulation.obstacles.clear()
+    simulation.power_up_timer.cancel()
+    for power_up in simulation.power_ups:
+        power_up.despawn()
+    simulation.power_ups = []
+    player = simulation.player
+    player.center_x, player.center_y = START
+    player.angle = player.wanted_angle = 0
+
+    input_for = setup(simulation)
+    sprites = SpritesBefore(simulation) if before else None
+    touched = False
+    start = getattr(simulation, counted)
+    for tick in range(int(DURATION * rate)):
+        simulation.step(1 / rate, input_for(tick))
+        if sprites is not None:
+            touched = touched or sprites.touching(simulation, counted)
+    simulation.close()
+    if sprites is not None:
+        return touched
+    return getattr(simulation, counted) > start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rates", type=int, nargs="+", default=RATES, help="steps per second")
+    args = parser.parse_args()
+
+    reference_rate = 10 * max(args.rates)
+    print("{:<32} {:>9} {:>6} {:>9} {:>9} {:>9}".format(
+        "encounter", "reference", "rate", "before", "swept", "end only"
+    ))
+    wrong = []
+    not_shown = []
+    for name, (_, _, slipping) in ENCOUNTERS.items():
+        expected = play(name, reference_rate, swept=False)
+        expected_before = play(name, reference_rate, swept=False, before=True)
+        for rate in args.rates:
+            before = play(name, rate, swept=False, before=True)
+            swept = play(name, rate, swept=True)
+            end_only = play(name, rate, swept=False)
+            print("{:<32} {:>9} {:>6} {:>9} {:>9} {:>9}".format(
+                name, "hit" if expected else "miss", rate,
+                "ok" if before == expected_before else "WRONG",
+                "ok" if swept == expected else "WRONG", "ok" if end_only == expected else "WRONG",
+            ))
+            if swept != expected:
+                wrong.append("{} at {} steps/s".format(name, rate))
+            if rate in slipping and before == expected_before:
+                not_shown.append("{} at {} steps/s".format(name, rate))
+
+    failed = False
+    if not_shown:
+        print("no longer slip through the check from before: " + ", ".join(not_shown))
+        failed = True
+    if wrong:
+        print("swept collisions got wrong: " + ", ".join(wrong))
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("swept collisions got every encounter right, the check from before missed the ones expected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Cost of a scrolling world as it grows.
+
+Plays the first level in worlds from one to many screens across with the
+player roaming far from where it started, and prints the ticks per second,
+the peak traced memory and how many obstacles and chunks were live at the
+end. With chunked streaming only the chunks near the screen hold obstacles,
+so the numbers should stay flat however big the world gets. Run from the
+repository root:
+
+    python -m benchmarks.world
+    python -m benchmarks.world --screens 1 4 16 64 256 --ticks 2000
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.run import DELTA_TIME, start_game
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT
+from simulation import GameSimulation, InputState
+from world import ChunkedWorld
+
+SCREENS = [1, 4, 16, 64, 256]
+
+
+def roaming(tick):
+    """
+    Input flying the player in a big square, far enough to leave its chunks
+    """
+    phase = (tick // 240) % 4
+    return InputState(up=True, left=phase == 1, right=phase == 3)
+
+
+def play(screens, ticks, seed, trace_memory=False):
+    """
+    Seconds per tick, peak traced memory in bytes and the live obstacles
+    and world stats after ticks steps in a world screens screens across
+    """
+    if trace_memory:
+        tracemalloc.start()
+    simulation = GameSimulation(seed=seed, world=True)
+    simulation.world = ChunkedWorld(
+        seed=seed, width=SCREEN_WIDTH * screens, height=SCREEN_HEIGHT * screens,
+    )
+    start_game(simulation)
+
+    start = time.perf_counter()
+    for tick in range(ticks):
+        simulation.step(DELTA_TIME, roaming(tick))
+    seconds = (time.perf_counter() - start) / ticks
+
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    obstacles = len(simulation.obstacles)
+    stats = simulation.world.stats()
+    simulation.close()
+    return seconds, peak, obstacles, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--screens", type=int, nargs="+", default=SCREENS, help="world sizes in screens across")
+    parser.add_argument("--ticks", type=int, default=1000, help="steps per world")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print("{:>8} {:>10} {:>10} {:>10} {:>8} {:>8} {:>10}".format(
+        "screens", "ticks/s", "peak MB", "obstacles", "active", "frozen", "generated"
+    ))
+    for screens in args.screens:
+        seconds, _, obstacles, stats = play(screens, args.ticks, args.seed)
+        # memory is traced in a shorter second run, tracing slows everything down
+        _, peak, _, _ = play(screens, max(args.ticks // 5, 1), args.seed, trace_memory=True)
+        print("{:>8} {:>10.0f} {:>10.1f} {:>10} {:>8} {:>8} {:>10}".format(
+            screens, 1 / seconds, peak / 2 ** 20, obstacles,
+            stats["active_chunks"], stats["frozen_chunks"], stats["generated"],
+        ))
+
+
+if __name__ == "__main__":
+    main()
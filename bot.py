@@ -0,0 +1,97 @@
+"""
+Scripted player for headless games.
+
+DodgingBot looks at the obstacles around the ship, predicts where they and
+the ship will be a few steps ahead for every way it can move, and picks the
+move that keeps the most room. It dashes through a hit it cannot dodge and
+goes for power ups while nothing is close. It is meant to play thousands of
+games for tuning, not to play well.
+"""
+
+import numpy as np
+
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, PLAYER_SPEED_X, PLAYER_SPEED_Y, IN_GAME
+from simulation import InputState, NO_INPUT
+
+# the ways the bot can move: (x, y) in key presses, including standing still
+MOVES = np.array([
+    [0, 0], [1, 0], [-1, 0], [0, 1], [0, -1], [1, 1], [1, -1], [-1, 1], [-1, -1],
+], dtype=float)
+INPUTS = [
+    InputState(left=x < 0, right=x > 0, down=y < 0, up=y > 0) for x, y in MOVES
+]
+
+# steps ahead at which the bot checks the room it has
+LOOK_AHEAD = np.array([2, 6, 12], dtype=float)
+# how far around the ship obstacles are considered
+SIGHT_RADIUS = 300
+# room below which the bot stops going for power ups
+SAFE_ROOM = 60
+# room kept from the edges of the screen
+EDGE_ROOM = 80
+# obstacles still fading in only count from this many seconds before they turn harmful
+HARMLESS_WARNING = 0.5
+
+
+class DodgingBot:
+    """
+    Chooses the input of every step from the state of a GameSimulation
+    """
+
+    def __init__(self, dash=True, collect_power_ups=True):
+        self.dash = dash
+        self.collect_power_ups = collect_power_ups
+
+    def act(self, simulation):
+        """
+        The input for the next step
+        """
+        if simulation.mode != IN_GAME:
+            return NO_INPUT
+
+        player = simulation.player
+        field = simulation.obstacles
+        x = player.center_x
+        y = player.center_y
+
+        # where the ship is after each move at each look ahead, shape (moves, times)
+        future_x = np.clip(x + MOVES[:, 0, None] * PLAYER_SPEED_X * LOOK_AHEAD, 0, SCREEN_WIDTH)
+        future_y = np.clip(y + MOVES[:, 1, None] * PLAYER_SPEED_Y * LOOK_AHEAD, 0, SCREEN_HEIGHT)
+
+        # keep away from the edges, the obstacles come from there
+        edge = np.minimum(
+            np.minimum(future_x, SCREEN_WIDTH - future_x), np.minimum(future_y, SCREEN_HEIGHT - future_y)
+        )
+        room = np.minimum(edge - EDGE_ROOM, SIGHT_RADIUS)
+
+        slots = field.nearby(x, y, SIGHT_RADIUS)
+        if len(slots):
+            slots = slots[field.harmless_time_left(slots) < HARMLESS_WARNING]
+        if len(slots):
+            # obstacles move by their direction vector once harmful, shape (moves, times, obstacles)
+            obstacle_x = field.center_x[slots] + field.speed_x[slots] * LOOK_AHEAD[:, None]
+            obstacle_y = field.center_y[slots] + field.speed_y[slots] * LOOK_AHEAD[:, None]
+            dx = future_x[:, :, None] - obstacle_x
+            dy = future_y[:, :, None] - obstacle_y
+            gap = np.sqrt(dx * dx + dy * dy) - field.radius[slots] - player.radius
+            room = np.minimum(room, gap.min(axis=2))
+
+        # the nearest check matters most
+        score = room.min(axis=1) + 0.25 * room.mean(axis=1)
+
+        if self.collect_power_ups and simulation.power_ups and score.max() > SAFE_ROOM:
+            target = min(
+                simulation.power_ups,
+                key=lambda power_up: (power_up.center_x - x) ** 2 + (power_up.center_y - y) ** 2,
+            )
+            distance = np.hypot(future_x[:, -1] - target.center_x, future_y[:, -1] - target.center_y)
+            # any safe move beats every unsafe one, the closest to the power up wins
+            score = np.where(room.min(axis=1) > SAFE_ROOM, SCREEN_WIDTH + SCREEN_HEIGHT - distance, score)
+
+        move = int(np.argmax(score))
+        inputs = INPUTS[move]
+
+        # nothing dodges the hit, dash through it
+        if self.dash and room[move, 0] < 0 and player.dash_cooldown <= 0 and not player.is_dashing:
+            inputs = InputState(inputs.left, inputs.right, inputs.up, inputs.down, action=True)
+        return inputs
@@ -0,0 +1,169 @@
+"""
+Constants shared by the game window and the window-free simulation.
+
+Nothing in here may import arcade, so the simulation can run on a machine
+without a display or GPU.
+"""
+
+SPRITE_SCALING = 0.4
+
+# Movement speeds are in pixels per step at this many steps per second,
+# the simulation scales them when it is stepped at another rate
+STEP_RATE = 60
+# Steps per second the game simulates, independent of the frame rate
+SIMULATION_RATE = 60
+# Most steps simulated for one frame, a slower machine slows the game down
+# instead of falling further and further behind
+MAX_STEPS_PER_FRAME = 5
+
+# Set the size of the screen
+SCREEN_WIDTH = 2000
+SCREEN_HEIGHT = 1600
+# left, bottom, right and top of the playfield in a game that fits the screen
+SCREEN_BOUNDS = (0, 0, SCREEN_WIDTH, SCREEN_HEIGHT)
+
+# Variables controlling the scrolling world
+WORLD_WIDTH = SCREEN_WIDTH * 16
+WORLD_HEIGHT = SCREEN_HEIGHT * 16
+# the world is generated and simulated in square chunks of this many pixels
+CHUNK_SIZE = 800
+# chunks within this many pixels of the screen are simulated, the rest frozen
+ACTIVE_CHUNK_MARGIN = 400
+# frozen chunks kept to come back to, older ones are generated again
+FROZEN_CHUNKS = 64
+
+# Variables controlling the player
+PLAYER_LIVES = 5
+PLAYER_SPEED_X = 5
+PLAYER_SPEED_Y = 5
+PLAYER_START_X = SCREEN_WIDTH / 2
+PLAYER_START_Y = SCREEN_HEIGHT / 2
+# how far apart the two ships of a co-op game start, side by side
+CO_OP_SPACING = 120
+PLAYER_SHOT_SPEED = 4
+OBSTACLE_SPEED = 6
+DASHING_TIME = 0.2
+DASHING_SPEED = 7
+DASH_COOLDOWN = DASHING_TIME + 0.5
+OBSTACLE_HARMLESS_TIME = 2.5
+OBSTACLE_HARMLESS_ALPHA = 100
+OBSTACLE_HARMLESS_SPEED_FACTOR = 0.3
+# length of a level in seconds
+LEVEL_TIME = 3.5
+
+TAKING_DAMAGE_TIME = 0.75
+LIVES_TAKING_DAMAGE = 1
+LIVES_GOTTEN_BY_POWER_UP = 1
+DASH_ALPHA = 150
+
+# Variables controlling power ups
+POWER_UP_SCALING = SPRITE_SCALING * 6.4
+POWER_UP_DESPAWN_TIME = 5
+POWER_UP_RESPAWN_TIME = 8
+SCORE_GOTTEN_BY_POWER_UP = 20000
+
+# Variables controlling shooting
+SHOT_VOLLEYS_PER_SECOND = 30
+SHOTS_PER_VOLLEY = 7
+# degrees between the outermost shots of a volley
+SHOT_SPREAD = 40
+# seconds before a shot that hit nothing disappears
+SHOT_LIFETIME = 4
+# most shots alive at once
+MAX_SHOTS = 8192
+SCORE_PER_OBSTACLE_SHOT = 10
+
+# Variables controlling the UFOs, speeds in pixels per step
+UFO_SPEED = 3
+# most the steering can change a UFO's velocity per step
+UFO_MAX_FORCE = 0.15
+# UFOs closer than this flock together, closer than the separation radius they push apart
+UFO_NEIGHBOR_RADIUS = 120
+UFO_SEPARATION_RADIUS = 50
+# weights of the steering behaviours
+UFO_SEPARATION = 1.5
+UFO_ALIGNMENT = 1.0
+UFO_COHESION = 1.0
+UFO_PURSUIT = 0.8
+# UFOs added per level, up to MAX_UFOS at once
+UFOS_PER_LEVEL = 8
+MAX_UFOS = 512
+SCORE_PER_UFO_SHOT = 50
+
+# Variables controlling the particle effects, speeds in pixels per step
+# most particles alive at once, a LoadGovernor lowers the budget further
+# while frames run long
+MAX_PARTICLES = 4096
+PARTICLE_SCALING = SPRITE_SCALING * 2
+PARTICLE_SPEED = 4
+PARTICLE_LIFETIME = 0.6
+SHIELD_LIFETIME = 0.4
+PARTICLES_PER_EXPLOSION = 8
+PARTICLES_PER_DAMAGE = 24
+PARTICLES_PER_DASH = 16
+# emitted behind the player every step of a dash
+PARTICLES_PER_DASH_STEP = 2
+
+# number of obstacles in the first level
+START_NUMBER_OF_OBSTACLES = 65
+# most obstacles of a new level spawned per frame in the game
+LEVEL_SPAWN_PER_STEP = 250
+# degrees between the precomputed rotations of a hit box
+HIT_BOX_ANGLE_STEP = 5
+# the player and the obstacles are only swept when they can move at least
+# this many pixels closer in a step, half the thinnest meteor: anything
+# slower cannot pass through a meteor and at most grazes one unseen
+SWEEP_MIN_MOVE = 12
+
+# Rewind
+# steps between the save states kept to rewind to
+REWIND_INTERVAL = 10
+# save states kept, rewinding reaches REWIND_STATES * REWIND_INTERVAL steps back
+REWIND_STATES = 36
+# steps gone back by one press of the rewind key
+REWIND_STEPS = 120
+
+# Networking
+NET_PORT = 7777
+# the server sends a state every this many steps
+NET_SEND_EVERY = 2
+# clients draw this many seconds behind the newest state, to have two to draw in between
+NET_INTERPOLATION_DELAY = 0.1
+# seconds a client may stay silent before the server drops it
+NET_CLIENT_TIMEOUT = 5.0
+# states the server keeps to send differences to, at NET_SEND_EVERY steps apart
+NET_HISTORY = 32
+NET_MAX_CLIENTS = 16
+
+# High scores
+SCORES_PATH = "scores.db"
+# sessions written in one transaction at most
+SCORES_BATCH_SIZE = 256
+# seconds a recorded session may wait for more before it is written
+SCORES_FLUSH_INTERVAL = 1.0
+LEADERBOARD_SIZE = 10
+
+# Graphics
+PLAYER_NORMAL_GRAPHICS = "images/playerShip1_blue.png"
+PLAYER_TAKING_DAMAGE_GRAPHICS = "images/playerShip1_red.png"
+LIFE_UP_GRAPHICS = "images/Power-ups/pill_red.png"
+SCORE_UP_GRAPHICS = "images/Power-ups/pill_blue.png"
+PLAYER_SHOT_GRAPHICS = "images/Lasers/laserBlue01.png"
+UFO_GRAPHICS = [
+    "images/ufoBlue.png",
+    "images/ufoGreen.png",
+    "images/ufoRed.png",
+    "images/ufoYellow.png",
+]
+# animation frames of the effects
+FIRE_GRAPHICS = ["images/Effects/fire{:02d}.png".format(frame) for frame in range(20)]
+SHIELD_GRAPHICS = [
+    "images/Effects/shield1.png",
+    "images/Effects/shield2.png",
+    "images/Effects/shield3.png",
+]
+
+# Modes of the game
+IN_START_SCREEN = "IN_START_SCREEN"
+IN_GAME = "IN_GAME"
+DEATH_SCREEN = "DEATH_SCREEN"
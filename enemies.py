@@ -0,0 +1,222 @@
+"""
+Flocking UFO enemies.
+
+UFOs steer like boids: they keep apart from the UFOs right next to them,
+match the velocity of and move towards the center of the ones around them,
+and chase the player. Like the shots they are slots in NumPy arrays kept
+packed at the front, so the steering of the whole flock is computed at
+once. The neighbors of every UFO are found through spatial_hash.grid_pairs
+and the per UFO sums over them are bincounts over the neighbor pairs, so a
+step costs about the number of UFOs times the number of neighbors each has
+instead of the number of UFOs squared.
+"""
+
+import numpy as np
+
+from constants import (
+    SPRITE_SCALING, SCREEN_BOUNDS, STEP_RATE, UFO_GRAPHICS, UFO_SPEED, UFO_MAX_FORCE,
+    UFO_NEIGHBOR_RADIUS, UFO_SEPARATION_RADIUS, UFO_SEPARATION, UFO_ALIGNMENT, UFO_COHESION, UFO_PURSUIT,
+    MAX_UFOS,
+)
+from images import image_size
+from spatial_hash import grid_pairs
+from sweep import closest_approach
+
+_UFO_WIDTH, _UFO_HEIGHT = image_size(UFO_GRAPHICS[0])
+UFO_RADIUS = (_UFO_WIDTH + _UFO_HEIGHT) * SPRITE_SCALING / 4
+
+_FIELDS = ("center_x", "center_y", "change_x", "change_y")
+
+
+def _steering(desired_x, desired_y, change_x, change_y):
+    """
+    Change of velocity that turns towards the desired directions at full
+    speed, none where there is no desired direction
+    """
+    length = np.hypot(desired_x, desired_y)
+    wanted = length > 0
+    scale = np.divide(UFO_SPEED, length, out=np.zeros_like(length), where=wanted)
+    return (
+        np.where(wanted, desired_x * scale - change_x, 0.0),
+        np.where(wanted, desired_y * scale - change_y, 0.0),
+    )
+
+
+class Flock:
+    """
+    Up to capacity UFOs, the live ones in slots 0 to count
+    """
+
+    def __init__(self, capacity=MAX_UFOS, seed=None, use_grid=True):
+        """
+        seed decides where UFOs spawn and their colors. Without use_grid
+        every UFO is tested against every other one, which is only there
+        to compare against.
+        """
+        self.capacity = capacity
+        self.count = 0
+        for name in _FIELDS:
+            setattr(self, name, np.zeros(capacity))
+        # index into UFO_GRAPHICS
+        self.color = np.zeros(capacity, dtype=np.int64)
+        self.rng = np.random.default_rng(seed)
+        self.use_grid = use_grid
+
+        # neighbor pairs in the last steering step
+        self.neighbor_pairs = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def spawn(self, count, bounds=SCREEN_BOUNDS):
+        """
+        Add up to count UFOs on the edges of bounds, the (left, bottom,
+        right, top) of the screen. Returns how many were added, fewer when
+        the flock is full.
+        """
+        count = max(min(count, self.capacity - self.count), 0)
+        new = slice(self.count, self.count + count)
+        rng = self.rng
+
+        left, bottom, right, top = bounds
+        x = rng.uniform(left, right, count)
+        y = rng.uniform(bottom, top, count)
+        # top, right, left or bottom edge
+        side = rng.integers(0, 4, count)
+        y[side == 0] = top
+        x[side == 1] = right
+        x[side == 2] = left
+        y[side == 3] = bottom
+        direction = rng.uniform(0, 2 * np.pi, count)
+
+        self.center_x[new] = x
+        self.center_y[new] = y
+        self.change_x[new] = np.cos(direction) * UFO_SPEED
+        self.change_y[new] = np.sin(direction) * UFO_SPEED
+        self.color[new] = rng.integers(0, len(UFO_GRAPHICS), count)
+        self.count += count
+        return count
+
+    def remove(self, ufos):
+        """
+        Remove the UFOs with the given indices. The remaining UFOs move
+        down to stay packed, so earlier indices are no longer valid.
+        """
+        n = self.count
+        keep = np.ones(n, dtype=bool)
+        keep[ufos] = False
+        kept = int(np.count_nonzero(keep))
+        if kept == n:
+            return
+        for name in _FIELDS + ("color",):
+            values = getattr(self, name)
+            values[:kept] = values[:n][keep]
+        self.count = kept
+
+    def _neighbor_pairs(self, x, y, bounds):
+        """
+        Pairs of different UFOs closer than UFO_NEIGHBOR_RADIUS, ordered by
+        the first one, with the offset from the first to the second and
+        its square length
+        """
+        n = len(x)
+        if self.use_grid:
+            ufos, others = grid_pairs(x, y, x, y, UFO_NEIGHBOR_RADIUS, bounds)
+        else:
+            ufos, others = np.divmod(np.arange(n * n), n)
+        dx = x[others] - x[ufos]
+        dy = y[others] - y[ufos]
+        distance2 = dx * dx + dy * dy
+        near = (distance2 < UFO_NEIGHBOR_RADIUS ** 2) & (ufos != others)
+        return ufos[near], others[near], dx[near], dy[near], distance2[near]
+
+    def steer(self, target_x, target_y, delta_time, bounds=SCREEN_BOUNDS):
+        """
+        Steer every UFO and move it, chasing (target_x, target_y) unless
+        the target is None. The neighbor grid covers bounds, the screen.
+        """
+        n = self.count
+        if n == 0:
+            return
+        x = self.center_x[:n]
+        y = self.center_y[:n]
+        change_x = self.change_x[:n]
+        change_y = self.change_y[:n]
+
+        force_x = np.zeros(n)
+        force_y = np.zeros(n)
+        if target_x is not None:
+            steer_x, steer_y = _steering(target_x - x, target_y - y, change_x, change_y)
+            force_x += steer_x * UFO_PURSUIT
+            force_y += steer_y * UFO_PURSUIT
+
+        ufos, others, dx, dy, distance2 = self._neighbor_pairs(x, y, bounds)
+        self.neighbor_pairs = len(ufos)
+        if len(ufos):
+            neighbors = np.bincount(ufos, minlength=n)
+            # sums over no neighbors stay zero and steer nowhere
+            share = 1 / np.maximum(neighbors, 1)
+
+            # separation: away from the close ones, the closer the harder
+            close = distance2 < UFO_SEPARATION_RADIUS ** 2
+            push = 1 / np.maximum(distance2[close], 1.0)
+            away_x = -np.bincount(ufos[close], dx[close] * push, minlength=n)
+            away_y = -np.bincount(ufos[close], dy[close] * push, minlength=n)
+            steer_x, steer_y = _steering(away_x, away_y, change_x, change_y)
+            force_x += steer_x * UFO_SEPARATION
+            force_y += steer_y * UFO_SEPARATION
+
+            # alignment: the average velocity of the neighbors
+            along_x = np.bincount(ufos, change_x[others], minlength=n) * share
+            along_y = np.bincount(ufos, change_y[others], minlength=n) * share
+            steer_x, steer_y = _steering(along_x, along_y, change_x, change_y)
+            force_x += steer_x * UFO_ALIGNMENT
+            force_y += steer_y * UFO_ALIGNMENT
+
+            # cohesion: towards the center of the neighbors
+            center_x = np.bincount(ufos, dx, minlength=n) * share
+            center_y = np.bincount(ufos, dy, minlength=n) * share
+            steer_x, steer_y = _steering(center_x, center_y, change_x, change_y)
+            force_x += steer_x * UFO_COHESION
+            force_y += steer_y * UFO_COHESION
+
+        steps = delta_time * STEP_RATE
+        force = np.hypot(force_x, force_y)
+        limit = np.minimum(1.0, UFO_MAX_FORCE / np.maximum(force, 1e-9)) * steps
+        change_x += force_x * limit
+        change_y += force_y * limit
+
+        speed = np.hypot(change_x, change_y)
+        limit = np.minimum(1.0, UFO_SPEED / np.maximum(speed, 1e-9))
+        change_x *= limit
+        change_y *= limit
+
+        x += change_x * steps
+        y += change_y * steps
+
+    def sweeping(self, x0, y0, x1, y1, radius, steps):
+        """
+        Indices of the UFOs a circle touched on its way from (x0, y0) to
+        (x1, y1) during the last steering step, of steps steps at
+        STEP_RATE, in which the UFOs moved too
+        """
+        n = self.count
+        if n == 0:
+            return np.zeros(0, dtype=np.intp)
+        move_x = self.change_x[:n] * steps
+        move_y = self.change_y[:n] * steps
+        _, distance2 = closest_approach(
+            self.center_x[:n] - move_x - x0, self.center_y[:n] - move_y - y0,
+            move_x - (x1 - x0), move_y - (y1 - y0),
+        )
+        reach = radius + UFO_RADIUS
+        return np.flatnonzero(distance2 < reach * reach)
+
+    def stats(self):
+        return {
+            "ufos": self.count,
+            "neighbor_pairs": self.neighbor_pairs,
+        }
@@ -0,0 +1,677 @@
+"""
+Environments for training agents against the game.
+
+GameEnv is a reset/step wrapper around one GameSimulation. VectorGameEnv
+plays num_envs games in lock-step with the whole state of every game in
+NumPy arrays of shape (num_envs, ...), so one step of all games costs a
+fixed number of array operations instead of a Python loop per game.
+
+VectorGameEnv reimplements the rules of the game: the player collides
+with the obstacles by the same cached hit boxes, once everything moved,
+swept along the way when it moves fast as in the game, and picks power
+ups along its way. python -m benchmarks.env_parity checks that both
+agree. It draws
+from its own random stream and leaves out the optional parts of the
+game, shooting, UFOs and the scrolling world.
+
+Both hand out the same observations: a float32 row of the player, the
+nearest obstacles and the nearest power ups, all positions relative to
+the player. The vectorized env writes its
+observations, rewards and done flags into arrays it allocates once and
+returns on every step, copy them to keep them.
+
+Actions are numbers below NUMBER_OF_ACTIONS: the move in MOVES at
+action % len(MOVES), dashing as well when action >= len(MOVES).
+"""
+
+import numpy as np
+
+from bot import MOVES
+from constants import (
+    SPRITE_SCALING, SCREEN_WIDTH, SCREEN_HEIGHT, STEP_RATE, HIT_BOX_ANGLE_STEP, SWEEP_MIN_MOVE,
+    PLAYER_LIVES, PLAYER_SPEED_X, PLAYER_SPEED_Y, PLAYER_START_X, PLAYER_START_Y,
+    DASHING_TIME, DASHING_SPEED, DASH_COOLDOWN, TAKING_DAMAGE_TIME, LIVES_TAKING_DAMAGE,
+    LIVES_GOTTEN_BY_POWER_UP, OBSTACLE_HARMLESS_SPEED_FACTOR, POWER_UP_SCALING,
+    POWER_UP_DESPAWN_TIME, POWER_UP_RESPAWN_TIME, SCORE_GOTTEN_BY_POWER_UP,
+    PLAYER_NORMAL_GRAPHICS, LIFE_UP_GRAPHICS, IN_GAME,
+)
+from hitboxes import hit_box_cache
+from images import image_size
+from obstacle_field import MAX_OBSTACLE_RADIUS, MAX_OBSTACLE_STEP, generate_spawn_table, obstacle_half_size
+from simulation import DEFAULT_DIFFICULTY, GameSimulation, InputState, LIFE_UP, WANTED_ANGLES
+from sweep import closest_approach
+
+DELTA_TIME = 1 / 60
+
+NUMBER_OF_ACTIONS = 2 * len(MOVES)
+ACTION_INPUTS = [
+    InputState(left=x < 0, right=x > 0, down=y < 0, up=y > 0, action=dash)
+    for dash in (False, True) for x, y in MOVES
+]
+
+# what an observation holds
+NEAREST_OBSTACLES = 8
+NEAREST_POWER_UPS = 2
+# x, y, lives, dashing, dash cooldown, damage timer, level timer
+PLAYER_FEATURES = 7
+# dx, dy, change_x, change_y, radius, harmful, present
+OBSTACLE_FEATURES = 7
+# dx, dy, life up, time left, present
+POWER_UP_FEATURES = 5
+OBSERVATION_SIZE = (
+    PLAYER_FEATURES + NEAREST_OBSTACLES * OBSTACLE_FEATURES + NEAREST_POWER_UPS * POWER_UP_FEATURES
+)
+
+REWARD_PER_STEP = 1.0
+REWARD_DAMAGE = -100.0
+REWARD_POWER_UP = 50.0
+
+_PLAYER_HALF_WIDTH = image_size(PLAYER_NORMAL_GRAPHICS)[0] * SPRITE_SCALING / 2
+_PLAYER_HALF_HEIGHT = image_size(PLAYER_NORMAL_GRAPHICS)[1] * SPRITE_SCALING / 2
+_PLAYER_RADIUS = (_PLAYER_HALF_WIDTH + _PLAYER_HALF_HEIGHT) / 2
+_POWER_UP_RADIUS = sum(image_size(LIFE_UP_GRAPHICS)) * POWER_UP_SCALING / 4
+# angle the player turns to for each move, NaN for standing still
+_MOVE_ANGLES = np.array([WANTED_ANGLES.get((int(x), int(y)), np.nan) for x, y in MOVES])
+
+
+def _nearest(px, py, x, y, alive, count):
+    """
+    Column indices of the count nearest living entries of every row,
+    nearest first, which of them exist and the squared distances to all
+    entries, infinite for the dead ones
+    """
+    dx = x - px[:, None]
+    dy = y - py[:, None]
+    distance = dx * dx + dy * dy
+    np.copyto(distance, np.inf, where=~alive)
+    rows = np.arange(len(distance))[:, None]
+    if distance.shape[1] > count:
+        index = np.argpartition(distance, count - 1, axis=1)[:, :count]
+        nearest = distance[rows, index]
+    else:
+        index = np.broadcast_to(np.arange(count), distance.shape)
+        nearest = distance
+    order = np.argsort(nearest, axis=1)
+    index = index[rows, order]
+    present = np.isfinite(nearest[rows, order])
+    return index, present, distance
+
+
+def write_observations(out, player, px, py, obstacles, power_ups):
+    """
+    Fill out, shape (games, OBSERVATION_SIZE), with the observations.
+
+    player holds the (games, PLAYER_FEATURES) player features, px and py
+    the player positions. obstacles is (x, y, change_x, change_y, radius,
+    is_harmless, alive) and power_ups (x, y, life_up, time_left, alive),
+    arrays of shape (games, slots) with at least NEAREST_OBSTACLES and
+    NEAREST_POWER_UPS slots.
+
+    Returns the squared distances from the players to all obstacles,
+    infinite for the dead ones.
+    """
+    games = len(out)
+    rows = np.arange(games)[:, None]
+    out[:, :PLAYER_FEATURES] = player
+
+    start = PLAYER_FEATURES
+    stop = start + NEAREST_OBSTACLES * OBSTACLE_FEATURES
+    view = out[:, start:stop].reshape(games, NEAREST_OBSTACLES, OBSTACLE_FEATURES)
+    x, y, change_x, change_y, radius, is_harmless, alive = obstacles
+    index, present, distance = _nearest(px, py, x, y, alive, NEAREST_OBSTACLES)
+
+    view[:, :, 0] = (x[rows, index] - px[:, None]) / SCREEN_WIDTH
+    view[:, :, 1] = (y[rows, index] - py[:, None]) / SCREEN_HEIGHT
+    view[:, :, 2] = change_x[rows, index]
+    view[:, :, 3] = change_y[rows, index]
+    view[:, :, 4] = radius[rows, index] / MAX_OBSTACLE_RADIUS
+    view[:, :, 5] = ~is_harmless[rows, index]
+    view[:, :, 6] = present
+    view *= present[:, :, None]
+
+    start = stop
+    view = out[:, start:].reshape(games, NEAREST_POWER_UPS, POWER_UP_FEATURES)
+    x, y, life_up, time_left, alive = power_ups
+    index, present, _ = _nearest(px, py, x, y, alive, NEAREST_POWER_UPS)
+    view[:, :, 0] = (x[rows, index] - px[:, None]) / SCREEN_WIDTH
+    view[:, :, 1] = (y[rows, index] - py[:, None]) / SCREEN_HEIGHT
+    view[:, :, 2] = life_up[rows, index]
+    view[:, :, 3] = time_left[rows, index] / POWER_UP_DESPAWN_TIME
+    view[:, :, 4] = present
+    view *= present[:, :, None]
+
+    return distance
+
+
+class GameEnv:
+    """
+    One GameSimulation behind a reset/step interface
+    """
+
+    def __init__(self, seed=None, difficulty=DEFAULT_DIFFICULTY, delta_time=DELTA_TIME,
+                 hit_box_angle_step=HIT_BOX_ANGLE_STEP):
+        self.seed = seed
+        self.difficulty = difficulty
+        self.delta_time = delta_time
+        self.hit_box_angle_step = hit_box_angle_step
+        self.simulation = None
+        self.observation = np.zeros((1, OBSERVATION_SIZE), dtype=np.float32)
+
+    def reset(self, seed=None):
+        """
+        Start a new game, return the first observation
+        """
+        if seed is not None:
+            self.seed = seed
+        if self.simulation is not None:
+            self.simulation.close()
+        self.simulation = GameSimulation(
+            seed=self.seed, difficulty=self.difficulty, hit_box_angle_step=self.hit_box_angle_step
+        )
+        self.simulation.step(self.delta_time, InputState(action=True))
+        # the next reset without a seed plays a different game
+        self.seed = None
+        return self._observe()
+
+    def step(self, action):
+        """
+        Play one step, return the observation, reward, whether the game is
+        over and a dict with the score and level
+        """
+        simulation = self.simulation
+        damage_events = simulation.damage_events
+        power_ups_picked = simulation.power_ups_picked
+
+        simulation.step(self.delta_time, ACTION_INPUTS[action])
+
+        reward = (
+            REWARD_PER_STEP
+            + REWARD_DAMAGE * (simulation.damage_events - damage_events)
+            + REWARD_POWER_UP * (simulation.power_ups_picked - power_ups_picked)
+        )
+        done = simulation.mode != IN_GAME
+        if done:
+            info = {"score": simulation.final_score, "level": simulation.final_level}
+        else:
+            info = {"score": int(simulation.player.score) * 10, "level": simulation.current_level}
+        return self._observe(), reward, done, info
+
+    def close(self):
+        if self.simulation is not None:
+            self.simulation.close()
+
+    def _observe(self):
+        simulation = self.simulation
+        player = simulation.player
+        field = simulation.obstacles
+
+        n = max(field.size, NEAREST_OBSTACLES)
+
+        def padded(values, fill=0):
+            result = np.full((1, n), fill, dtype=values.dtype)
+            result[0, :field.size] = values[:field.size]
+            return result
+
+        obstacles = (
+            padded(field.center_x), padded(field.center_y), padded(field.change_x), padded(field.change_y),
+            padded(field.radius), padded(field.is_harmless), padded(field.alive, False),
+        )
+
+        power_ups = np.zeros((5, 1, max(len(simulation.power_ups), NEAREST_POWER_UPS)))
+        for slot, power_up in enumerate(simulation.power_ups):
+            power_ups[:, 0, slot] = (
+                power_up.center_x, power_up.center_y, power_up.kind == LIFE_UP,
+                power_up.power_up_despawn_cooldown, power_up.alive,
+            )
+
+        features = np.array([[
+            player.center_x / SCREEN_WIDTH,
+            player.center_y / SCREEN_HEIGHT,
+            player.player_lives / PLAYER_LIVES,
+            player.is_dashing,
+            max(player.dash_cooldown, 0) / DASH_COOLDOWN,
+            player.taking_damage_timer / TAKING_DAMAGE_TIME,
+            simulation.level_timer / simulation.difficulty.level_time,
+        ]])
+        write_observations(
+            self.observation, features, np.array([player.center_x]), np.array([player.center_y]),
+            obstacles, (power_ups[0], power_ups[1], power_ups[2], power_ups[3], power_ups[4].astype(bool)),
+        )
+        return self.observation[0]
+
+
+class VectorGameEnv:
+    """
+    num_envs games stepped together, with their state in NumPy arrays.
+
+    Every game has room for max_obstacles obstacles and max_power_ups
+    power ups, levels asking for more get only as many as fit. A game that
+    ends is started again right away: its done flag is set, info holds its
+    final score and level, and its observation is the first of the new
+    game. All games draw from one random stream, so the whole batch is
+    reproducible from seed. Players collide by hit boxes rotated in steps
+    of hit_box_angle_step degrees, or by circles when it is None, as in
+    GameSimulation.
+    """
+
+    def __init__(self, num_envs, seed=None, max_obstacles=256, max_power_ups=4,
+                 difficulty=DEFAULT_DIFFICULTY, delta_time=DELTA_TIME, hit_box_angle_step=HIT_BOX_ANGLE_STEP):
+        if max_obstacles < NEAREST_OBSTACLES or max_power_ups < NEAREST_POWER_UPS:
+            raise ValueError("room for at least {} obstacles and {} power ups is needed".format(
+                NEAREST_OBSTACLES, NEAREST_POWER_UPS
+            ))
+        self.num_envs = num_envs
+        self.max_obstacles = max_obstacles
+        self.rng = np.random.default_rng(seed)
+        self.difficulty = difficulty
+        self.delta_time = delta_time
+        # collide by hit boxes like the game, by circles when it is None
+        self.hit_boxes = None if hit_box_angle_step is None else hit_box_cache(hit_box_angle_step)
+
+        n = num_envs
+        # the players and the level of every game
+        self.player_x = np.zeros(n)
+        self.player_y = np.zeros(n)
+        self.player_angle = np.zeros(n)
+        self.wanted_angle = np.zeros(n)
+        self.lives = np.zeros(n, dtype=np.int64)
+        # fractional at other step rates than STEP_RATE, as in the game
+        self.score = np.zeros(n)
+        self.is_dashing = np.zeros(n, dtype=bool)
+        self.dashing_time_left = np.zeros(n)
+        self.dash_cooldown = np.zeros(n)
+        self.taking_damage_timer = np.zeros(n)
+        self.level_timer = np.zeros(n)
+        self.current_level = np.zeros(n, dtype=np.int64)
+        self.number_of_obstacles = np.zeros(n, dtype=np.int64)
+        self.respawn_powerup = np.zeros(n)
+        self.steps = np.zeros(n, dtype=np.int64)
+
+        # the obstacles, a row per game and a column per slot, in single
+        # precision to halve the memory every step has to go through. A game never
+        # has more than number_of_obstacles of them and spawns into the
+        # lowest free slots, so only the columns below that are ever used.
+        shape = (n, max_obstacles)
+        self.x = np.zeros(shape, dtype=np.float32)
+        self.y = np.zeros(shape, dtype=np.float32)
+        self.speed_x = np.zeros(shape, dtype=np.float32)
+        self.speed_y = np.zeros(shape, dtype=np.float32)
+        self.change_x = np.zeros(shape, dtype=np.float32)
+        self.change_y = np.zeros(shape, dtype=np.float32)
+        self.half_width = np.zeros(shape, dtype=np.float32)
+        self.half_height = np.zeros(shape, dtype=np.float32)
+        self.radius = np.zeros(shape, dtype=np.float32)
+        # squared distance below which an obstacle's circle touches the player's
+        self.reach_squared = np.zeros(shape, dtype=np.float32)
+        # the hit boxes, their shape in the HitBoxCache turned by angle, and
+        # the squared distance below which their bounding circle and the
+        # player's overlap
+        self.shape = np.zeros(shape, dtype=np.int64)
+        self.angle = np.zeros(shape, dtype=np.float32)
+        self.change_angle = np.zeros(shape, dtype=np.float32)
+        self.spin = np.zeros(shape, dtype=np.float32)
+        self.bound_squared = np.zeros(shape, dtype=np.float32)
+        self.harmless_timer = np.zeros(shape, dtype=np.float32)
+        self.is_harmless = np.zeros(shape, dtype=bool)
+        self.alive = np.zeros(shape, dtype=bool)
+
+        # the power ups
+        shape = (n, max_power_ups)
+        self.power_up_x = np.zeros(shape)
+        self.power_up_y = np.zeros(shape)
+        self.power_up_life_up = np.zeros(shape, dtype=bool)
+        self.power_up_time_left = np.zeros(shape)
+        self.power_up_alive = np.zeros(shape, dtype=bool)
+
+        # handed out by reset and step, overwritten by the next step
+        self.observations = np.zeros((n, OBSERVATION_SIZE), dtype=np.float32)
+        self.rewards = np.zeros(n, dtype=np.float32)
+        self.dones = np.zeros(n, dtype=bool)
+        self.player_features = np.zeros((n, PLAYER_FEATURES))
+        self.infos = {
+            "score": np.zeros(n, dtype=np.int64),
+            "level": self.current_level,
+            "lives": self.lives,
+            "final_score": np.zeros(n, dtype=np.int64),
+            "final_level": np.zeros(n, dtype=np.int64),
+            "final_steps": np.zeros(n, dtype=np.int64),
+            # what happened in the last step
+            "damaged": np.zeros(n, dtype=bool),
+            "power_ups_picked": np.zeros(n, dtype=np.int64),
+        }
+
+    def reset(self):
+        """
+        Start all games again, return the observations
+        """
+        self._reset(np.ones(self.num_envs, dtype=bool))
+        self._observe()
+        return self.observations
+
+    def _reset(self, games):
+        """
+        Start the given games again, like leaving the start screen
+        """
+        self.player_x[games] = PLAYER_START_X
+        self.player_y[games] = PLAYER_START_Y
+        self.player_angle[games] = 0
+        self.wanted_angle[games] = 0
+        self.lives[games] = PLAYER_LIVES
+        self.score[games] = 0
+        self.is_dashing[games] = False
+        self.dashing_time_left[games] = 0
+        self.dash_cooldown[games] = 0
+        self.taking_damage_timer[games] = 0
+        self.current_level[games] = 0
+        self.number_of_obstacles[games] = self.difficulty.start_number_of_obstacles
+        self.respawn_powerup[games] = 0
+        self.steps[games] = 0
+
+        # one power up from the start screen and one for the new game
+        self.power_up_alive[games] = False
+        self._spawn_power_ups(games)
+        self._new_level(games)
+        self._spawn_power_ups(games)
+
+    def _new_level(self, games):
+        self.level_timer[games] = self.difficulty.level_time
+        growth = np.rint(self.current_level[games] * self.difficulty.obstacle_growth).astype(np.int64)
+        self.number_of_obstacles[games] += growth
+        self.current_level[games] += 1
+
+        self.alive[games] = False
+        missing = np.where(games, self.number_of_obstacles, 0)
+        self._spawn_obstacles(missing, spawn_on_edge=False)
+
+    def _columns(self):
+        """
+        Number of obstacle columns that can be in use
+        """
+        return min(self.max_obstacles, int(self.number_of_obstacles.max()))
+
+    def _spawn_obstacles(self, missing, spawn_on_edge):
+        """
+        Add missing[game] obstacles to every game, as far as there is room
+        """
+        columns = self._columns()
+        free = ~self.alive[:, :columns]
+        slots = free & (np.cumsum(free, axis=1) <= missing[:, None])
+        count = int(np.count_nonzero(slots))
+        if count == 0:
+            return
+
+        table = generate_spawn_table(self.rng, count, spawn_on_edge)
+        half_width, half_height = obstacle_half_size(table.type, table.scale)
+        self.x[:, :columns][slots] = table.center_x
+        self.y[:, :columns][slots] = table.center_y
+        self.speed_x[:, :columns][slots] = table.speed_x
+        self.speed_y[:, :columns][slots] = table.speed_y
+        self.change_x[:, :columns][slots] = 0
+        self.change_y[:, :columns][slots] = 0
+        self.half_width[:, :columns][slots] = half_width
+        self.half_height[:, :columns][slots] = half_height
+        radius = (half_width + half_height) / 2
+        self.radius[:, :columns][slots] = radius
+        self.reach_squared[:, :columns][slots] = (radius + _PLAYER_RADIUS) ** 2
+        self.angle[:, :columns][slots] = 0
+        self.change_angle[:, :columns][slots] = table.change_angle
+        self.spin[:, :columns][slots] = 0
+        hit_boxes = self.hit_boxes
+        if hit_boxes is not None:
+            self.shape[:, :columns][slots] = hit_boxes.obstacle_shapes(table.type, table.scale)
+            reach = np.hypot(half_width, half_height) + hit_boxes.reach(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING)
+            self.bound_squared[:, :columns][slots] = reach ** 2
+        self.harmless_timer[:, :columns][slots] = 0 if spawn_on_edge else self.difficulty.obstacle_harmless_time
+        self.is_harmless[:, :columns][slots] = not spawn_on_edge
+        self.alive[:, :columns][slots] = True
+
+    def _spawn_power_ups(self, games):
+        """
+        Add a power up to every given game that has room for it
+        """
+        free = ~self.power_up_alive & games[:, None]
+        slots = free & (np.cumsum(free, axis=1) == 1)
+        count = int(np.count_nonzero(slots))
+        if count == 0:
+            return
+        rng = self.rng
+        self.power_up_x[slots] = rng.integers(0, SCREEN_WIDTH + 1, count)
+        self.power_up_y[slots] = rng.integers(0, SCREEN_HEIGHT + 1, count)
+        self.power_up_life_up[slots] = rng.integers(0, 2, count).astype(bool)
+        self.power_up_time_left[slots] = POWER_UP_DESPAWN_TIME
+        self.power_up_alive[slots] = True
+
+    def _colliding(self, candidates, start_x, start_y, steps):
+        """
+        Which games' players touched one of the obstacles set in
+        candidates, a (games, columns) mask, by hit boxes or circles as in
+        the game. Players that moved from (start_x, start_y) far enough to
+        slip through an obstacle are swept along their way, the others
+        tested where everything is now.
+        """
+        move_x = self.player_x - start_x
+        move_y = self.player_y - start_y
+        swept = np.hypot(move_x, move_y) + MAX_OBSTACLE_STEP * steps >= SWEEP_MIN_MOVE
+        damaged = np.zeros(self.num_envs, dtype=bool)
+        for rows, sweep in ((~swept, False), (swept, True)):
+            # whole arrays when all games go the same way, which is usual
+            if rows.all():
+                rows = slice(None)
+            elif rows.any():
+                rows = np.flatnonzero(rows)
+            else:
+                continue
+            damaged[rows] = self._colliding_rows(rows, candidates[rows], move_x[rows], move_y[rows], steps, sweep)
+        return damaged
+
+    def _colliding_rows(self, rows, candidates, move_x, move_y, steps, sweep):
+        """
+        _colliding for the games in rows, an index or a slice, with sweep
+        telling whether to sweep them all
+        """
+        columns = candidates.shape[1]
+        # where the obstacles are relative to the players now, in single precision
+        dx = self.x[rows, :columns] - self.player_x[rows, None].astype(np.float32)
+        dy = self.y[rows, :columns] - self.player_y[rows, None].astype(np.float32)
+        if sweep:
+            # and how that changed during the step, as ObstacleField.sweeping
+            path_x = self.change_x[rows, :columns] * np.float32(steps) - move_x[:, None].astype(np.float32)
+            path_y = self.change_y[rows, :columns] * np.float32(steps) - move_y[:, None].astype(np.float32)
+            _, distance2 = closest_approach(dx - path_x, dy - path_y, path_x, path_y)
+        else:
+            distance2 = dx * dx + dy * dy
+        hit_boxes = self.hit_boxes
+        if hit_boxes is None:
+            return (candidates & (distance2 < self.reach_squared[rows, :columns])).any(axis=1)
+
+        # bounding circles first, most candidates fail those
+        close = candidates & (distance2 < self.bound_squared[rows, :columns])
+        damaged = np.zeros(len(close), dtype=bool)
+        if not close.any():
+            return damaged
+        hits, slots = np.nonzero(close)
+        games = np.arange(self.num_envs)[rows][hits]
+
+        points, normals = hit_boxes.polygon(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING, self.player_angle[games])
+        others, other_normals = hit_boxes.obstacle_polygons(self.shape[games, slots], self.angle[games, slots])
+        offsets = np.stack((dx[hits, slots], dy[hits, slots]), axis=-1)[:, None, :]
+        if sweep:
+            # swept along the whole path, from where they were at the start,
+            # as ObstacleField.sweeping_hit_box
+            moves = np.stack((path_x[hits, slots], path_y[hits, slots]), axis=-1)
+            hit = hit_boxes.sweeping(points, normals, others + offsets - moves[:, None, :], other_normals, moves)
+        else:
+            hit = hit_boxes.overlapping(points, normals, others + offsets, other_normals)
+        damaged[hits[hit]] = True
+        return damaged
+
+    def step(self, actions):
+        """
+        Play one step of every game with actions, one per game. Returns the
+        observations, rewards, done flags and info arrays.
+        """
+        delta_time = self.delta_time
+        # speeds are per step at STEP_RATE
+        steps = delta_time * STEP_RATE
+        actions = np.asarray(actions)
+        move = MOVES[actions % len(MOVES)]
+        is_dashing = self.is_dashing
+        player_x = self.player_x
+        player_y = self.player_y
+        start_x = player_x.copy()
+        start_y = player_y.copy()
+
+        columns = self._columns()
+        x = self.x[:, :columns]
+        y = self.y[:, :columns]
+        alive = self.alive[:, :columns]
+        is_harmless = self.is_harmless[:, :columns]
+        harmless_timer = self.harmless_timer[:, :columns]
+        change_x = self.change_x[:, :columns]
+        change_y = self.change_y[:, :columns]
+        half_width = self.half_width[:, :columns]
+        half_height = self.half_height[:, :columns]
+
+        # Dash
+        dash = (actions >= len(MOVES)) & ~is_dashing & (self.dash_cooldown <= 0)
+        is_dashing |= dash
+        self.dashing_time_left[dash] = DASHING_TIME
+        self.dash_cooldown[dash] = DASH_COOLDOWN
+
+        self.power_up_time_left -= delta_time
+        self.power_up_alive &= self.power_up_time_left > 0
+
+        respawn = self.respawn_powerup
+        respawn[respawn <= 0] = POWER_UP_RESPAWN_TIME
+        respawn -= delta_time
+        self._spawn_power_ups(respawn <= 0)
+
+        # Move the players, as PlayerState.update
+        dashing_time_left = self.dashing_time_left
+        dashing_time_left[is_dashing] -= delta_time
+        stopped = is_dashing & (dashing_time_left <= 0)
+        is_dashing &= ~stopped
+        dashing_time_left[stopped] = 0
+
+        timer = self.taking_damage_timer
+        np.subtract(timer, delta_time, out=timer, where=timer > 0)
+        timer[timer < 0] = 0
+
+        wanted_angle = _MOVE_ANGLES[actions % len(MOVES)]
+        np.copyto(self.wanted_angle, wanted_angle, where=~np.isnan(wanted_angle))
+        self.player_angle -= (self.player_angle - self.wanted_angle) / 10 * steps
+
+        factor = np.where(is_dashing, DASHING_SPEED * steps, steps)
+        player_x += move[:, 0] * PLAYER_SPEED_X * factor
+        player_y += move[:, 1] * PLAYER_SPEED_Y * factor
+
+        # only one side is corrected per step, as in the game
+        left = player_x - _PLAYER_HALF_WIDTH < 0
+        right = ~left & (player_x + _PLAYER_HALF_WIDTH > SCREEN_WIDTH - 1)
+        top = ~(left | right) & (player_y + _PLAYER_HALF_HEIGHT > SCREEN_HEIGHT - 1)
+        bottom = ~(left | right | top) & (player_y - _PLAYER_HALF_HEIGHT < 0)
+        player_x[left] = _PLAYER_HALF_WIDTH
+        player_x[right] = SCREEN_WIDTH - 1 - _PLAYER_HALF_WIDTH
+        player_y[top] = SCREEN_HEIGHT - 1 - _PLAYER_HALF_HEIGHT
+        player_y[bottom] = _PLAYER_HALF_HEIGHT
+
+        self.dash_cooldown[~is_dashing] -= delta_time
+
+        # Refill obstacles from the edges
+        missing = self.number_of_obstacles - np.count_nonzero(alive, axis=1)
+        if missing.any():
+            self._spawn_obstacles(missing, spawn_on_edge=True)
+
+        # Move obstacles, as ObstacleField.update
+        if steps == 1:
+            x += change_x
+            y += change_y
+        else:
+            x += change_x * steps
+            y += change_y * steps
+        gone = x - half_width > SCREEN_WIDTH
+        gone |= x + half_width < 0
+        gone |= y - half_height > SCREEN_HEIGHT
+        gone |= y + half_height < 0
+        alive &= ~gone
+        self.angle[:, :columns] += self.spin[:, :columns] * steps
+
+        # Collisions with harmful obstacles, unless dashing, once everything
+        # moved as in GameSimulation, swept when the players move fast
+        candidates = alive & ~is_harmless
+        candidates &= (~is_dashing & (self.taking_damage_timer == 0))[:, None]
+        damaged = self._colliding(candidates, start_x, start_y, steps)
+        self.taking_damage_timer[damaged] = TAKING_DAMAGE_TIME
+        self.lives -= damaged * LIVES_TAKING_DAMAGE
+
+        # Power ups, swept along the players' way as in GameSimulation
+        move_x = (player_x - start_x)[:, None]
+        move_y = (player_y - start_y)[:, None]
+        _, distance2 = closest_approach(
+            start_x[:, None] - self.power_up_x, start_y[:, None] - self.power_up_y, move_x, move_y,
+        )
+        picked = distance2 < (_POWER_UP_RADIUS + _PLAYER_RADIUS) ** 2
+        picked &= self.power_up_alive
+        self.power_up_alive &= ~picked
+        life_ups = np.count_nonzero(picked & self.power_up_life_up, axis=1)
+        picked_count = np.count_nonzero(picked, axis=1)
+        self.lives += life_ups * LIVES_GOTTEN_BY_POWER_UP
+        self.score += (picked_count - life_ups) * SCORE_GOTTEN_BY_POWER_UP
+
+        np.greater(harmless_timer, 0, out=is_harmless)
+        np.subtract(harmless_timer, delta_time, out=harmless_timer, where=is_harmless)
+        factor = np.where(is_harmless, OBSTACLE_HARMLESS_SPEED_FACTOR, 1.0)
+        np.multiply(self.speed_x[:, :columns], factor, out=change_x)
+        np.multiply(self.speed_y[:, :columns], factor, out=change_y)
+        np.multiply(self.change_angle[:, :columns], factor, out=self.spin[:, :columns])
+
+        self.level_timer -= delta_time
+        new_level = self.level_timer <= 0
+        if new_level.any():
+            self._new_level(new_level)
+
+        self.score += int((10.0 / STEP_RATE) * 10) * steps
+        self.steps += 1
+
+        rewards = self.rewards
+        rewards.fill(REWARD_PER_STEP)
+        rewards += damaged * REWARD_DAMAGE
+        rewards += picked_count * REWARD_POWER_UP
+
+        dones = self.dones
+        np.less(self.lives, 1, out=dones)
+        infos = self.infos
+        infos["damaged"][:] = damaged
+        infos["power_ups_picked"][:] = picked_count
+        # truncated like int(player.score) in the game
+        infos["score"][:] = self.score
+        infos["score"] *= 10
+        if dones.any():
+            infos["final_score"][dones] = infos["score"][dones]
+            infos["final_level"][dones] = self.current_level[dones]
+            infos["final_steps"][dones] = self.steps[dones]
+            self._reset(dones)
+            infos["score"][dones] = 0
+
+        self._observe()
+        return self.observations, rewards, dones, infos
+
+    def _observe(self):
+        features = self.player_features
+        features[:, 0] = self.player_x / SCREEN_WIDTH
+        features[:, 1] = self.player_y / SCREEN_HEIGHT
+        features[:, 2] = self.lives / PLAYER_LIVES
+        features[:, 3] = self.is_dashing
+        np.maximum(self.dash_cooldown, 0, out=features[:, 4])
+        features[:, 4] /= DASH_COOLDOWN
+        features[:, 5] = self.taking_damage_timer / TAKING_DAMAGE_TIME
+        features[:, 6] = self.level_timer / self.difficulty.level_time
+        columns = max(self._columns(), NEAREST_OBSTACLES)
+        obstacles = tuple(
+            values[:, :columns]
+            for values in (self.x, self.y, self.change_x, self.change_y, self.radius, self.is_harmless, self.alive)
+        )
+        write_observations(
+            self.observations, features, self.player_x, self.player_y, obstacles,
+            (self.power_up_x, self.power_up_y, self.power_up_life_up, self.power_up_time_left, self.power_up_alive),
+        )
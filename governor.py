@@ -0,0 +1,134 @@
+"""
+Keeping the obstacle count within the frame budget.
+
+Every level adds obstacles without end, so a long enough game asks for more
+than the machine can update and draw in a frame. LoadGovernor follows the
+measured update and draw times and, when they eat too much of the frame
+budget, first slows down how fast obstacles are refilled and then caps how
+many there may be at once. The particle effects give first: while limited
+at all, only a share of the particle budget is left to them. It lifts the
+limits again step by step once there is room. The limits are applied to
+the GameSimulation between steps and recorded in replays, so a replay
+plays the same however fast the machine it is played on is.
+"""
+
+from constants import START_NUMBER_OF_OBSTACLES, MAX_PARTICLES
+
+# states of a LoadGovernor
+WITHIN_BUDGET = "within budget"
+THROTTLED = "throttled"
+CAPPED = "capped"
+
+
+class LoadGovernor:
+    """
+    Limits obstacle spawning when update and draw time near the frame budget
+    """
+
+    def __init__(self, frame_budget=1 / 60, target_load=0.75, smoothing=0.05, throttled_refill=2,
+                 min_obstacles=START_NUMBER_OF_OBSTACLES, settle_time=0.5, particle_budget=MAX_PARTICLES,
+                 limited_particle_share=0.25):
+        """
+        frame_budget is the seconds a frame may take, of which update and
+        draw should use target_load. smoothing is the weight of a new
+        measurement in the running averages. While throttled at most
+        throttled_refill obstacles are refilled per step, and the cap never
+        goes below min_obstacles. After changing the cap the governor waits
+        settle_time seconds for the averages to follow before changing it
+        again. Effects may have up to particle_budget particles, and
+        limited_particle_share of that while throttled or capped.
+        """
+        self.frame_budget = frame_budget
+        self.target_load = target_load
+        self.smoothing = smoothing
+        self.throttled_refill = throttled_refill
+        self.min_obstacles = min_obstacles
+        self.settle_time = settle_time
+        self.full_particle_budget = particle_budget
+        self.limited_particle_budget = int(particle_budget * limited_particle_share)
+
+        # running averages of the measured times, in seconds
+        self.update_time = 0.0
+        self.draw_time = 0.0
+
+        self.state = WITHIN_BUDGET
+        self.obstacle_cap = None
+        self.refill_per_step = None
+        self.particle_budget = particle_budget
+        self.time_since_change = settle_time
+
+        # seconds spent throttled or capped, to tell how fair a score is
+        self.limited_time = 0.0
+
+    def record_update(self, seconds):
+        self.update_time += (seconds - self.update_time) * self.smoothing
+
+    def record_draw(self, seconds):
+        self.draw_time += (seconds - self.draw_time) * self.smoothing
+
+    @property
+    def load(self):
+        """
+        Share of the frame budget update and draw take
+        """
+        return (self.update_time + self.draw_time) / self.frame_budget
+
+    def adjust(self, delta_time, obstacles, wanted):
+        """
+        Update the limits for a game with obstacles on the field that wants
+        wanted of them
+        """
+        load = self.load
+        self.time_since_change += delta_time
+        settled = self.time_since_change >= self.settle_time
+
+        if load > 1.0 and settled:
+            # over budget: cut the cap to what the target load allows
+            cap = max(int(obstacles * self.target_load / load), self.min_obstacles)
+            if self.obstacle_cap is None or cap < self.obstacle_cap:
+                self.obstacle_cap = cap
+                self.time_since_change = 0.0
+        elif load < self.target_load * 0.8 and settled and self.obstacle_cap is not None:
+            # room to spare: let a few more in
+            self.obstacle_cap += max(1, self.obstacle_cap // 20)
+            self.time_since_change = 0.0
+            if self.obstacle_cap >= wanted:
+                self.obstacle_cap = None
+
+        if load > self.target_load or self.obstacle_cap is not None:
+            self.refill_per_step = self.throttled_refill
+        else:
+            self.refill_per_step = None
+
+        if self.obstacle_cap is not None:
+            self.state = CAPPED
+        elif self.refill_per_step is not None:
+            self.state = THROTTLED
+        else:
+            self.state = WITHIN_BUDGET
+        if self.state != WITHIN_BUDGET:
+            self.limited_time += delta_time
+            self.particle_budget = self.limited_particle_budget
+        else:
+            self.particle_budget = self.full_particle_budget
+
+    def apply(self, simulation, delta_time):
+        """
+        Adjust the limits to the game and set them on the simulation
+        """
+        self.adjust(delta_time, len(simulation.obstacles), simulation.number_of_obstacles)
+        simulation.obstacle_cap = self.obstacle_cap
+        simulation.refill_per_step = self.refill_per_step
+        simulation.particles.budget = self.particle_budget
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "load": self.load,
+            "update_ms": self.update_time * 1000,
+            "draw_ms": self.draw_time * 1000,
+            "obstacle_cap": self.obstacle_cap,
+            "refill_per_step": self.refill_per_step,
+            "particle_budget": self.particle_budget,
+            "limited_time": self.limited_time,
+        }
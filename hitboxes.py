@@ -0,0 +1,277 @@
+"""
+Cached hit box geometry.
+
+The hit box of an image is the convex hull of its opaque pixels, cut down
+to a few vertices. It only depends on the image and the scale it is drawn
+at, so it is computed once per (image, scale) and then looked up. Rotating
+it is done ahead of time too: the angle is rounded to a multiple of the
+angle step and every rotation is precomputed along with the edge normals
+collision testing needs, so a collision check is a table lookup and a
+batched separating axis test. The obstacle tables cover every meteor type
+and scale at once, so a whole batch of candidates is looked up with one
+fancy index.
+"""
+
+import numpy as np
+from PIL import Image
+
+from constants import SPRITE_SCALING, HIT_BOX_ANGLE_STEP
+from obstacle_field import OBSTACLE_TYPES, OBSTACLE_MIN_SCALE, OBSTACLE_MAX_SCALE
+
+# pixels at least this opaque are part of the hit box
+ALPHA_THRESHOLD = 128
+# most vertices of a hit box, more follow the image closer but test slower
+MAX_VERTICES = 10
+
+_outlines = {}
+
+
+def _convex_hull(points):
+    """
+    Convex hull of a list of (x, y) tuples, counterclockwise
+    """
+    points = sorted(set(points))
+    if len(points) < 3:
+        return points
+
+    def half(points):
+        hull = []
+        for point in points:
+            while len(hull) >= 2:
+                (ax, ay), (bx, by) = hull[-2], hull[-1]
+                if (bx - ax) * (point[1] - ay) - (by - ay) * (point[0] - ax) > 0:
+                    break
+                hull.pop()
+            hull.append(point)
+        return hull[:-1]
+
+    return half(points) + half(points[::-1])
+
+
+def _simplify(hull, max_vertices):
+    """
+    Drop the vertices that add the least area until max_vertices are left.
+    The result stays convex and inside the hull.
+    """
+    hull = list(hull)
+    while len(hull) > max_vertices:
+        areas = []
+        for i in range(len(hull)):
+            (ax, ay), (bx, by), (cx, cy) = hull[i - 1], hull[i], hull[(i + 1) % len(hull)]
+            areas.append(abs((bx - ax) * (cy - ay) - (by - ay) * (cx - ax)))
+        del hull[areas.index(min(areas))]
+    return hull
+
+
+def outline(path):
+    """
+    Unscaled hit box of an image as a (vertices, 2) array of points around
+    its center, y pointing up like arcade's coordinates
+    """
+    points = _outlines.get(path)
+    if points is None:
+        alpha = np.asarray(Image.open(path).convert("RGBA"))[:, :, 3]
+        height, width = alpha.shape
+        opaque = alpha >= ALPHA_THRESHOLD
+        corners = []
+        # only the outermost pixels of a row can be on the hull
+        for row in np.flatnonzero(opaque.any(axis=1)):
+            columns = np.flatnonzero(opaque[row])
+            for column in (columns[0], columns[-1] + 1):
+                corners.append((column - width / 2, height / 2 - row))
+                corners.append((column - width / 2, height / 2 - row - 1))
+        points = np.array(_simplify(_convex_hull(corners), MAX_VERTICES), dtype=float)
+        _outlines[path] = points
+    return points
+
+
+def _normals(polygons):
+    """
+    Edge normals of polygons given as a (..., vertices, 2) array
+    """
+    edges = np.roll(polygons, -1, axis=-2) - polygons
+    return np.stack((-edges[..., 1], edges[..., 0]), axis=-1)
+
+
+def _pad(points, vertices):
+    """
+    Repeat the last point up to the given number of vertices. The repeated
+    points make zero length edges, whose normals never separate anything.
+    """
+    return np.concatenate((points, np.repeat(points[-1:], vertices - len(points), axis=0)))
+
+
+def overlapping(points, normals, others, other_normals):
+    """
+    Which of a batch of convex polygons overlap a convex polygon.
+
+    points and normals are (vertices, 2) arrays, others and other_normals
+    (polygons, vertices, 2) arrays in the same coordinates. Returns a bool
+    array with one entry per polygon in others. points and normals can
+    also be (polygons, vertices, 2) arrays, to test pairs of polygons.
+    """
+    # separating axis test on the edge normals of both polygons of each pair
+    normals = np.broadcast_to(normals, (len(others),) + normals.shape[-2:])
+    axes = np.concatenate((normals, other_normals), axis=1)
+    # vertices in the middle axis, numpy reduces those much faster than a
+    # short last axis
+    axes = axes.transpose(0, 2, 1)
+    projected = points @ axes
+    projected_others = others @ axes
+    separated = (
+        (projected.max(axis=1) < projected_others.min(axis=1))
+        | (projected_others.max(axis=1) < projected.min(axis=1))
+    )
+    return ~separated.any(axis=1)
+
+
+def sweeping(points, normals, others, other_normals, moves):
+    """
+    Which of a batch of convex polygons overlap a convex polygon anywhere
+    on their way, moving by moves, a (polygons, 2) array, in a straight
+    line from where others has them. Takes the same arrays as overlapping().
+    """
+    # separating axis test on the same axes, swept: on every axis the
+    # moving projection overlaps during an interval of the way, and the
+    # polygons touch if the intervals of all axes have a moment in common
+    normals = np.broadcast_to(normals, (len(others),) + normals.shape[-2:])
+    axes = np.concatenate((normals, other_normals), axis=1).transpose(0, 2, 1)
+    projected = points @ axes
+    projected_others = others @ axes
+    speed = (moves[:, None, :] @ axes)[:, 0, :]
+    # the projections overlap while low <= speed * fraction <= high
+    low = projected.min(axis=1) - projected_others.max(axis=1)
+    high = projected.max(axis=1) - projected_others.min(axis=1)
+    still = speed == 0
+    speed = np.where(still, 1.0, speed)
+    first = low / speed
+    last = high / speed
+    enter = np.where(still, np.where((low <= 0) & (high >= 0), -np.inf, np.inf), np.minimum(first, last))
+    leave = np.where(still, np.inf, np.maximum(first, last))
+    return np.maximum(enter.max(axis=1), 0.0) <= np.minimum(leave.min(axis=1), 1.0)
+
+
+class HitBoxCache:
+    """
+    Hit boxes keyed by (image, scale), rotated in steps of angle_step degrees
+    """
+
+    def __init__(self, angle_step=HIT_BOX_ANGLE_STEP):
+        self.rotations = max(int(round(360 / angle_step)), 1)
+        self.angle_step = 360 / self.rotations
+
+        self._base = {}
+        self._rotated = {}
+
+        # per obstacle type and scale, built on first use
+        self._obstacle_points = None
+        self._obstacle_normals = None
+
+    def rotation(self, angle):
+        """
+        Index of the precomputed rotation closest to angle, in degrees.
+        Works on arrays of angles too.
+        """
+        return np.rint(np.asarray(angle) / self.angle_step).astype(np.int64) % self.rotations
+
+    def _rotate_all(self, points):
+        """
+        points at every precomputed rotation, a (rotations, vertices, 2) array
+        """
+        radians = np.radians(np.arange(self.rotations) * self.angle_step)
+        cos = np.cos(radians)[:, None]
+        sin = np.sin(radians)[:, None]
+        x = points[:, 0]
+        y = points[:, 1]
+        return np.stack((x * cos - y * sin, x * sin + y * cos), axis=-1)
+
+    def base(self, path, scale):
+        """
+        Unrotated hit box of an image drawn at scale
+        """
+        key = (path, scale)
+        points = self._base.get(key)
+        if points is None:
+            points = outline(path) * scale
+            self._base[key] = points
+        return points
+
+    def _rotations(self, path, scale):
+        key = (path, scale)
+        rotated = self._rotated.get(key)
+        if rotated is None:
+            points = self._rotate_all(self.base(path, scale))
+            reach = float(np.hypot(points[0, :, 0], points[0, :, 1]).max())
+            rotated = (points, _normals(points), reach)
+            self._rotated[key] = rotated
+        return rotated
+
+    def polygon(self, path, scale, angle):
+        """
+        Points and edge normals of the hit box of an image drawn at scale
+        and turned by angle degrees, around its center. For an array of
+        angles they come as (angles, vertices, 2) arrays.
+        """
+        points, normals, _ = self._rotations(path, scale)
+        index = self.rotation(angle)
+        return points[index], normals[index]
+
+    def reach(self, path, scale):
+        """
+        Farthest the hit box of an image drawn at scale gets from its center
+        """
+        return self._rotations(path, scale)[2]
+
+    def _build_obstacles(self):
+        scales = range(OBSTACLE_MIN_SCALE, OBSTACLE_MAX_SCALE + 1)
+        vertices = max(len(outline(info["graphics"])) for info in OBSTACLE_TYPES.values())
+        shapes = (len(OBSTACLE_TYPES) + 1) * len(scales)
+        points = np.zeros((shapes, self.rotations, vertices, 2))
+        for type, info in OBSTACLE_TYPES.items():
+            for index, multiple in enumerate(scales):
+                shape = type * len(scales) + index
+                points[shape] = self._rotate_all(_pad(self.base(info["graphics"], SPRITE_SCALING * multiple), vertices))
+        self._obstacle_normals = _normals(points)
+        self._obstacle_points = points
+
+    def obstacle_shapes(self, types, scales):
+        """
+        Index of the hit box of obstacles of the given types and scales, for
+        obstacle_polygons
+        """
+        if self._obstacle_points is None:
+            self._build_obstacles()
+        multiple = np.rint(scales * (1 / SPRITE_SCALING)).astype(np.int64)
+        multiple += types * (OBSTACLE_MAX_SCALE - OBSTACLE_MIN_SCALE + 1) - OBSTACLE_MIN_SCALE
+        return multiple
+
+    def obstacle_polygons(self, shapes, angles):
+        """
+        Points and edge normals of the hit boxes of obstacles around their
+        centers, as (obstacles, vertices, 2) arrays
+        """
+        rotations = self.rotation(angles)
+        return self._obstacle_points[shapes, rotations], self._obstacle_normals[shapes, rotations]
+
+    overlapping = staticmethod(overlapping)
+    sweeping = staticmethod(sweeping)
+
+    def stats(self):
+        return {
+            "angle_step": self.angle_step,
+            "rotations": self.rotations,
+            "shapes": len(self._base),
+        }
+
+
+_caches = {}
+
+
+def hit_box_cache(angle_step=HIT_BOX_ANGLE_STEP):
+    """
+    The HitBoxCache shared by everything using the given angle step
+    """
+    cache = _caches.get(angle_step)
+    if cache is None:
+        cache = _caches[angle_step] = HitBoxCache(angle_step)
+    return cache
@@ -0,0 +1,150 @@
+"""
+Heads-up display.
+
+The HUD keeps one persistent text label per line instead of laying out the
+text again with arcade.draw_text every frame. A label's text is only
+changed when the value it shows changes, and all labels of a screen are
+drawn together from one pyglet batch.
+"""
+
+import arcade
+import pyglet
+
+from constants import SCREEN_WIDTH, SCREEN_HEIGHT, IN_START_SCREEN, IN_GAME, DEATH_SCREEN
+
+FONT_NAME = ("calibri", "arial")
+
+
+class Hud:
+    """
+    All text drawn on top of the game
+    """
+
+    def __init__(self):
+        self.batches = {
+            IN_GAME: pyglet.graphics.Batch(),
+            IN_START_SCREEN: pyglet.graphics.Batch(),
+            DEATH_SCREEN: pyglet.graphics.Batch(),
+        }
+
+        # In game lines: the label, how to format its value and the value shown
+        self.lines = {
+            "lives": self._label(IN_GAME, 10, SCREEN_HEIGHT - 20),
+            "wingman": self._label(IN_GAME, 130, SCREEN_HEIGHT - 20),
+            "score": self._label(IN_GAME, 10, SCREEN_HEIGHT - 40),
+            "level_timer": self._label(IN_GAME, 10, SCREEN_HEIGHT - 60),
+            "level": self._label(IN_GAME, 10, SCREEN_HEIGHT - 80),
+            "load": self._label(IN_GAME, 10, SCREEN_HEIGHT - 100),
+        }
+        self.formats = {
+            "lives": "LIVES: {}",
+            "wingman": "WINGMAN: {}",
+            "score": "score: {}",
+            "level_timer": "Next level in: {}",
+            "level": "Level: {}",
+            "load": "performance: {}",
+        }
+        self.shown = dict.fromkeys(self.lines)
+
+        # The start and death screens never change
+        self._label(IN_START_SCREEN, SCREEN_WIDTH/2 - 250, SCREEN_HEIGHT/2, 50, "press space to start")
+        self._label(
+            DEATH_SCREEN, SCREEN_WIDTH/2 - 375, SCREEN_HEIGHT/2, 30,
+            "you die press space to return to start screen"
+        )
+
+        # number of times a label had to be laid out again
+        self.text_updates = 0
+
+    def _label(self, mode, x, y, font_size=12, text=""):
+        return pyglet.text.Label(
+            text=text,
+            x=x,
+            y=y,
+            font_name=FONT_NAME,
+            font_size=font_size,
+            color=arcade.get_four_byte_color(arcade.color.WHITE),
+            batch=self.batches[mode],
+        )
+
+    def show(self, name, value):
+        """
+        Show value on a line, the label is only touched if it changed
+        """
+        if self.shown[name] != value:
+            self.shown[name] = value
+            self.lines[name].text = self.formats[name].format(value)
+            self.text_updates += 1
+
+    def update(self, simulation):
+        """
+        Take the displayed values from a GameSimulation
+        """
+        if simulation.mode != IN_GAME:
+            return
+
+        self.show("lives", simulation.player.player_lives)
+        if simulation.wingman is not None:
+            self.show("wingman", simulation.wingman.player_lives)
+        self.show("score", int(simulation.player.score) * 10)
+        self.show("level_timer", int(simulation.level_timer))
+        self.show("level", int(simulation.current_level))
+
+    def draw(self, mode):
+        """
+        Draw the text of the given mode in one batch
+        """
+        batch = self.batches.get(mode)
+        if batch is None:
+            return
+        # raw pyglet drawing needs arcade's pyglet rendering state
+        with arcade.get_window().ctx.pyglet_rendering():
+            batch.draw()
+
+
+class ProfileOverlay:
+    """
+    Frame timing of a FrameProfiler drawn in the top right corner
+    """
+
+    # seconds between refreshes of the text
+    REFRESH_TIME = 0.5
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.visible = False
+        self.time_since_refresh = self.REFRESH_TIME
+        self.label = pyglet.text.Label(
+            text="",
+            x=SCREEN_WIDTH - 10,
+            y=SCREEN_HEIGHT - 10,
+            width=420,
+            multiline=True,
+            anchor_x="right",
+            anchor_y="top",
+            font_name=("courier new", "courier", "monospace"),
+            font_size=10,
+            color=arcade.get_four_byte_color(arcade.color.YELLOW),
+        )
+
+    def update(self, delta_time):
+        """
+        Refresh the text a few times per second
+        """
+        if not self.visible:
+            return
+        self.time_since_refresh += delta_time
+        if self.time_since_refresh < self.REFRESH_TIME:
+            return
+        self.time_since_refresh = 0
+
+        lines = ["{:<16}{:>8}{:>8}{:>8}".format("ms", "p50", "p99", "max")]
+        for name, stats in self.profiler.summary().items():
+            lines.append("{:<16}{:>8.2f}{:>8.2f}{:>8.2f}".format(name, stats["p50"], stats["p99"], stats["max"]))
+        self.label.text = "\n".join(lines)
+
+    def draw(self):
+        if not self.visible:
+            return
+        with arcade.get_window().ctx.pyglet_rendering():
+            self.label.draw()
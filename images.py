@@ -0,0 +1,21 @@
+"""
+Headless helpers for the image files the game uses.
+"""
+
+import struct
+
+_image_sizes = {}
+
+
+def image_size(path):
+    """
+    Width and height of a PNG image, read from its header so no image
+    library is needed
+    """
+    size = _image_sizes.get(path)
+    if size is None:
+        with open(path, "rb") as f:
+            header = f.read(24)
+        size = struct.unpack(">II", header[16:24])
+        _image_sizes[path] = size
+    return size
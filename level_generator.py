@@ -0,0 +1,156 @@
+"""
+Level generation ahead of time.
+
+LevelGenerator rolls the spawn table of the next level while the current
+one is being played, optionally on a worker thread, so starting a level
+only has to pick up a finished table. SpawnScheduler then puts the rows of
+that table into the ObstacleField, optionally a few per step so even a
+level with thousands of obstacles does not cost a single long frame.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from obstacle_field import generate_spawn_table
+
+
+class LevelGenerator:
+    """
+    Prepares the spawn table of the next level.
+
+    The generator has its own random number stream, so the tables it hands
+    out do not depend on when the worker thread gets to run.
+    """
+
+    def __init__(self, seed=None, use_thread=True):
+        self.rng = np.random.default_rng(seed)
+        self._executor = None
+        if use_thread:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-generator")
+
+        self._future = None
+        self._table = None
+
+        # levels that found their table ready and levels that had to roll it
+        self.hits = 0
+        self.misses = 0
+
+    def _wait(self):
+        """
+        The prepared table, waiting for the worker if it is still busy
+        """
+        if self._future is not None:
+            self._table = self._future.result()
+            self._future = None
+        table = self._table
+        self._table = None
+        return table
+
+    def prepare(self, count):
+        """
+        Start rolling a level of count obstacles
+        """
+        self._wait()
+        if self._executor is not None:
+            self._future = self._executor.submit(generate_spawn_table, self.rng, count)
+        else:
+            self._table = generate_spawn_table(self.rng, count)
+
+    def peek(self):
+        """
+        The prepared table without taking it, None if there is none
+        """
+        self._table = self._wait()
+        return self._table
+
+    def put(self, table):
+        """
+        Make table the prepared one, like a restored save state had it
+        """
+        self._wait()
+        self._table = table
+
+    def take(self, count):
+        """
+        The spawn table for a level of count obstacles.
+
+        Uses the prepared table if it has the right size, otherwise rolls a
+        new one right away.
+        """
+        table = self._wait()
+        if table is None or len(table) != count:
+            self.misses += 1
+            table = generate_spawn_table(self.rng, count)
+        else:
+            self.hits += 1
+        return table
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+class SpawnScheduler:
+    """
+    Spawns the rows of a spawn table into an ObstacleField.
+
+    With per_step set at most that many obstacles are spawned each step,
+    otherwise the whole table is spawned at once.
+    """
+
+    def __init__(self, per_step=None):
+        self.per_step = per_step
+        self.table = None
+        self.cursor = 0
+        self.stop = 0
+
+    @property
+    def pending(self):
+        """
+        Obstacles of the current table that are not spawned yet
+        """
+        if self.table is None:
+            return 0
+        return self.stop - self.cursor
+
+    def clear(self):
+        self.table = None
+        self.cursor = 0
+        self.stop = 0
+
+    def start(self, field, table, count=None):
+        """
+        Begin spawning the first count rows of table, all of them by
+        default. The first batch is spawned right away.
+        """
+        self.table = table
+        self.cursor = 0
+        self.stop = len(table)
+        if count is not None:
+            self.limit(count)
+        self.step(field)
+
+    def limit(self, count):
+        """
+        Spawn at most count more obstacles of the current table
+        """
+        if self.table is not None:
+            self.stop = min(self.stop, self.cursor + max(count, 0))
+
+    def step(self, field):
+        """
+        Spawn the next batch
+        """
+        if self.table is None:
+            return
+
+        stop = self.stop
+        if self.per_step is not None:
+            stop = min(self.cursor + self.per_step, stop)
+        field.materialize(self.table, self.cursor, stop)
+        self.cursor = stop
+
+        if self.cursor >= self.stop:
+            self.clear()
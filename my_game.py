@@ -5,288 +5,158 @@ This program uses the Arcade library found at http://arcade.academy
 
 Artwork from https://kenney.nl/assets/space-shooter-redux
 
+The game logic lives in simulation.py, this module only feeds it input and
+draws its state.
 """
 
+import argparse
+import gc
+import time
+
 import arcade
-import random
-
-SPRITE_SCALING = 0.4
-
-# Set the size of the screen
-SCREEN_WIDTH = 2000
-SCREEN_HEIGHT = 1600
-
-# Variables controlling the player
-PLAYER_LIVES = 5
-PLAYER_SPEED_X = 5
-PLAYER_SPEED_Y = 5
-PLAYER_START_X = SCREEN_WIDTH / 2
-PLAYER_START_Y = SCREEN_HEIGHT / 2
-PLAYER_SHOT_SPEED = 4
-OBSTACLE_SPEED = 6
-DASHING_TIME = 0.2
-DASHING_SPEED = 7
-DASH_COOLDOWN = DASHING_TIME + 0.5
-OBSTACLE_HARMLESS_TIME = 2.5
-OBSTACLE_HARMLESS_ALPHA = 100
-OBSTACLE_HARMLESS_SPEED_FACTOR = 0.3
-# length of a level in seconds
-LEVEL_TIME = 3.5
-
-TAKING_DAMAGE_TIME = 0.75
-LIVES_TAKING_DAMAGE = 1
-LIVES_GOTTEN_BY_POWER_UP = 1
-DASH_ALPHA = 150
+
+from constants import (
+    SPRITE_SCALING, SCREEN_WIDTH, SCREEN_HEIGHT, SIMULATION_RATE, MAX_SHOTS, MAX_PARTICLES,
+    START_NUMBER_OF_OBSTACLES, LEVEL_SPAWN_PER_STEP,
+    POWER_UP_SCALING, PLAYER_NORMAL_GRAPHICS, PLAYER_TAKING_DAMAGE_GRAPHICS,
+    LIFE_UP_GRAPHICS, SCORE_UP_GRAPHICS, PLAYER_SHOT_GRAPHICS, UFO_GRAPHICS, MAX_UFOS,
+    IN_GAME, DEATH_SCREEN, REWIND_STEPS, NET_PORT, SCORES_PATH,
+)
+from assets import registry
+from governor import LoadGovernor
+from hud import Hud, ProfileOverlay
+from net_client import NetClient
+from netcode import PILOT, SPECTATOR
+from obstacle_field import OBSTACLE_TYPES
+from pools import Pool
+from particles import PARTICLE_KINDS, FIRE
+from profiling import FrameProfiler
+from projectiles import positions_at as shot_positions_at
+from world import camera_origin
+from replay import ReplayRecorder
+import savestate
+from savestate import RewindBuffer
+from scores import ScoreStore, Session
+from sim_thread import SimulationThread
+from simulation import GameSimulation, InputState, SCORE_UP
+from timestep import FixedTimestep, Interpolation
 
 DASHING_KEY = arcade.key.SPACE
+FIRE_KEY = arcade.key.X
+# the joystick button that fires, the others dash
+FIRE_BUTTON = 1
+PROFILE_OVERLAY_KEY = arcade.key.F3
+PROFILE_DUMP_KEY = arcade.key.F4
+REWIND_KEY = arcade.key.BACKSPACE
+RESTART_KEY = arcade.key.R
+QUICK_SAVE_KEY = arcade.key.F5
+QUICK_LOAD_KEY = arcade.key.F9
+
+# Most unused sprites kept around for reuse
+OBSTACLE_POOL_SIZE = 2000
+POWER_UP_POOL_SIZE = 8
+PLAYER_SHOT_POOL_SIZE = MAX_SHOTS
+UFO_POOL_SIZE = MAX_UFOS
+PARTICLE_POOL_SIZE = MAX_PARTICLES
+
 
 class Player(arcade.Sprite):
     """
     The player
     """
 
-    def __init__(self, **kwargs):
+    def __init__(self, state, **kwargs):
         """
-        Setup new Player object
+        Setup new Player object drawing the given PlayerState
         """
 
+        self.taking_damage_texture = registry.texture(PLAYER_TAKING_DAMAGE_GRAPHICS)
+        self.normal_texture = registry.texture(PLAYER_NORMAL_GRAPHICS)
+
         # How much to scale the graphics
         kwargs['scale'] = SPRITE_SCALING
+        kwargs['texture'] = self.normal_texture
 
         # Pass arguments to class arcade.Sprite
         super().__init__(**kwargs)
 
-        self.taking_damage_timer = 0
-        self.taking_damage_path = "images/playerShip1_red.png"
-        self.normal_path = "images/playerShip1_blue.png"
-
-        self.texture = arcade.load_texture(self.normal_path)
-
-        self.player_lives = PLAYER_LIVES
+        self.state = state
 
-        self.wanted_angle = 0
+        # the texture is only swapped when this changes
+        self.showing_damage = False
 
-        self.score = 0
-
-        self.is_dashing = False
-        self.dashing_time_left = 0
-        self.dash_cooldown = 0
-
-    def dash(self):
+    def sync(self, center_x, center_y, angle):
         """
-        Enable Dashing
+        Copy the simulated player to the sprite, drawn at the given
+        position and angle
         """
-        if not self.is_dashing and self.dash_cooldown <= 0:
-            self.is_dashing = True
-            self.dashing_time_left = DASHING_TIME
-            self.dash_cooldown = DASH_COOLDOWN
-            self.alpha = DASH_ALPHA
-
-    def taking_damage(self):
-        if self.taking_damage_timer == 0:
-            self.taking_damage_timer = TAKING_DAMAGE_TIME
-            self.texture = arcade.load_texture(self.taking_damage_path)
-            self.player_lives -= LIVES_TAKING_DAMAGE
+        state = self.state
 
-    def getting_life(self, number_of_lives):
-        self.player_lives += number_of_lives
-
-    def update(self, delta_time):
-        """
-        Move the sprite
-        """
-        if self.is_dashing:
-            self.dashing_time_left -= delta_time
-            if self.dashing_time_left <= 0:
-                self.is_dashing = False
-                self.dashing_time_left = 0
-                self.alpha = 255
+        taking_damage = state.taking_damage_timer > 0
+        if taking_damage != self.showing_damage:
+            self.showing_damage = taking_damage
+            if taking_damage:
+                self.texture = self.taking_damage_texture
+            else:
+                self.texture = self.normal_texture
 
-        if self.taking_damage_timer > 0:
-            self.taking_damage_timer -= delta_time
-        elif self.taking_damage_timer <= 0:
-            self.texture = arcade.load_texture(self.normal_path)
-            self.taking_damage_timer = 0
-
-        d = self.angle - self.wanted_angle
-        self.angle -= d / 10
-        #if self.wanted_angle < 0:
-        #    if self.angle > self.wanted_angle:
-        #        self.angle -= delta_time
-        #else:
-        #    if self.angle < self.wanted_angle:
-        #        self.angle += delta_time
+        self.center_x = center_x
+        self.center_y = center_y
+        self.angle = angle
+        self.alpha = state.alpha
 
-        # Update center_x
-        if self.is_dashing:
-            self.center_x += self.change_x * DASHING_SPEED
-            self.center_y += self.change_y * DASHING_SPEED
-        else:
-            self.center_x += self.change_x
-            self.center_y += self.change_y
-
-        # Don't let the player move off-screen
-        if self.left < 0:
-            self.left = 0
-        elif self.right > SCREEN_WIDTH - 1:
-            self.right = SCREEN_WIDTH - 1
-        elif self.top > SCREEN_HEIGHT - 1:
-            self.top = SCREEN_HEIGHT - 1
-        elif self.bottom < 0:
-            self.bottom = 0
-
-        if not self.is_dashing:
-            self.dash_cooldown -= delta_time
 
 class PowerUp(arcade.Sprite):
-    def __init__(self):
-
-        super().__init__("images/power-ups/pill_red.png", SPRITE_SCALING * 6.4)
-
-        self.center_x = random.randint(0,SCREEN_WIDTH)
-        self.center_y = random.randint(0,SCREEN_HEIGHT)
-        self.power_up_despawn_cooldown = 5
-        self.alpha = 255
-        self.power_up_function = random.choice([self.life_up, self.score_up])
+    """
+    A power up pill
+    """
 
-        if self.power_up_function == self.score_up:
-            self.texture = arcade.load_texture("images/power-ups/pill_blue.png")
+    def __init__(self, state):
 
-    def on_update(self, delta_time):
+        super().__init__(texture=self.texture_for(state), scale=POWER_UP_SCALING)
 
-        self.power_up_despawn_cooldown -= delta_time
+        self.state = state
 
-        if self.power_up_despawn_cooldown <= 0:
-            self.kill_yourself()
+    @staticmethod
+    def texture_for(state):
+        if state.kind == SCORE_UP:
+            return registry.texture(SCORE_UP_GRAPHICS)
+        return registry.texture(LIFE_UP_GRAPHICS)
 
-    def kill_yourself(self):
-        self.kill()
+    def reset(self, state):
+        self.texture = self.texture_for(state)
+        self.state = state
+        self.visible = True
 
+    def sync(self):
+        self.center_x = self.state.center_x
+        self.center_y = self.state.center_y
 
-    def score_up(self, player):
-        player.score += 20000
-
-    def life_up(self, player):
-        player.getting_life(LIVES_GOTTEN_BY_POWER_UP)
 
 class Obstacle(arcade.Sprite):
     """
     obstacles to dodge
     """
 
-    obstacle_max_speed = 3
-
-    types = {
-        1: {
-            "vectors": [
-                [1, 0], # right
-                [-1, 0],  # left
-                [0, 1], # up
-                [0, -1], # down
-                [1, 1],
-                [-1, -1],
-                [1, -1],
-                [-1, 1]
-            ],
-            "graphics": "images/Meteors/meteorGrey_med2.png",
-            # "scaling": random.randint(3, 8)
-        },
-        2: {
-            "vectors": [
-                [1, 0],  # right
-                [-1, 0],  # left
-                [0, 1],  # up
-                [0, -1],  # down
-                [1, 1],
-                [-1, -1],
-                [1, -1],
-                [-1, 1]
-            ],
-            "graphics": "images/Meteors/meteorBrown_med3.png",
-            # "scaling": random.randint(4, 9)
-        },
-        3: {
-            "vectors": [
-                [1, 0],  # right
-                [-1, 0],  # left
-                [0, 1],  # up
-                [0, -1],  # down
-                [1, 1],
-                [-1, -1],
-                [1, -1],
-                [-1, 1]
-            ],
-            "graphics": "images/Meteors/meteorGrey_tiny2.png",
-            # "scaling": random.randint(4, 9),
-        }
-    }
-    def __init__(self, speed, type=1, spawn_on_edge=False):
-
-        super().__init__(Obstacle.types[type]["graphics"], SPRITE_SCALING * random.randint(4, 9))
-
-        if spawn_on_edge:
-            spawn_positions = [
-                (random.randint(0, SCREEN_WIDTH), SCREEN_HEIGHT), # Top edge
-                (SCREEN_WIDTH, random.randint(0, SCREEN_HEIGHT)), # Right
-                (0, random.randint(0, SCREEN_HEIGHT)), # Left
-                (random.randint(0, SCREEN_WIDTH), 0) #
-            ]
-            self.center_x, self.center_y = random.choice(spawn_positions)
-        else:
-            self.center_x = random.randint(0, SCREEN_WIDTH)
-            self.center_y = random.randint(0, SCREEN_HEIGHT)
-
-        self.speed_x, self.speed_y = random.choice(Obstacle.types[type]["vectors"])
+    types = OBSTACLE_TYPES
 
-        # random speed noise for obstacles
-        self.speed_noise = random.uniform(0.6, 1.5)
-        self.change_x *= speed * self.speed_noise
-        self.change_y *= speed * self.speed_noise
+    def __init__(self, type, scale, generation):
 
-        self.change_angle = random.uniform(-1, 1)
+        super().__init__(texture=registry.texture(Obstacle.types[type]["graphics"]), scale=scale)
 
-        self.alpha = OBSTACLE_HARMLESS_ALPHA
+        # generation of the ObstacleField slot this sprite draws
+        self.generation = generation
 
-        if spawn_on_edge is False:
-            self.harmless_timer = OBSTACLE_HARMLESS_TIME
-            self.is_harmless = True
-        else:
-            self.harmless_timer = 0
-            self.is_harmless = False
+    def reset(self, type, scale, generation):
+        self.texture = registry.texture(Obstacle.types[type]["graphics"])
+        self.scale = scale
+        self.generation = generation
+        self.visible = True
 
-    def on_update(self, delta_time):
-        self.center_x += self.change_x
-        self.center_y += self.change_y
-
-        if self.left > SCREEN_WIDTH:
-            self.kill()
-        elif self.right < 0:
-            self.kill()
-        elif self.bottom > SCREEN_HEIGHT:
-            self.kill()
-        elif self.top < 0:
-            self.kill()
-
-        if self.harmless_timer > 0:
-            self.is_harmless = True
-            self.alpha = min(255 / self.harmless_timer, 255)
-            self.harmless_timer -= delta_time
-        else:
-            self.is_harmless = False
-            self.alpha = 255
-
-        if self.is_harmless:
-            self.change_x = self.speed_x * OBSTACLE_HARMLESS_SPEED_FACTOR
-            self.change_y = self.speed_y * OBSTACLE_HARMLESS_SPEED_FACTOR
-            self.angle += self.change_angle * OBSTACLE_HARMLESS_SPEED_FACTOR
-        else:
-            self.change_x = self.speed_x
-            self.change_y = self.speed_y
-            self.angle += self.change_angle
 
 class PlayerShot(arcade.Sprite):
     """
-    A shot fired by the Player
+    A shot fired by the Player, moved by the simulation's ProjectilePool
     """
 
     def __init__(self, center_x=0, center_y=0):
@@ -295,59 +165,340 @@ class PlayerShot(arcade.Sprite):
         """
 
         # Set the graphics to use for the sprite
-        super().__init__("images/Lasers/laserBlue01.png", SPRITE_SCALING)
+        super().__init__(texture=registry.texture(PLAYER_SHOT_GRAPHICS), scale=SPRITE_SCALING)
 
         self.center_x = center_x
         self.center_y = center_y
-        self.change_y = PLAYER_SHOT_SPEED
 
-    def update(self):
-        """
-        Move the sprite
-        """
+    def reset(self, center_x=0, center_y=0):
+        self.position = (center_x, center_y)
+        self.visible = True
+
+
+class Ufo(arcade.Sprite):
+    """
+    A UFO of the simulation's Flock
+    """
+
+    def __init__(self, color=0):
+
+        super().__init__(texture=registry.texture(UFO_GRAPHICS[color]), scale=SPRITE_SCALING)
+
+        # index into UFO_GRAPHICS of the texture shown, arcade's color is the tint
+        self.ufo_color = color
+
+    def reset(self, color=0):
+        self.show_color(color)
+        self.visible = True
+
+    def show_color(self, color):
+        if color != self.ufo_color:
+            self.texture = registry.texture(UFO_GRAPHICS[color])
+            self.ufo_color = color
+
+
+class Particle(arcade.Sprite):
+    """
+    A particle of the simulation's ParticlePool
+    """
 
-        # Update y position
-        self.center_y += self.change_y
+    def __init__(self, kind=FIRE, frame=0):
+
+        info = PARTICLE_KINDS[kind]
+        super().__init__(texture=registry.texture(info["graphics"][frame]), scale=info["scale"])
+
+        # kind and animation frame of the texture shown
+        self.kind = kind
+        self.frame = frame
+
+    def reset(self, kind=FIRE, frame=0):
+        self.show_frame(kind, frame)
+        self.visible = True
+
+    def show_frame(self, kind, frame):
+        if frame != self.frame or kind != self.kind:
+            info = PARTICLE_KINDS[kind]
+            self.texture = registry.texture(info["graphics"][frame])
+            if kind != self.kind:
+                self.scale = info["scale"]
+            self.kind = kind
+            self.frame = frame
+
+
+def hide_sprite(sprite):
+    sprite.visible = False
+
+
+def sprite_pool(sprite_list, sprite_class, max_size):
+    """
+    Pool of sprites of sprite_class living in sprite_list.
+
+    Released sprites stay in the list, hidden, so reusing them does not
+    touch the list at all. Only sprites beyond max_size are removed.
+    """
+    def factory(*args):
+        sprite = sprite_class(*args)
+        sprite_list.append(sprite)
+        return sprite
+
+    return Pool(factory, max_size, on_release=hide_sprite, on_discard=arcade.Sprite.kill)
+
+
+def sync_sprite_list(states, sprites, pool):
+    """
+    Have exactly one visible sprite from pool per simulated entity in states.
+
+    sprites maps every entity to the sprite drawing it.
+    """
+    for state in states:
+        sprite = sprites.get(state)
+        if sprite is None:
+            sprite = pool.acquire(state)
+            sprites[state] = sprite
+        sprite.sync()
+
+    # entities that are gone still have a sprite
+    if len(sprites) > len(states):
+        alive = set(states)
+        for state in [state for state in sprites if state not in alive]:
+            pool.release(sprites.pop(state))
+
+
+def sync_shot_sprites(shots, sprites, pool, positions):
+    """
+    Draw the shots of a ProjectilePool, or a snapshot of one, with sprites
+    from pool. The shots are packed, so sprite i draws shot i whichever
+    shot that is now. positions are the x and y arrays to draw them at.
+    """
+    count = shots.count
+    while len(sprites) < count:
+        sprites.append(pool.acquire())
+    while len(sprites) > count:
+        pool.release(sprites.pop())
+
+    center_x, center_y = (values.tolist() for values in positions)
+    angle = shots.angle[:count].tolist()
+    for sprite, x, y, shot_angle in zip(sprites, center_x, center_y, angle):
+        sprite.position = (x, y)
+        sprite.angle = shot_angle
+
+
+def sync_ufo_sprites(flock, sprites, pool, positions):
+    """
+    Draw the UFOs of a Flock, or a snapshot of one, with sprites from
+    pool. Like the shots they are packed, so sprite i draws UFO i.
+    """
+    count = flock.count
+    while len(sprites) < count:
+        sprites.append(pool.acquire())
+    while len(sprites) > count:
+        pool.release(sprites.pop())
+
+    center_x, center_y = (values.tolist() for values in positions)
+    color = flock.color[:count].tolist()
+    for sprite, x, y, ufo_color in zip(sprites, center_x, center_y, color):
+        sprite.show_color(ufo_color)
+        sprite.position = (x, y)
+
+
+def sync_particle_sprites(particles, sprites, pool, positions):
+    """
+    Draw the particles of a ParticlePool, or a snapshot of one, with
+    sprites from pool. Like the shots they are packed, so sprite i draws
+    particle i.
+    """
+    count = particles.count
+    while len(sprites) < count:
+        sprites.append(pool.acquire())
+    while len(sprites) > count:
+        pool.release(sprites.pop())
+
+    center_x, center_y = (values.tolist() for values in positions)
+    columns = (
+        particles.kind[:count].tolist(), particles.frame[:count].tolist(),
+        particles.angle[:count].tolist(), particles.alpha[:count].astype(int).tolist(),
+    )
+    for sprite, x, y, kind, frame, angle, alpha in zip(sprites, center_x, center_y, *columns):
+        sprite.show_frame(kind, frame)
+        sprite.position = (x, y)
+        sprite.angle = angle
+        sprite.alpha = alpha
+
+
+def sync_obstacle_sprites(field, sprites, pool, positions=None):
+    """
+    Draw the obstacles of an ObstacleField with sprites from pool.
+
+    sprites holds the sprite of every slot of the field, or None.
+    positions are the x, y and angle arrays to draw the slots at, the
+    field's own by default.
+    """
+    size = field.size
+    if len(sprites) < size:
+        sprites.extend([None] * (size - len(sprites)))
+
+    alive = field.alive[:size].tolist()
+    generation = field.generation[:size].tolist()
+    if positions is None:
+        positions = (field.center_x[:size], field.center_y[:size], field.angle[:size])
+    center_x, center_y, angle = (values.tolist() for values in positions)
+    alpha = field.alpha[:size].tolist()
+
+    for slot in range(size):
+        sprite = sprites[slot]
+        if not alive[slot]:
+            if sprite is not None:
+                pool.release(sprite)
+                sprites[slot] = None
+            continue
+
+        if sprite is None:
+            sprite = pool.acquire(int(field.type[slot]), float(field.scale[slot]), generation[slot])
+            sprites[slot] = sprite
+        elif sprite.generation != generation[slot]:
+            # a new obstacle in the slot, reuse its sprite right away
+            sprite.reset(int(field.type[slot]), float(field.scale[slot]), generation[slot])
+
+        sprite.position = (center_x[slot], center_y[slot])
+        sprite.angle = angle[slot]
+        if sprite.alpha != int(alpha[slot]):
+            sprite.alpha = alpha[slot]
+
+    # slots past the end of the field
+    for slot in range(size, len(sprites)):
+        if sprites[slot] is not None:
+            pool.release(sprites[slot])
+            sprites[slot] = None
 
-        # Remove shot when over top of screen
-        if self.bottom > SCREEN_HEIGHT:
-            self.kill()
 
 class MyGame(arcade.Window):
     """
     Main application class.
     """
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, profile=False, profile_path="profile", record_path=None,
+                 simulation_rate=SIMULATION_RATE, frame_rate=60, threaded=False, governor=True, shooting=False,
+                 ufos=False, effects=True, world=False, rewind=True, quicksave_path="quicksave.sav", connect=None,
+                 spectate=False, scores_path=SCORES_PATH):
         """
         Initializer
+
+        With profile the update and draw code is timed from the start,
+        otherwise only once the profile overlay is opened. The timings are
+        written to profile_path with a .csv and a .json extension. With
+        record_path every step is recorded to a replay file there.
+
+        The game is simulated at simulation_rate steps per second whatever
+        the frame_rate, sprites are drawn in between the steps. With
+        threaded the simulation runs on a thread of its own and the window
+        draws the snapshots it publishes. With governor the number of
+        obstacles is limited when updating and drawing take too much of the
+        time of a frame. With shooting the player fires with FIRE_KEY,
+        with ufos flocks of UFOs hunt the player. effects turns the
+        particle effects on. With world the game scrolls through a world many screens big.
+
+        With rewind the last seconds of the game are kept to rewind to and
+        the start of the game to restart from. Quick saves go to
+        quicksave_path. Rewinding, restarting and quick loading are off
+        while recording, a replay cannot jump around.
+
+        With connect, the (host, port) of a GameServer, the game is played
+        there and only drawn here, as a spectator with spectate. Nothing
+        is simulated, recorded or rewound then.
+
+        Every game played here is recorded to the scores database at
+        scores_path, None records nothing.
         """
 
         # Call the parent class initializer
-        super().__init__(width, height)
+        super().__init__(width, height, update_rate=1 / frame_rate)
 
         print(self.get_viewport())
 
-        self.level_timer = None
-        self.mode = None
-        self.respawn_powerup = 0
+        self.simulation = None
+        self.shooting = shooting
+        self.ufos = ufos
+        self.effects = effects
+        self.world = world
+        # bottom left corner of the part of the world on the screen
+        self.camera = (0, 0)
+
+        # Fixed length steps and the positions before the last one
+        self.timestep = FixedTimestep(simulation_rate)
+        self.interpolation = Interpolation()
+
+        # The thread stepping the simulation when threaded
+        self.threaded = threaded
+        self.sim_thread = None
+
+        # The server playing the game when connected to one
+        self.connect = connect
+        self.role = SPECTATOR if spectate else PILOT
+        self.net_client = None
+
+        # Limits the obstacles to what fits in the time of a frame
+        self.governor = LoadGovernor(frame_budget=1 / frame_rate) if governor and connect is None else None
+
+        # mode of the last update, to notice changes
+        self.last_mode = None
+
+        # Timing of the sections of on_update and on_draw
+        self.profiler = FrameProfiler(enabled=profile)
+        self.profile_path = profile_path
+        self.profile_overlay = None
+
+        # Replay of this game, see replay.py
+        self.record_path = record_path
+        self.recorder = None
+
+        # Save states of the last seconds of the game, and the quick save
+        self.rewind = RewindBuffer() if rewind and record_path is None and connect is None else None
+        self.quicksave_path = quicksave_path
+
+        # High scores and the game being played, see scores.py
+        self.scores = ScoreStore(scores_path) if scores_path is not None and connect is None else None
+        self.session = None
+        # leaderboard and place of the last game being read after a game,
+        # printed once they are there
+        self.leaderboard = None
+        self.placing = None
 
         # Variable that will hold a list of shots fired by the player
         self.player_shot_list = None
         self.obstacle_list = None
         self.power_ups_list = None
-        self.number_of_obstacles = None
-
-        # Set up the player info
+        self.ufo_list = None
+        self.particle_list = None
+
+        # Sprites drawing the obstacles and power ups of the simulation,
+        # one per ObstacleField slot and one per PowerUpState
+        self.obstacle_sprites = None
+        self.power_up_sprites = None
+        self.shot_sprites = None
+        self.ufo_sprites = None
+        self.particle_sprites = None
+
+        # Pools recycling the sprites of the lists above
+        self.obstacle_pool = None
+        self.power_up_pool = None
+        self.player_shot_pool = None
+        self.ufo_pool = None
+        self.particle_pool = None
+
+        # Set up the player info, and the wingman's in co-op
         self.player_sprite = None
+        self.wingman_sprite = None
+
+        # Text drawn on top of the game
+        self.hud = None
 
         # Track the current state of what key is pressed
         self.left_pressed = False
         self.right_pressed = False
         self.up_pressed = False
         self.down_pressed = False
-
-        self.current_level = None
+        self.action_pressed = False
+        self.fire_pressed = False
 
         # Get list of joysticks
         joysticks = arcade.get_joysticks()
@@ -371,269 +522,374 @@ class MyGame(arcade.Window):
             print("No joysticks found")
             self.joystick = None
 
-            # self.joystick.
         # Set the background color
         arcade.set_background_color(arcade.color.BLACK)
 
-    def setup(self):
-        """ Set up the game and initialize the variables. """
+    @property
+    def mode(self):
         # if you'r in startscreen, mode = "IN_START_SCREEN"
         # if you'r in game, mode = "IN_GAME"
         # if you'r in deathscreen, mode = "DEATH_SCREEN"
-        self.mode = "IN_START_SCREEN"
-
-        # Sprite lists
-        self.player_shot_list = arcade.SpriteList()
-        self.power_ups_list = arcade.SpriteList()
-
-        #creating a power up when you start the game
-        self.power_ups_list.append(PowerUp())
+        return self.view.mode
 
-        self.current_level = 0
-        self.obstacle_speed = OBSTACLE_SPEED
+    @property
+    def view(self):
+        """
+        What to draw: the latest snapshot of the simulation thread, a
+        frame in between the states a server sent, or the simulation itself
+        """
+        if self.net_client is not None:
+            return self.net_client.frame()
+        if self.sim_thread is not None:
+            return self.sim_thread.snapshot
+        return self.simulation
 
-        self.number_of_obstacles = 65
+    def setup(self):
+        """ Set up the game and initialize the variables. """
+        # Load every texture now so nothing is loaded during gameplay
+        registry.preload()
 
-        if self.mode == "IN_GAME":
-            self.new_level()
+        if self.connect is not None:
+            self.net_client = NetClient(self.connect, self.role)
         else:
-            pass
-
-    def set_mode(self, new_mode):
-        print("changemode", new_mode)
-
-        if new_mode == "IN_START_SCREEN":
-            pass
-
-        elif new_mode == "IN_GAME":
-            # Create a Player object
-            self.player_sprite = Player(
-                center_x=PLAYER_START_X,
-                center_y=PLAYER_START_Y
+            # Roll the next level in the background and spread big levels
+            # over several frames
+            self.simulation = GameSimulation(
+                level_thread=True, spawn_per_step=LEVEL_SPAWN_PER_STEP, profiler=self.profiler,
+                shooting=self.shooting, ufos=self.ufos,
+                effects=self.effects, world=self.world,
             )
 
-            self.new_level()
-            self.power_ups_list.append(PowerUp())
-
-        self.mode = new_mode
-
-    def new_level(self):
-
-        self.level_timer = LEVEL_TIME
-
+        # Sprite lists
+        self.player_shot_list = arcade.SpriteList()
         self.obstacle_list = arcade.SpriteList()
-        self.number_of_obstacles += self.current_level
-        self.current_level += 1
-
-        # Increases obstacle_speed with 50%
-        self.obstacle_speed *= 1.5
-
-        for i in range(self.number_of_obstacles):
-            self.obstacle_list.append(Obstacle(speed=self.obstacle_speed, type=random.randint(1, 3)))
-
-    def on_draw(self):
-        """
-        Render the screen.
-        """
-
-        # This command has to happen before we start drawing
-        arcade.start_render()
+        self.power_ups_list = arcade.SpriteList()
+        self.ufo_list = arcade.SpriteList()
+        self.particle_list = arcade.SpriteList()
 
-        if self.mode == "IN_GAME":
+        self.obstacle_sprites = []
+        self.power_up_sprites = {}
+        self.shot_sprites = []
+        self.ufo_sprites = []
+        self.particle_sprites = []
 
-            # Draw the obstacles
-            self.obstacle_list.draw()
+        if self.record_path is not None and self.simulation is not None:
+            self.recorder = ReplayRecorder.for_simulation(self.record_path, self.simulation)
 
-            self.power_ups_list.draw()
+        self.hud = Hud()
+        self.profile_overlay = ProfileOverlay(self.profiler)
 
-            # Draw the player sprite
-            self.player_sprite.draw()
+        self.obstacle_pool = sprite_pool(self.obstacle_list, Obstacle, OBSTACLE_POOL_SIZE)
+        self.power_up_pool = sprite_pool(self.power_ups_list, PowerUp, POWER_UP_POOL_SIZE)
+        self.player_shot_pool = sprite_pool(self.player_shot_list, PlayerShot, PLAYER_SHOT_POOL_SIZE)
+        self.ufo_pool = sprite_pool(self.ufo_list, Ufo, UFO_POOL_SIZE)
+        self.particle_pool = sprite_pool(self.particle_list, Particle, PARTICLE_POOL_SIZE)
 
-            # Draw players score on screen
-            arcade.draw_text(
-                "LIVES: {}".format(self.player_sprite.player_lives),  # Text to show
-                10,  # X position
-                SCREEN_HEIGHT - 20,  # Y positon
-                arcade.color.WHITE  # Color of text
-            )
+        # Have the sprites for the first level ready before it starts
+        self.obstacle_pool.prefill(START_NUMBER_OF_OBSTACLES * 2, 1, SPRITE_SCALING, 0)
 
-            arcade.draw_text(
-                "score: {}".format(int(self.player_sprite.score) * 10),  # Text to show
-                10,  # X position
-                SCREEN_HEIGHT - 40,  # Y positon
-                arcade.color.WHITE  # Color of text
-            )
+        self.sync_sprites()
 
-            arcade.draw_text(
-                "Next level in: {}".format(int(self.level_timer)),  # Text to show
-                10,  # X position
-                SCREEN_HEIGHT - 60,  # Y positon
-                arcade.color.WHITE  # Color of text
-            )
+        # Everything allocated so far lives for the whole game, keep it out
+        # of the way of the garbage collector
+        gc.collect()
+        gc.freeze()
 
-            arcade.draw_text(
-                "Level: {}".format(int(self.current_level)),  # Text to show
-                10,  # X position
-                SCREEN_HEIGHT - 80,  # Y positon
-                arcade.color.WHITE  # Color of text
+        if self.threaded and self.simulation is not None:
+            self.sim_thread = SimulationThread(
+                self.simulation, self.timestep.rate, self.recorder, governor=self.governor, rewind=self.rewind
             )
+            self.sim_thread.start()
 
-        elif self.mode == "IN_START_SCREEN":
-            arcade.draw_text(
-                "{}".format("press space to start"),  # Text to show
-                SCREEN_WIDTH/2 -250,  # X position
-                SCREEN_HEIGHT/2,  # Y positon
-                arcade.color.WHITE,  # Color of text
-                50
-            )
-        elif self.mode == "DEATH_SCREEN":
-            arcade.draw_text(
-                "{}".format("you die press space to return to start screen"),  # Text to show
-                SCREEN_WIDTH/2 -375,  # X position
-                SCREEN_HEIGHT/2,  # Y positon
-                arcade.color.WHITE,  # Color of text
-                30
-            )
-
-    def on_update(self, delta_time):
+    def pool_stats(self):
         """
-        Movement and game logic
+        Reuse statistics of the sprite pools
         """
+        return {
+            "obstacles": self.obstacle_pool.stats(),
+            "power_ups": self.power_up_pool.stats(),
+            "player_shots": self.player_shot_pool.stats(),
+            "ufos": self.ufo_pool.stats(),
+            "particles": self.particle_pool.stats(),
+        }
 
-        self.power_ups_list.on_update()
-
-        if self.mode == "IN_GAME":
-
-            # Calculate player speed based on the keys pressed
-            self.player_sprite.change_x = 0
-            self.player_sprite.change_y = 0
-
-            """
-            check_for_collisions
-            """
-
-            obstacles_colliding_with_player = arcade.check_for_collision_with_list(
-                self.player_sprite, self.obstacle_list
-            )
-            for o in obstacles_colliding_with_player:
-                if self.player_sprite.is_dashing is False and not o.is_harmless:
-                    self.player_sprite.taking_damage()
-
-            power_ups_colliding_with_player = arcade.check_for_collision_with_list(
-                self.player_sprite, self.power_ups_list
-            )
-            for pu in power_ups_colliding_with_player:
-                pu.power_up_function(self.player_sprite)
-                pu.kill_yourself()
-
-
-            #respawns powerup
-
-            if self.respawn_powerup <= 0:
-                self.respawn_powerup = 8
-
-            if self.respawn_powerup <= 0:
-                self.respawn_powerup = 8
-
-            self.respawn_powerup -= delta_time
-
-            if self.respawn_powerup <= 0:
-                self.power_ups_list.append(PowerUp())
-
-
-
-
-            # Move player with keyboard
-            if self.left_pressed and not self.right_pressed:
-                self.player_sprite.change_x = -PLAYER_SPEED_X
-
-            if self.right_pressed and not self.left_pressed:
-                self.player_sprite.change_x = PLAYER_SPEED_X
-
-            if self.up_pressed and not self.down_pressed:
-                self.player_sprite.change_y = PLAYER_SPEED_Y
-
-            if self.down_pressed and not self.up_pressed:
-                self.player_sprite.change_y = - PLAYER_SPEED_Y
-
-            if self.player_sprite.change_x > 0 and self.player_sprite.change_y == 0:
-                self.player_sprite.wanted_angle = self.player_sprite.angle - 90 - self.player_sprite.angle
+    def sync_sprites(self, view=None):
+        """
+        Bring the sprites up to date with the simulation or a snapshot of
+        it, in between its last two steps
+        """
+        if view is None:
+            view = self.view
+
+        if view is self.simulation:
+            alpha = self.timestep.alpha
+            player_position = None
+            if view.player is not None:
+                player_position = self.interpolation.player_at(view.player, alpha)
+            wingman_position = None
+            if view.wingman is not None:
+                wingman_position = self.interpolation.player_at(view.wingman, alpha)
+            obstacle_positions = self.interpolation.obstacles_at(view.obstacles, alpha)
+        else:
+            alpha = view.alpha(self.timestep.step_time)
+            player_position = None if view.player is None else view.player_at(alpha)
+            wingman_position = None if view.wingman is None else view.wingman_at(alpha)
+            obstacle_positions = view.obstacles_at(alpha)
+        shot_positions = shot_positions_at(view.shots, alpha, self.timestep.step_time)
+        ufo_positions = shot_positions_at(view.ufos, alpha, self.timestep.step_time)
+        particle_positions = shot_positions_at(view.particles, alpha, self.timestep.step_time)
+
+        if view.player is not None:
+            if self.player_sprite is None:
+                self.player_sprite = Player(view.player)
+            self.player_sprite.state = view.player
+            self.player_sprite.sync(*player_position)
+            if view.world_size is not None:
+                # follow where the player is drawn, not where it was simulated
+                self.camera = camera_origin(player_position[0], player_position[1], *view.world_size)
+        if view.wingman is not None:
+            if self.wingman_sprite is None:
+                self.wingman_sprite = Player(view.wingman)
+            self.wingman_sprite.state = view.wingman
+            self.wingman_sprite.sync(*wingman_position)
+
+        sync_obstacle_sprites(view.obstacles, self.obstacle_sprites, self.obstacle_pool, obstacle_positions)
+        sync_sprite_list(view.power_ups, self.power_up_sprites, self.power_up_pool)
+        sync_shot_sprites(view.shots, self.shot_sprites, self.player_shot_pool, shot_positions)
+        sync_ufo_sprites(view.ufos, self.ufo_sprites, self.ufo_pool, ufo_positions)
+        sync_particle_sprites(view.particles, self.particle_sprites, self.particle_pool, particle_positions)
+
+    def read_input(self):
+        """
+        Collect the input for the next simulation step
+        """
+        joystick_x = None
+        joystick_y = None
+        if self.joystick:
+            joystick_x = self.joystick.x
+            joystick_y = self.joystick.y
+
+        return InputState(
+            left=self.left_pressed,
+            right=self.right_pressed,
+            up=self.up_pressed,
+            down=self.down_pressed,
+            action=self.action_pressed,
+            joystick_x=joystick_x,
+            joystick_y=joystick_y,
+            fire=self.fire_pressed,
+        )
 
-            if self.player_sprite.change_x > 0 and self.player_sprite.change_y > 0:
-                self.player_sprite.wanted_angle = self.player_sprite.angle - 45 - self.player_sprite.angle
+    def on_draw(self):
+        """
+        Render the screen.
+        """
 
-            if self.player_sprite.change_x == 0 and self.player_sprite.change_y > 0:
-                self.player_sprite.wanted_angle = self.player_sprite.angle - 0 - self.player_sprite.angle
+        start = time.perf_counter()
+        profiler = self.profiler
+        # everything in a frame is drawn from the same snapshot
+        view = self.view
 
-            if self.player_sprite.change_x < 0 and self.player_sprite.change_y == 0:
-                self.player_sprite.wanted_angle = self.player_sprite.angle - -90 - self.player_sprite.angle
+        with profiler.section("draw"):
+            # This command has to happen before we start drawing
+            arcade.start_render()
 
-            if self.player_sprite.change_x == 0 and self.player_sprite.change_y < 0:
-                self.player_sprite.wanted_angle = self.player_sprite.angle - -180 - self.player_sprite.angle
+            if view.mode == IN_GAME:
+                with profiler.section("sprite_draw"):
+                    # The sprites only follow the simulation when they are drawn
+                    self.sync_sprites(view)
 
-            if self.player_sprite.change_x < 0 and self.player_sprite.change_y < 0:
-                self.player_sprite.wanted_angle = self.player_sprite.angle - -225 - self.player_sprite.angle
+                    left, bottom = self.camera
+                    arcade.set_viewport(left, left + SCREEN_WIDTH, bottom, bottom + SCREEN_HEIGHT)
 
-            if self.player_sprite.change_x < 0 and self.player_sprite.change_y > 0:
-                self.player_sprite.wanted_angle = 45
+                    # Draw the obstacles
+                    self.obstacle_list.draw()
 
-            if self.player_sprite.change_x > 0 and self.player_sprite.change_y < 0:
-                self.player_sprite.wanted_angle = -135
+                    self.power_ups_list.draw()
 
-            # Move player with joystick if present
-            if self.joystick:
-                self.player_sprite.change_x = round(self.joystick.x) * PLAYER_SPEED_X
-                self.player_sprite.change_y = round(self.joystick.y) * PLAYER_SPEED_Y * -1
-                if round(self.joystick.x) == 1:
-                    self.player_sprite.angle = -90
-                elif round(self.joystick.x) == -1:
-                    self.player_sprite.angle = 90
-                elif round(self.joystick.y) == 1:
-                    self.player_sprite.angle = 180
-                elif round(self.joystick.y) == -1:
-                    self.player_sprite.angle = 0
+                    self.player_shot_list.draw()
 
-            # Update player sprite
-            self.player_sprite.update(delta_time)
+                    self.ufo_list.draw()
 
-            # add missing obstacles
-            while len(self.obstacle_list) < self.number_of_obstacles:
-                self.obstacle_list.append(Obstacle(speed=self.obstacle_speed, type=random.randint(1, 3), spawn_on_edge=True))
+                    # Draw the ships still in the game, in co-op one can be out of lives
+                    if view.player.player_lives > 0:
+                        self.player_sprite.draw()
+                    if view.wingman is not None and view.wingman.player_lives > 0:
+                        self.wingman_sprite.draw()
 
-            # Update the player shots
-            for o in self.obstacle_list:
-                o.on_update(delta_time)
+                    # effects go over everything, the shield over the player
+                    self.particle_list.draw()
 
-            self.level_timer -= delta_time
+                    arcade.set_viewport(0, SCREEN_WIDTH, 0, SCREEN_HEIGHT)
 
-            if self.level_timer <= 0:
-                self.new_level()
+            with profiler.section("hud"):
+                # Draw lives, score and level, or the text of the start and death screens
+                self.hud.update(view)
+                if self.sim_thread is not None and view.load_state is not None:
+                    # the governor belongs to the simulation thread
+                    self.hud.show("load", view.load_state)
+                elif self.governor is not None:
+                    self.hud.show("load", self.governor.state)
+                self.hud.draw(view.mode)
 
-            if self.obstacle_speed > Obstacle.obstacle_max_speed:
-                self.obstacle_speed = Obstacle.obstacle_max_speed
+        self.profile_overlay.draw()
 
-            # score system: time = more score
-            self.player_sprite.score += int((10.0 * delta_time) * 10)
+        if self.sim_thread is not None:
+            self.sim_thread.record_draw(time.perf_counter() - start)
+        elif self.governor is not None:
+            self.governor.record_draw(time.perf_counter() - start)
 
-            if self.player_sprite.player_lives < 1:
-                print("your final score is", int(self.player_sprite.score * 10))
-                #exit(0)
-                self.set_mode("DEATH_SCREEN")
-                self.player_sprite.player_lives = 5
-                #self.player_sprite.score = 0
-                self.current_level = 0
-                if self.mode == "DEATH_SCREEN":
-                    """
-                    arcade.draw_text(
-                        "{}".format("your final score is", int(self.player_score * 10)),  # Text to show
-                        SCREEN_WIDTH / 2 - 375,  # X position
-                        SCREEN_HEIGHT / 2 - 200,  # Y positon
-                        arcade.color.WHITE,  # Color of text
-                        30
-                    )
-                    """
+    def on_update(self, delta_time):
+        """
+        Movement and game logic
+        """
+        with self.profiler.section("update"):
+            with self.profiler.section("input"):
+                inputs = self.read_input()
+
+            if self.net_client is not None:
+                # the server steps, this only draws what it sends
+                self.net_client.poll()
+                self.net_client.send_input(inputs)
+                self.action_pressed = False
+            elif self.sim_thread is not None:
+                # the simulation thread steps by itself
+                self.sim_thread.send(inputs)
+                self.action_pressed = False
+            else:
+                start = time.perf_counter()
+                self.step_simulation(delta_time, inputs)
+                if self.governor is not None:
+                    self.governor.record_update(time.perf_counter() - start)
+
+        self.profile_overlay.update(delta_time)
+
+        if self.session is not None:
+            self.session.frame(delta_time)
+
+        view = self.view
+        if view.mode != self.last_mode:
+            self.last_mode = view.mode
+            print("changemode", view.mode)
+            if view.mode == DEATH_SCREEN:
+                print("your final score is", view.final_score)
+            self.record_session(view)
+
+        if self.leaderboard is not None and self.leaderboard.done():
+            self.print_leaderboard(self.leaderboard.result())
+            self.leaderboard = None
+        if self.placing is not None and self.placing.done():
+            print("your game placed", self.placing.result())
+            self.placing = None
+
+    def record_session(self, view):
+        """
+        Start counting a game when one starts, record it when it ends
+        """
+        if self.scores is None:
+            return
+        if view.mode == IN_GAME:
+            # from what the window draws, the simulation may be stepping on
+            self.session = Session(view)
+        elif self.session is not None:
+            if view.mode == DEATH_SCREEN:
+                self.scores.record(self.session.finish(view))
+                # read on the writer thread, after the game just recorded
+                self.leaderboard = self.scores.request_top()
+                self.placing = self.scores.request_rank(view.final_score)
+            self.session = None
+
+    def print_leaderboard(self, rows):
+        print("best scores:")
+        for rank, row in enumerate(rows, 1):
+            print("{:>3}. {:>8} level {}".format(rank, row.score, row.level))
+
+    def step_simulation(self, delta_time, inputs):
+        """
+        Run as many fixed steps as fit in the time of the frame
+        """
+        if self.governor is not None:
+            self.governor.apply(self.simulation, delta_time)
+
+        simulation = self.simulation
+        step_time = self.timestep.step_time
+        for step in range(self.timestep.advance(delta_time)):
+            if step == 0:
+                # a key press counts once, in the first step that sees it
+                self.action_pressed = False
+            elif inputs.action:
+                inputs = InputState(
+                    inputs.left, inputs.right, inputs.up, inputs.down,
+                    joystick_x=inputs.joystick_x, joystick_y=inputs.joystick_y, fire=inputs.fire,
+                )
+
+            if self.recorder is not None:
+                self.recorder.record(step_time, inputs, (simulation.obstacle_cap, simulation.refill_per_step))
+
+            self.interpolation.capture(simulation)
+            simulation.step(step_time, inputs)
+            if self.rewind is not None:
+                self.rewind.record(simulation)
+
+    def change_simulation(self, function):
+        """
+        Call function(simulation) in between two steps, on the simulation
+        thread when threaded
+        """
+        if self.sim_thread is not None:
+            self.sim_thread.call(function)
+            return
+        function(self.simulation)
+        # nothing to draw in between, the game jumped
+        self.interpolation.capture(self.simulation)
+
+    def rewind_game(self, simulation):
+        steps = self.rewind.rewind(simulation, REWIND_STEPS)
+        print("rewound", steps, "steps" if steps else "steps, nothing kept that far back")
+
+    def restart_game(self, simulation):
+        if self.rewind.restart(simulation):
+            print("restarted the game")
+
+    def quick_save(self, simulation):
+        savestate.write(self.quicksave_path, simulation)
+        print("quick saved to", self.quicksave_path)
+
+    def quick_load(self):
+        try:
+            state = savestate.read(self.quicksave_path)
+        except (OSError, ValueError) as error:
+            print("no quick save to load:", error)
+            return
+        self.change_simulation(state.restore)
+        print("quick loaded", self.quicksave_path)
+
+    def on_close(self):
+        """
+        Called when the window is closed.
+        """
+        if self.sim_thread is not None:
+            self.sim_thread.stop()
+        if self.net_client is not None:
+            self.net_client.close()
         else:
-            pass
+            self.simulation.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            print("replay of seed", self.simulation.seed, "written to", self.record_path)
+        if self.scores is not None:
+            self.scores.close()
+        if self.profiler.enabled:
+            self.dump_profile()
+        super().on_close()
+
+    def dump_profile(self):
+        """
+        Write the frame timings to CSV and JSON
+        """
+        self.profiler.to_csv(self.profile_path + ".csv")
+        self.profiler.to_json(self.profile_path + ".json")
+        print("frame timings written to", self.profile_path + ".csv", "and", self.profile_path + ".json")
 
     def on_key_press(self, key, modifiers):
         """
@@ -650,28 +906,34 @@ class MyGame(arcade.Window):
         elif key == arcade.key.RIGHT:
             self.right_pressed = True
 
-        if self.mode == "IN_GAME":
-            if key == DASHING_KEY:
-                self.player_sprite.dash()
+        # Dashes in game, leaves the start and death screens otherwise
+        if key == DASHING_KEY:
+            self.action_pressed = True
+        # Fires for as long as it is held, in games with shooting
+        elif key == FIRE_KEY:
+            self.fire_pressed = True
+
+        if key == PROFILE_OVERLAY_KEY:
+            # Opening the overlay starts profiling
+            self.profile_overlay.visible = not self.profile_overlay.visible
+            if self.profile_overlay.visible:
+                self.profiler.enabled = True
+        elif key == PROFILE_DUMP_KEY:
+            self.dump_profile()
+
+        # Jumping around in the game, not while recording a replay
+        if key == QUICK_SAVE_KEY and self.simulation is not None:
+            self.change_simulation(self.quick_save)
+        elif self.rewind is not None:
+            if key == REWIND_KEY:
+                self.change_simulation(self.rewind_game)
+            elif key == RESTART_KEY:
+                self.change_simulation(self.restart_game)
+            elif key == QUICK_LOAD_KEY:
+                self.quick_load()
 
         print("Key pressed:", key)
 
-        if self.mode == "IN_START_SCREEN":
-            if key == arcade.key.SPACE:
-                self.set_mode("IN_GAME")
-
-        elif self.mode == "IN_GAME":
-            if key == DASHING_KEY:
-                self.player_sprite.dash()
-
-        elif self.mode == "DEATH_SCREEN":
-            if key == arcade.key.SPACE:
-                self.set_mode("IN_START_SCREEN")
-
-        else:
-            exit("you a failure you no mean to exist")
-
-
         print(self.mode)
 
     def on_key_release(self, key, modifiers):
@@ -687,15 +949,21 @@ class MyGame(arcade.Window):
             self.left_pressed = False
         elif key == arcade.key.RIGHT:
             self.right_pressed = False
+        elif key == FIRE_KEY:
+            self.fire_pressed = False
 
     def on_joybutton_press(self, joystick, button_no):
         # print("Button pressed:", button_no)
-        # Press the fire key
-        self.on_key_press(DASHING_KEY, [])
-        pass
+        if button_no == FIRE_BUTTON:
+            self.on_key_press(FIRE_KEY, [])
+        else:
+            self.on_key_press(DASHING_KEY, [])
+
     def on_joybutton_release(self, joystick, button_no):
         # print("Button released:", button_no)
-        pass
+        if button_no == FIRE_BUTTON:
+            self.on_key_release(FIRE_KEY, [])
+
     def on_joyaxis_motion(self, joystick, axis, value):
         print("Joystick axis {}, value {}".format(axis, value))
 
@@ -709,11 +977,50 @@ def main():
     """
     Main method
     """
-
-    window = MyGame(SCREEN_WIDTH, SCREEN_HEIGHT)
+    parser = argparse.ArgumentParser(description="Dodge the meteors.")
+    parser.add_argument("--profile", action="store_true", help="time the game loop and write the timings on exit")
+    parser.add_argument("--profile-path", default="profile", help="file name for the timings, without extension")
+    parser.add_argument("--record", metavar="PATH", help="record the game to a replay file")
+    parser.add_argument("--simulation-rate", type=int, default=SIMULATION_RATE, help="simulation steps per second")
+    parser.add_argument("--frame-rate", type=int, default=60, help="frames drawn per second")
+    parser.add_argument("--threaded", action="store_true", help="run the simulation on a thread of its own")
+    parser.add_argument("--shooting", action="store_true", help="fire at the meteors with X")
+    parser.add_argument("--ufos", action="store_true", help="add flocks of UFOs chasing the player")
+    parser.add_argument("--world", action="store_true", help="scroll through a world many screens big")
+    parser.add_argument(
+        "--no-effects", dest="effects", action="store_false", help="leave out the particle effects"
+    )
+    parser.add_argument(
+        "--no-rewind", dest="rewind", action="store_false", help="keep nothing to rewind to or restart from"
+    )
+    parser.add_argument("--quicksave", default="quicksave.sav", metavar="PATH", help="file for quick saves")
+    parser.add_argument("--connect", metavar="HOST:PORT", help="play on a game server, see server.py")
+    parser.add_argument("--spectate", action="store_true", help="only watch the game on the server")
+    parser.add_argument("--scores", default=SCORES_PATH, metavar="PATH", help="database the games are recorded to")
+    parser.add_argument(
+        "--no-scores", dest="scores", action="store_const", const=None, help="record no games"
+    )
+    parser.add_argument(
+        "--no-governor", dest="governor", action="store_false",
+        help="never limit the obstacles to keep the frame rate up"
+    )
+    args = parser.parse_args()
+
+    connect = None
+    if args.connect is not None:
+        host, _, port = args.connect.partition(":")
+        connect = (host or "127.0.0.1", int(port) if port else NET_PORT)
+
+    window = MyGame(
+        SCREEN_WIDTH, SCREEN_HEIGHT, profile=args.profile, profile_path=args.profile_path, record_path=args.record,
+        simulation_rate=args.simulation_rate, frame_rate=args.frame_rate, threaded=args.threaded,
+        governor=args.governor, shooting=args.shooting, ufos=args.ufos,
+        effects=args.effects, world=args.world, rewind=args.rewind, quicksave_path=args.quicksave,
+        connect=connect, spectate=args.spectate, scores_path=args.scores,
+    )
     window.setup()
     arcade.run()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,468 @@
+"""
+Client side of the networked game.
+
+NetClient talks to a GameServer: it sends the input of every frame, puts
+the states the server streams back together and acknowledges them, so the
+server can send the next ones as differences. Nothing is simulated here,
+frame() gives what to draw, in between the two states around a moment a
+little, NET_INTERPOLATION_DELAY, behind the newest one. States come
+every few steps, late and some not at all, and that delay is what keeps
+the game moving smoothly anyway.
+
+A frame is drawn like the snapshots of a SimulationThread, but with its
+positions already in between two states.
+"""
+
+import collections
+import math
+import socket
+import time
+
+import numpy as np
+
+from constants import IN_START_SCREEN, NET_INTERPOLATION_DELAY, NET_HISTORY
+from netcode import (
+    HELLO, WELCOME, STATE, BYE, PILOT, HELLO_BODY, WELCOME_BODY, MODES, POWER_UP_KINDS,
+    ANGLE_STEPS, VELOCITY_SCALE, SCALE_SCALE, ProtocolError, WireState, header, movement_steps, pack_input,
+    packet_kind, position_scale, receive, udp_socket, unpack, unpack_state,
+)
+
+# seconds between hellos until the server answers
+HELLO_INTERVAL = 0.5
+# states kept to draw in between
+FRAMES = 16
+# how fast the estimate of the server's clock gives in to packets coming
+# later than before, coming earlier is taken right away
+CLOCK_SMOOTHING = 0.02
+# estimates further off than this many seconds start over
+CLOCK_RESYNC = 0.5
+
+
+class NetPlayer:
+    """
+    The parts of the player, or the wingman, that are drawn
+    """
+
+    __slots__ = ("center_x", "center_y", "angle", "alpha", "taking_damage_timer", "player_lives", "score")
+
+
+class NetPowerUp:
+    __slots__ = ("center_x", "center_y", "kind")
+
+
+class NetPool:
+    """
+    Packed arrays of the shots, UFOs or particles of a frame
+    """
+
+    def __init__(self, count, **columns):
+        self.count = count
+        for name, values in columns.items():
+            setattr(self, name, values)
+
+
+class NetObstacles:
+    """
+    The slots of an ObstacleField, drawn like the field
+    """
+
+    __slots__ = ("size", "alive", "generation", "type", "scale", "center_x", "center_y", "angle", "alpha")
+
+
+class NetState:
+    """
+    A WireState turned back into pixels and degrees
+    """
+
+    __slots__ = (
+        "tick", "mode", "current_level", "level_timer", "final_score", "world_size", "player", "wingman",
+        "obstacles", "shots", "ufos", "power_ups",
+    )
+
+    def __init__(self, wire):
+        scalars = wire.scalars
+        columns = wire.columns
+        self.tick = wire.tick
+        self.mode = MODES[scalars["mode"]]
+        self.current_level = None if scalars["current_level"] < 0 else scalars["current_level"]
+        self.level_timer = None if math.isnan(scalars["level_timer"]) else scalars["level_timer"]
+        self.final_score = None if scalars["final_score"] < 0 else scalars["final_score"]
+        self.world_size = None
+        if scalars["world_width"]:
+            self.world_size = (scalars["world_width"], scalars["world_height"])
+        x_offset, x_scale, y_offset, y_scale = position_scale(self.world_size)
+
+        self.player = _ship(scalars, "player_")
+        self.wingman = _ship(scalars, "wingman_")
+
+        def positions(group):
+            return (
+                columns[group + ".center_x"] / x_scale + x_offset,
+                columns[group + ".center_y"] / y_scale + y_offset,
+            )
+
+        obstacles = NetObstacles()
+        obstacles.size = scalars["obstacles"]
+        obstacles.center_x, obstacles.center_y = positions("obstacles")
+        obstacles.angle = columns["obstacles.angle"] * (360 / ANGLE_STEPS)
+        obstacles.alive = columns["obstacles.alive"].astype(bool)
+        obstacles.generation = columns["obstacles.generation"].astype(np.int64)
+        obstacles.type = columns["obstacles.type"].astype(np.int64)
+        obstacles.scale = columns["obstacles.scale"] / SCALE_SCALE
+        obstacles.alpha = columns["obstacles.alpha"].astype(float)
+        self.obstacles = obstacles
+
+        for group in ("shots", "ufos"):
+            center_x, center_y = positions(group)
+            setattr(self, group, NetPool(
+                scalars[group], center_x=center_x, center_y=center_y,
+                change_x=columns[group + ".change_x"] / VELOCITY_SCALE,
+                change_y=columns[group + ".change_y"] / VELOCITY_SCALE,
+            ))
+        self.shots.angle = columns["shots.angle"] * (360 / ANGLE_STEPS)
+        self.ufos.color = columns["ufos.color"].astype(np.int64)
+
+        center_x, center_y = positions("power_ups")
+        self.power_ups = list(zip(
+            center_x.tolist(), center_y.tolist(), (POWER_UP_KINDS[kind] for kind in columns["power_ups.kind"].tolist())
+        ))
+
+
+def _ship(scalars, prefix):
+    """
+    The NetPlayer in the scalars named after prefix, None if there is none
+    """
+    if not scalars["has_" + prefix[:-1]]:
+        return None
+    ship = NetPlayer()
+    for name in ("center_x", "center_y", "angle", "alpha", "taking_damage_timer", "score"):
+        setattr(ship, name, scalars[prefix + name])
+    ship.player_lives = scalars[prefix + "lives"]
+    return ship
+
+
+def _ship_position(before, after, fraction):
+    """
+    Where to draw the ship after, fraction of the way from before
+    """
+    if before is None:
+        return after.center_x, after.center_y, after.angle
+    return (
+        _lerp(before.center_x, after.center_x, fraction),
+        _lerp(before.center_y, after.center_y, fraction),
+        _lerp_angle(before.angle, after.angle, fraction),
+    )
+
+
+def _empty_pool(*names, **columns):
+    return NetPool(0, **{name: np.zeros(0) for name in names}, **columns)
+
+
+_NO_PARTICLES = _empty_pool(
+    "center_x", "center_y", "change_x", "change_y", "angle", "alpha",
+    kind=np.zeros(0, dtype=np.int64), frame=np.zeros(0, dtype=np.int64),
+)
+_NO_SHOTS = _empty_pool("center_x", "center_y", "change_x", "change_y", "angle")
+_NO_UFOS = _empty_pool("center_x", "center_y", "change_x", "change_y", color=np.zeros(0, dtype=np.int64))
+
+
+def _empty_obstacles():
+    obstacles = NetObstacles()
+    obstacles.size = 0
+    for name in NetObstacles.__slots__[1:]:
+        setattr(obstacles, name, np.zeros(0))
+    return obstacles
+
+
+_NO_OBSTACLES = _empty_obstacles()
+
+
+class NetFrame:
+    """
+    What the window needs to draw one frame of a networked game, like a
+    sim_thread.Snapshot
+    """
+
+    __slots__ = (
+        "tick", "mode", "player", "wingman", "obstacles", "shots", "ufos", "particles", "power_ups",
+        "level_timer", "current_level", "final_score", "world_size", "player_position", "wingman_position",
+        "obstacle_positions",
+    )
+
+    def __init__(self):
+        self.tick = 0
+        self.mode = IN_START_SCREEN
+        # nothing to draw until the first state comes
+        self.player = None
+        self.wingman = None
+        self.obstacles = _NO_OBSTACLES
+        self.shots = _NO_SHOTS
+        self.ufos = _NO_UFOS
+        self.particles = _NO_PARTICLES
+        self.power_ups = ()
+        self.level_timer = None
+        self.current_level = None
+        self.final_score = None
+        self.world_size = None
+        self.player_position = None
+        self.wingman_position = None
+        self.obstacle_positions = (_NO_OBSTACLES.center_x, _NO_OBSTACLES.center_y, _NO_OBSTACLES.angle)
+
+    def alpha(self, step_time):
+        """
+        The positions are in between two states already
+        """
+        return 1.0
+
+    def player_at(self, alpha):
+        return self.player_position
+
+    def wingman_at(self, alpha):
+        return self.wingman_position
+
+    def obstacles_at(self, alpha):
+        return self.obstacle_positions
+
+
+def _lerp(before, after, fraction):
+    return before + (after - before) * fraction
+
+
+def _lerp_angle(before, after, fraction):
+    """
+    In between two angles in degrees, the short way round
+    """
+    return before + ((after - before + 180) % 360 - 180) * fraction
+
+
+class NetClient:
+    """
+    Connection to a GameServer
+    """
+
+    def __init__(self, address, role=PILOT, sock=None, delay=NET_INTERPOLATION_DELAY, clock=time.perf_counter):
+        """
+        address is the (host, port) of the server. role is PILOT to fly
+        the ship if no one else is, or the wingman of a co-op game if that
+        is free, or SPECTATOR to only watch. sock is a
+        bound non-blocking UDP socket, or a LossySocket around one, a new
+        one by default. Frames are drawn delay seconds behind the newest
+        state. clock gives the time, replace it to run faster than real
+        time.
+        """
+        # packets are told apart by the numeric address they come from
+        self.server = (socket.gethostbyname(address[0]), address[1])
+        self.sock = udp_socket() if sock is None else sock
+        self.asked_role = role
+        self.delay = delay
+        self.clock = clock
+
+        # given by the server's welcome
+        self.id = None
+        self.role = None
+        self.rate = None
+        self.send_every = None
+
+        self.sequence = 0
+        self.presses = 0
+        self._last_hello = None
+        # fragments of the states being put together, by tick
+        self._fragments = {}
+        # states received by tick, to apply the differences to
+        self.states = collections.OrderedDict()
+        self.newest = None
+        # the newest states in pixels, oldest first, to draw in between
+        self.frames = collections.deque(maxlen=FRAMES)
+        # server time less local time, as far as the packets tell
+        self.clock_offset = None
+        # stable objects for the power ups, sprites are matched to them
+        self._power_ups = {}
+
+        self.bytes_received = 0
+        self.packets_received = 0
+        self.states_received = 0
+        self.full_states = 0
+        # states that could not be used: their base was gone or they came too late
+        self.states_unusable = 0
+        self.bad_packets = 0
+
+    @property
+    def connected(self):
+        return self.id is not None
+
+    def poll(self):
+        """
+        Take the packets the server sent, say hello again if it has not
+        answered yet
+        """
+        now = self.clock()
+        if self.id is None and (self._last_hello is None or now - self._last_hello >= HELLO_INTERVAL):
+            self._last_hello = now
+            self.sock.sendto(header(HELLO) + HELLO_BODY.pack(self.asked_role), self.server)
+
+        for packet, address in receive(self.sock):
+            if address != self.server:
+                continue
+            self.bytes_received += len(packet)
+            self.packets_received += 1
+            try:
+                kind = packet_kind(packet)
+                if kind == WELCOME:
+                    self.id, self.role, self.rate, self.send_every = unpack(WELCOME_BODY, packet)
+                elif kind == STATE and self.rate is not None:
+                    self._fragment(*unpack_state(packet))
+            except ProtocolError:
+                self.bad_packets += 1
+
+    def _fragment(self, tick, base_tick, fragment, fragments, data):
+        if self.newest is not None and tick <= self.newest:
+            # older than what is drawn already
+            return
+        parts = self._fragments.get(tick)
+        if parts is None or len(parts) != fragments:
+            parts = self._fragments[tick] = [None] * fragments
+        parts[fragment] = data
+        if any(part is None for part in parts):
+            return
+
+        for waiting in [waiting for waiting in self._fragments if waiting <= tick]:
+            # anything older that is not complete yet never will be of use
+            if waiting != tick:
+                self.states_unusable += 1
+            del self._fragments[waiting]
+        base = None
+        if base_tick is not None:
+            base = self.states.get(base_tick)
+            if base is None:
+                self.states_unusable += 1
+                return
+        state = WireState.decode(
+            tick, b"".join(parts), base, None if base is None else movement_steps(tick - base_tick, self.rate)
+        )
+        self._add(state, base is None)
+
+    def _add(self, state, full):
+        self.states_received += 1
+        self.full_states += full
+        self.states[state.tick] = state
+        while len(self.states) > NET_HISTORY:
+            self.states.popitem(last=False)
+        self.newest = state.tick
+        self.frames.append(NetState(state))
+
+        offset = state.tick / self.rate - self.clock()
+        if self.clock_offset is None or abs(offset - self.clock_offset) > CLOCK_RESYNC:
+            self.clock_offset = offset
+        elif offset > self.clock_offset:
+            self.clock_offset = offset
+        else:
+            self.clock_offset += (offset - self.clock_offset) * CLOCK_SMOOTHING
+
+    def send_input(self, inputs):
+        """
+        Send the input of this frame, which also acknowledges the newest
+        state. An action is one press, however many frames it is held.
+        """
+        if self.id is None:
+            return
+        if inputs.action:
+            self.presses += 1
+        self.sequence += 1
+        self.sock.sendto(pack_input(self.sequence, self.newest, self.presses, inputs), self.server)
+
+    def render_tick(self):
+        """
+        Tick to draw now, fractional and delay behind the server
+        """
+        return (self.clock() + self.clock_offset - self.delay) * self.rate
+
+    def frame(self):
+        """
+        What to draw now
+        """
+        frame = NetFrame()
+        frames = self.frames
+        if not frames:
+            return frame
+
+        tick = self.render_tick()
+        before = after = frames[-1]
+        for index, state in enumerate(frames):
+            if state.tick > tick:
+                after = state
+                before = frames[index - 1] if index else state
+                break
+        if before is after:
+            fraction = 1.0
+        else:
+            fraction = min(max((tick - before.tick) / (after.tick - before.tick), 0.0), 1.0)
+
+        for name in (
+            "mode", "player", "wingman", "obstacles", "level_timer", "current_level", "final_score", "world_size",
+        ):
+            setattr(frame, name, getattr(after, name))
+        frame.tick = after.tick
+
+        if after.player is not None:
+            frame.player_position = _ship_position(before.player, after.player, fraction)
+        if after.wingman is not None:
+            frame.wingman_position = _ship_position(before.wingman, after.wingman, fraction)
+
+        obstacles = after.obstacles
+        center_x = obstacles.center_x.copy()
+        center_y = obstacles.center_y.copy()
+        angle = obstacles.angle.copy()
+        n = min(obstacles.size, before.obstacles.size)
+        same = (before.obstacles.generation[:n] == obstacles.generation[:n]) & before.obstacles.alive[:n]
+        center_x[:n] = np.where(same, _lerp(before.obstacles.center_x[:n], center_x[:n], fraction), center_x[:n])
+        center_y[:n] = np.where(same, _lerp(before.obstacles.center_y[:n], center_y[:n], fraction), center_y[:n])
+        angle[:n] = np.where(same, _lerp_angle(before.obstacles.angle[:n], angle[:n], fraction), angle[:n])
+        frame.obstacle_positions = (center_x, center_y, angle)
+
+        # shots and UFOs are packed, so they are moved back along their
+        # velocities instead of matched by index
+        back = (1 - fraction) * movement_steps(after.tick - before.tick, self.rate)
+        for name in ("shots", "ufos"):
+            pool = getattr(after, name)
+            moved = NetPool(
+                pool.count, center_x=pool.center_x - pool.change_x * back,
+                center_y=pool.center_y - pool.change_y * back, change_x=pool.change_x, change_y=pool.change_y,
+            )
+            setattr(frame, name, moved)
+        frame.shots.angle = after.shots.angle
+        frame.ufos.color = after.ufos.color
+
+        frame.power_ups = self._power_ups_of(after.power_ups)
+        return frame
+
+    def _power_ups_of(self, power_ups):
+        """
+        The same NetPowerUp objects for the same power ups every frame
+        """
+        objects = {}
+        for key in power_ups:
+            power_up = self._power_ups.get(key)
+            if power_up is None:
+                power_up = NetPowerUp()
+                power_up.center_x, power_up.center_y, power_up.kind = key
+            objects[key] = power_up
+        self._power_ups = objects
+        return tuple(objects.values())
+
+    def stats(self):
+        return {
+            "bytes_received": self.bytes_received,
+            "packets_received": self.packets_received,
+            "states_received": self.states_received,
+            "full_states": self.full_states,
+            "states_unusable": self.states_unusable,
+            "bad_packets": self.bad_packets,
+        }
+
+    def close(self):
+        """
+        Tell the server this client is gone
+        """
+        if self.id is not None:
+            self.sock.sendto(header(BYE), self.server)
+        self.sock.close()
@@ -0,0 +1,486 @@
+"""
+Wire format of the networked game.
+
+A GameServer runs the one true GameSimulation and streams what drawing
+needs to its clients over UDP. To keep that small:
+
+* positions, angles, velocities and scales are quantized to 16 bit
+  integers: a position is a fraction of the world, plus a margin, in
+  65536 steps
+* every state is sent as the difference to a base state the client said
+  it has, the newest one it acknowledged. Positions and angles are sent
+  as the difference to where the velocities in the base would have moved
+  them, so things that move steadily are all zeros just like the ones
+  that did not change at all, and the differences compress well with
+  zlib once the bytes of each column are grouped by significance
+* states are split into fragments that fit an ordinary MTU
+
+Any state or fragment may be lost, reordered or duplicated. A client
+acknowledges the newest state it put together and the server bases the
+next ones on that, or sends a full state when it no longer has it. The
+particles are not sent, they are only there for the looks.
+
+LossySocket puts latency, jitter and loss between a real socket and the
+network, to try all of this over localhost.
+"""
+
+import heapq
+import math
+import random
+import socket
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from constants import IN_START_SCREEN, IN_GAME, DEATH_SCREEN, SCREEN_WIDTH, SCREEN_HEIGHT, STEP_RATE
+from simulation import InputState, LIFE_UP, SCORE_UP
+
+MAGIC = b"MD"
+# 2: the fire button, 3: the wingman of co-op games
+PROTOCOL = 3
+
+# kinds of packets
+HELLO = 0
+WELCOME = 1
+INPUT = 2
+STATE = 3
+BYE = 4
+
+# roles a client asks for, only one client at a time flies the ship. A
+# client asking to fly in a co-op game gets the wingman once the ship is taken.
+PILOT = 0
+SPECTATOR = 1
+WINGMAN = 2
+
+# magic, protocol, kind
+HEADER = struct.Struct("<2sBB")
+# role asked for
+HELLO_BODY = struct.Struct("<B")
+# client id, role given, steps per second, steps per state sent
+WELCOME_BODY = struct.Struct("<HBHB")
+# sequence, newest state received, action presses so far, held buttons, joystick x and y
+INPUT_BODY = struct.Struct("<IIHBff")
+# tick, tick of the base state, fragment, fragments
+STATE_BODY = struct.Struct("<IIHH")
+# base tick of a full state
+NO_BASE = 0xFFFFFFFF
+
+# most bytes of a state in one packet, safe under an ordinary MTU
+MAX_FRAGMENT = 1200
+# most bytes a state may unpack to, more is taken as garbage
+MAX_STATE_SIZE = 16 * 2 ** 20
+# UDP and IPv4 headers, counted in the bandwidth
+PACKET_OVERHEAD = 28
+
+MODES = (IN_START_SCREEN, IN_GAME, DEATH_SCREEN)
+POWER_UP_KINDS = (LIFE_UP, SCORE_UP)
+
+# room around the world for things that are partly outside it
+POSITION_MARGIN = 512
+POSITION_STEPS = 65535
+ANGLE_STEPS = 65536
+# per step velocities in 1/256 pixels, scales in 1/1024
+VELOCITY_SCALE = 256
+SCALE_SCALE = 1024
+
+# None is sent as -1 in integers and as NaN in floats
+_SCALAR_FIELDS = (
+    ("mode", "B"), ("current_level", "i"), ("level_timer", "f"), ("final_score", "q"),
+    ("world_width", "I"), ("world_height", "I"),
+    ("has_player", "?"), ("player_center_x", "f"), ("player_center_y", "f"), ("player_angle", "f"),
+    ("player_alpha", "B"), ("player_lives", "i"), ("player_score", "d"), ("player_taking_damage_timer", "f"),
+    ("has_wingman", "?"), ("wingman_center_x", "f"), ("wingman_center_y", "f"), ("wingman_angle", "f"),
+    ("wingman_alpha", "B"), ("wingman_lives", "i"), ("wingman_score", "d"), ("wingman_taking_damage_timer", "f"),
+    ("obstacles", "I"), ("shots", "I"), ("ufos", "I"), ("power_ups", "I"),
+)
+SCALAR_NAMES = tuple(name for name, _ in _SCALAR_FIELDS)
+SCALARS = struct.Struct("<" + "".join(code for _, code in _SCALAR_FIELDS))
+
+# (group, name, dtype), a group has as many rows as its scalar says
+COLUMNS = (
+    ("obstacles", "center_x", np.uint16), ("obstacles", "center_y", np.uint16),
+    ("obstacles", "angle", np.uint16), ("obstacles", "generation", np.uint16),
+    ("obstacles", "type", np.uint8), ("obstacles", "scale", np.uint16),
+    ("obstacles", "alpha", np.uint8), ("obstacles", "alive", np.uint8),
+    ("obstacles", "change_x", np.int16), ("obstacles", "change_y", np.int16), ("obstacles", "spin", np.int16),
+    ("shots", "center_x", np.uint16), ("shots", "center_y", np.uint16),
+    ("shots", "change_x", np.int16), ("shots", "change_y", np.int16), ("shots", "angle", np.uint16),
+    ("ufos", "center_x", np.uint16), ("ufos", "center_y", np.uint16),
+    ("ufos", "change_x", np.int16), ("ufos", "change_y", np.int16), ("ufos", "color", np.uint8),
+    ("power_ups", "center_x", np.uint16), ("power_ups", "center_y", np.uint16), ("power_ups", "kind", np.uint8),
+)
+# columns sent as the difference to a prediction from the velocities in
+# the base: (velocity column, whether it is a position or an angle)
+_POSITION = 0
+_ANGLE = 1
+PREDICTIONS = {
+    group + "." + name: (group + "." + velocity, kind)
+    for group in ("obstacles", "shots", "ufos")
+    for name, velocity, kind in (
+        ("center_x", "change_x", _POSITION), ("center_y", "change_y", _POSITION),
+    )
+}
+PREDICTIONS["obstacles.angle"] = ("obstacles.spin", _ANGLE)
+
+
+class ProtocolError(ValueError):
+    """
+    A packet that is not one of ours, or is broken
+    """
+
+
+def udp_socket(address=("127.0.0.1", 0)):
+    """
+    A non-blocking UDP socket bound to address
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setblocking(False)
+    sock.bind(address)
+    return sock
+
+
+def receive(sock):
+    """
+    The packets waiting on sock, with the addresses they came from
+    """
+    while True:
+        try:
+            yield sock.recvfrom(65535)
+        except BlockingIOError:
+            return
+        except ConnectionResetError:
+            # some systems report a packet that could not be delivered
+            # on the next receive, nothing to do about it
+            continue
+
+
+def movement_steps(ticks, rate):
+    """
+    Steps of movement at STEP_RATE in ticks steps of a game simulated at
+    rate steps per second, what predictions move things by
+    """
+    return ticks * STEP_RATE / rate
+
+
+def header(kind):
+    return HEADER.pack(MAGIC, PROTOCOL, kind)
+
+
+def packet_kind(packet):
+    """
+    Kind of a packet, raises ProtocolError if it is not one of ours
+    """
+    if len(packet) < HEADER.size:
+        raise ProtocolError("packet too short")
+    magic, protocol, kind = HEADER.unpack_from(packet)
+    if magic != MAGIC or protocol != PROTOCOL:
+        raise ProtocolError("not a packet of this protocol")
+    return kind
+
+
+def unpack(body, packet):
+    """
+    The fields of a packet of the given body struct
+    """
+    try:
+        return body.unpack_from(packet, HEADER.size)
+    except struct.error as error:
+        raise ProtocolError(str(error)) from None
+
+
+# buttons in the held buttons byte of an input packet
+_BUTTONS = ("left", "right", "up", "down", "fire")
+
+
+def pack_input(sequence, ack, presses, inputs):
+    buttons = 0
+    for bit, name in enumerate(_BUTTONS):
+        if getattr(inputs, name):
+            buttons |= 1 << bit
+    joystick_x = math.nan if inputs.joystick_x is None else inputs.joystick_x
+    joystick_y = math.nan if inputs.joystick_y is None else inputs.joystick_y
+    return header(INPUT) + INPUT_BODY.pack(
+        sequence, NO_BASE if ack is None else ack, presses & 0xFFFF, buttons, joystick_x, joystick_y,
+    )
+
+
+def unpack_input(packet):
+    """
+    Sequence, acknowledged tick or None, presses and the InputState,
+    without the action, of an input packet
+    """
+    sequence, ack, presses, buttons, joystick_x, joystick_y = unpack(INPUT_BODY, packet)
+    held = {name: bool(buttons & 1 << bit) for bit, name in enumerate(_BUTTONS)}
+    inputs = InputState(
+        joystick_x=None if math.isnan(joystick_x) else joystick_x,
+        joystick_y=None if math.isnan(joystick_y) else joystick_y,
+        **held
+    )
+    return sequence, None if ack == NO_BASE else ack, presses, inputs
+
+
+def position_scale(world_size):
+    """
+    Offset and scale quantizing positions in a world of world_size, None
+    for the screen
+    """
+    width, height = (SCREEN_WIDTH, SCREEN_HEIGHT) if world_size is None else world_size
+    return (
+        -POSITION_MARGIN, POSITION_STEPS / (width + 2 * POSITION_MARGIN),
+        -POSITION_MARGIN, POSITION_STEPS / (height + 2 * POSITION_MARGIN),
+    )
+
+
+def _positions(values, offset, scale):
+    return np.clip(np.rint((values - offset) * scale), 0, POSITION_STEPS).astype(np.uint16)
+
+
+def _angles(values):
+    return (np.rint(np.mod(values, 360) * (ANGLE_STEPS / 360)).astype(np.int64) % ANGLE_STEPS).astype(np.uint16)
+
+
+def _velocities(values):
+    return np.clip(np.rint(values * VELOCITY_SCALE), -32768, 32767).astype(np.int16)
+
+
+class WireState:
+    """
+    What a client needs to draw one step of the game, quantized. columns
+    maps "group.name" to the arrays of COLUMNS.
+    """
+
+    __slots__ = ("tick", "scalars", "columns")
+
+    def __init__(self, tick, scalars, columns):
+        self.tick = tick
+        self.scalars = scalars
+        self.columns = columns
+
+    @classmethod
+    def of(cls, simulation):
+        """
+        The quantized state of a GameSimulation
+        """
+        world_size = simulation.world_size
+        x_offset, x_scale, y_offset, y_scale = position_scale(world_size)
+        level_timer = simulation.level_timer
+        scalars = {
+            "mode": MODES.index(simulation.mode),
+            "current_level": -1 if simulation.current_level is None else simulation.current_level,
+            "level_timer": math.nan if level_timer is None else level_timer,
+            "final_score": -1 if simulation.final_score is None else simulation.final_score,
+            "world_width": 0 if world_size is None else world_size[0],
+            "world_height": 0 if world_size is None else world_size[1],
+        }
+        for prefix, ship in (("player_", simulation.player), ("wingman_", simulation.wingman)):
+            scalars["has_" + prefix[:-1]] = ship is not None
+            if ship is not None:
+                for name in ("center_x", "center_y", "angle", "score", "taking_damage_timer"):
+                    scalars[prefix + name] = getattr(ship, name)
+                scalars[prefix + "alpha"] = int(ship.alpha)
+                scalars[prefix + "lives"] = ship.player_lives
+
+        columns = {}
+        field = simulation.obstacles
+        size = field.size
+        columns["obstacles.center_x"] = _positions(field.center_x[:size], x_offset, x_scale)
+        columns["obstacles.center_y"] = _positions(field.center_y[:size], y_offset, y_scale)
+        columns["obstacles.angle"] = _angles(field.angle[:size])
+        columns["obstacles.generation"] = field.generation[:size].astype(np.uint16)
+        columns["obstacles.type"] = field.type[:size].astype(np.uint8)
+        columns["obstacles.scale"] = np.rint(field.scale[:size] * SCALE_SCALE).astype(np.uint16)
+        columns["obstacles.alpha"] = np.clip(field.alpha[:size], 0, 255).astype(np.uint8)
+        columns["obstacles.alive"] = field.alive[:size].astype(np.uint8)
+        columns["obstacles.change_x"] = _velocities(field.change_x[:size])
+        columns["obstacles.change_y"] = _velocities(field.change_y[:size])
+        columns["obstacles.spin"] = _velocities(field.spin[:size])
+        scalars["obstacles"] = size
+
+        for group, pool in (("shots", simulation.shots), ("ufos", simulation.ufos)):
+            count = pool.count
+            columns[group + ".center_x"] = _positions(pool.center_x[:count], x_offset, x_scale)
+            columns[group + ".center_y"] = _positions(pool.center_y[:count], y_offset, y_scale)
+            columns[group + ".change_x"] = _velocities(pool.change_x[:count])
+            columns[group + ".change_y"] = _velocities(pool.change_y[:count])
+            scalars[group] = count
+        columns["shots.angle"] = _angles(simulation.shots.angle[:simulation.shots.count])
+        columns["ufos.color"] = simulation.ufos.color[:simulation.ufos.count].astype(np.uint8)
+
+        power_ups = [power_up for power_up in simulation.power_ups if power_up.alive]
+        columns["power_ups.center_x"] = _positions(
+            np.array([power_up.center_x for power_up in power_ups], dtype=float), x_offset, x_scale
+        )
+        columns["power_ups.center_y"] = _positions(
+            np.array([power_up.center_y for power_up in power_ups], dtype=float), y_offset, y_scale
+        )
+        columns["power_ups.kind"] = np.array(
+            [POWER_UP_KINDS.index(power_up.kind) for power_up in power_ups], dtype=np.uint8
+        )
+        scalars["power_ups"] = len(power_ups)
+        return cls(simulation.tick, scalars, columns)
+
+    def predicted(self, key, rows, steps, scalars):
+        """
+        Column key of rows rows as this state's velocities would have it
+        steps steps of movement later, in a world as big as scalars say
+        """
+        values = _padded(self.columns[key], rows)
+        prediction = PREDICTIONS.get(key)
+        if prediction is None:
+            return values
+        velocity, kind = prediction
+        if kind == _ANGLE:
+            unit = ANGLE_STEPS / 360
+        else:
+            width = scalars["world_width"] or None
+            world_size = None if width is None else (width, scalars["world_height"])
+            unit = position_scale(world_size)[1 if key.endswith("x") else 3]
+        moved = np.rint(_padded(self.columns[velocity], rows) * (steps / VELOCITY_SCALE * unit))
+        return (values + moved.astype(np.int64)).astype(values.dtype)
+
+    def encode(self, base=None, steps=1, level=6):
+        """
+        The compressed bytes of this state as a difference to base, a
+        WireState the receiver has steps steps of movement before this
+        one, or on its own without one
+        """
+        scalars = self.scalars
+        parts = [SCALARS.pack(*(scalars.get(name, 0) for name in SCALAR_NAMES))]
+        for group, name, dtype in COLUMNS:
+            key = group + "." + name
+            values = self.columns[key]
+            if base is not None:
+                values = values - base.predicted(key, len(values), steps, scalars)
+            # the low bytes of all rows, then the high bytes, which are
+            # mostly zeros or all ones
+            parts.append(values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes())
+        return zlib.compress(b"".join(parts), level)
+
+    @classmethod
+    def decode(cls, tick, data, base=None, steps=1):
+        """
+        The WireState of tick encoded in data against base, steps steps of
+        movement before it
+        """
+        decompressor = zlib.decompressobj()
+        try:
+            raw = decompressor.decompress(data, MAX_STATE_SIZE)
+        except zlib.error as error:
+            raise ProtocolError(str(error)) from None
+        if decompressor.unconsumed_tail or len(raw) < SCALARS.size:
+            raise ProtocolError("broken state")
+        scalars = dict(zip(SCALAR_NAMES, SCALARS.unpack_from(raw)))
+        if scalars["mode"] >= len(MODES):
+            raise ProtocolError("unknown mode")
+
+        offset = SCALARS.size
+        columns = {}
+        for group, name, dtype in COLUMNS:
+            dtype = np.dtype(dtype)
+            rows = scalars[group]
+            end = offset + rows * dtype.itemsize
+            if end > len(raw):
+                raise ProtocolError("state shorter than its columns")
+            values = np.frombuffer(raw, np.uint8, end - offset, offset).reshape(dtype.itemsize, rows).T
+            values = np.ascontiguousarray(values).view(dtype).ravel()
+            key = group + "." + name
+            if base is not None:
+                values = values + base.predicted(key, rows, steps, scalars)
+            columns[key] = values
+            offset = end
+        if np.any(columns["power_ups.kind"] >= len(POWER_UP_KINDS)):
+            raise ProtocolError("unknown power up")
+        return cls(tick, scalars, columns)
+
+
+def _padded(values, rows):
+    """
+    values cut or padded with zeros to rows
+    """
+    if len(values) >= rows:
+        return values[:rows]
+    padded = np.zeros(rows, dtype=values.dtype)
+    padded[:len(values)] = values
+    return padded
+
+
+def state_packets(tick, base_tick, data):
+    """
+    The packets carrying the encoded state of tick
+    """
+    fragments = max(-(-len(data) // MAX_FRAGMENT), 1)
+    return [
+        header(STATE) + STATE_BODY.pack(
+            tick, NO_BASE if base_tick is None else base_tick, index, fragments
+        ) + data[index * MAX_FRAGMENT:(index + 1) * MAX_FRAGMENT]
+        for index in range(fragments)
+    ]
+
+
+def unpack_state(packet):
+    """
+    Tick, base tick or None, fragment, fragments and the bytes of a state
+    packet
+    """
+    tick, base_tick, fragment, fragments = unpack(STATE_BODY, packet)
+    if fragment >= fragments:
+        raise ProtocolError("fragment out of range")
+    return (
+        tick, None if base_tick == NO_BASE else base_tick, fragment, fragments,
+        packet[HEADER.size + STATE_BODY.size:],
+    )
+
+
+class LossySocket:
+    """
+    A UDP socket whose packets are sent latency plus up to jitter seconds
+    late, or with probability loss not at all
+    """
+
+    def __init__(self, sock, latency=0.0, jitter=0.0, loss=0.0, seed=None, clock=time.perf_counter):
+        """
+        clock gives the time the delays are measured in, replace it to run
+        faster than real time
+        """
+        self.sock = sock
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.rng = random.Random(seed)
+        self.clock = clock
+        # (time due, order sent, packet, address) of the packets on their way
+        self.queue = []
+        self.sent = 0
+        self.dropped = 0
+
+    def sendto(self, packet, address):
+        if self.rng.random() < self.loss:
+            self.dropped += 1
+            return len(packet)
+        due = self.clock() + self.latency + self.rng.random() * self.jitter
+        self.sent += 1
+        heapq.heappush(self.queue, (due, self.sent, packet, address))
+        self.flush()
+        return len(packet)
+
+    def flush(self):
+        """
+        Send the packets that are due
+        """
+        queue = self.queue
+        now = self.clock()
+        while queue and queue[0][0] <= now:
+            _, _, packet, address = heapq.heappop(queue)
+            self.sock.sendto(packet, address)
+
+    def recvfrom(self, size):
+        self.flush()
+        return self.sock.recvfrom(size)
+
+    def getsockname(self):
+        return self.sock.getsockname()
+
+    def close(self):
+        self.sock.close()
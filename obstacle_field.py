@@ -0,0 +1,598 @@
+"""
+Structure-of-arrays store for the obstacles.
+
+Every obstacle is a slot in a set of NumPy arrays instead of a Python
+object, so moving, fading, rotating and killing thousands of meteors is a
+handful of batched array operations per step. Sprites are only synced from
+these arrays when drawing.
+"""
+
+import math
+
+import numpy as np
+
+from constants import (
+    SPRITE_SCALING, SCREEN_BOUNDS, STEP_RATE,
+    OBSTACLE_HARMLESS_TIME, OBSTACLE_HARMLESS_ALPHA, OBSTACLE_HARMLESS_SPEED_FACTOR,
+)
+from images import image_size
+from spatial_hash import SpatialHash
+from sweep import closest_approach
+from timers import TimerWheel
+
+# every obstacle type can move in the same eight directions
+OBSTACLE_VECTORS = [
+    [1, 0],  # right
+    [-1, 0],  # left
+    [0, 1],  # up
+    [0, -1],  # down
+    [1, 1],
+    [-1, -1],
+    [1, -1],
+    [-1, 1]
+]
+
+OBSTACLE_TYPES = {
+    1: {
+        "vectors": OBSTACLE_VECTORS,
+        "graphics": "images/Meteors/meteorGrey_med2.png",
+    },
+    2: {
+        "vectors": OBSTACLE_VECTORS,
+        "graphics": "images/Meteors/meteorBrown_med3.png",
+    },
+    3: {
+        "vectors": OBSTACLE_VECTORS,
+        "graphics": "images/Meteors/meteorGrey_tiny2.png",
+    }
+}
+
+# the type the other meteors break into when shot
+FRAGMENT_TYPE = 3
+
+# obstacles are scaled by SPRITE_SCALING times a random whole number in this range
+OBSTACLE_MIN_SCALE = 4
+OBSTACLE_MAX_SCALE = 9
+
+# per type lookup tables, indexed by the obstacle type
+_TYPE_WIDTH = np.zeros(len(OBSTACLE_TYPES) + 1)
+_TYPE_HEIGHT = np.zeros(len(OBSTACLE_TYPES) + 1)
+for _type, _info in OBSTACLE_TYPES.items():
+    _TYPE_WIDTH[_type], _TYPE_HEIGHT[_type] = image_size(_info["graphics"])
+
+# radius of the largest possible obstacle
+MAX_OBSTACLE_RADIUS = float((_TYPE_WIDTH + _TYPE_HEIGHT).max()) * SPRITE_SCALING * OBSTACLE_MAX_SCALE / 4
+# farthest any part of an obstacle's image can be from its center
+MAX_OBSTACLE_REACH = float(np.hypot(_TYPE_WIDTH, _TYPE_HEIGHT).max()) * SPRITE_SCALING * OBSTACLE_MAX_SCALE / 2
+# farthest an obstacle moves in a step at STEP_RATE, a fragment of a meteor
+# flying diagonally flies 45 degrees off it at twice the speed along one axis
+MAX_OBSTACLE_STEP = 2.0
+
+
+def obstacle_half_size(types, scale):
+    """
+    Half the width and height of obstacles of the given types and scales
+    """
+    return _TYPE_WIDTH[types] * scale / 2, _TYPE_HEIGHT[types] * scale / 2
+
+
+_FLOAT_FIELDS = (
+    "scale", "center_x", "center_y", "speed_x", "speed_y", "speed_noise",
+    "change_x", "change_y", "angle", "change_angle", "spin", "alpha", "harmful_at",
+    "half_width", "half_height", "radius", "reach",
+)
+
+
+class SpawnTable:
+    """
+    Everything random about a batch of obstacles that are yet to be spawned
+    """
+
+    __slots__ = (
+        "type", "scale", "center_x", "center_y", "speed_x", "speed_y",
+        "speed_noise", "change_angle", "spawn_on_edge",
+    )
+
+    def __len__(self):
+        return len(self.type)
+
+
+def generate_spawn_table(rng, count, spawn_on_edge=False, bounds=SCREEN_BOUNDS):
+    """
+    Roll count obstacles of random types with a NumPy Generator, inside or
+    on the edge of bounds, a (left, bottom, right, top) rectangle
+    """
+    table = SpawnTable()
+    table.spawn_on_edge = spawn_on_edge
+
+    table.type = rng.integers(1, len(OBSTACLE_TYPES) + 1, count)
+    table.scale = SPRITE_SCALING * rng.integers(OBSTACLE_MIN_SCALE, OBSTACLE_MAX_SCALE + 1, count)
+
+    left, bottom, right, top = bounds
+    x = rng.integers(int(left), int(right) + 1, count).astype(float)
+    y = rng.integers(int(bottom), int(top) + 1, count).astype(float)
+    if spawn_on_edge:
+        # top, right, left or bottom edge
+        side = rng.integers(0, 4, count)
+        y[side == 0] = top
+        x[side == 1] = right
+        x[side == 2] = left
+        y[side == 3] = bottom
+    table.center_x = x
+    table.center_y = y
+
+    vectors = np.zeros((count, 2))
+    for type, info in OBSTACLE_TYPES.items():
+        of_type = table.type == type
+        choices = np.array(info["vectors"], dtype=float)
+        vectors[of_type] = choices[rng.integers(0, len(choices), int(of_type.sum()))]
+    table.speed_x = vectors[:, 0].copy()
+    table.speed_y = vectors[:, 1].copy()
+
+    # random speed noise for obstacles. As in the object version this
+    # replaced, movement follows the direction vector and starts on the
+    # first update, so speed and noise do not change how fast it moves.
+    table.speed_noise = rng.uniform(0.6, 1.5, count)
+    table.change_angle = rng.uniform(-1, 1, count)
+
+    return table
+
+
+class FrozenObstacles:
+    """
+    Obstacles taken out of an ObstacleField with freeze(), to thaw() later
+    """
+
+    __slots__ = _FLOAT_FIELDS + ("type", "is_harmless")
+
+    def __len__(self):
+        return len(self.type)
+
+
+class ObstacleField:
+    """
+    All obstacles of a game, one array slot per obstacle.
+
+    Slots up to size are in use; alive tells which of them hold an obstacle.
+    Killed slots are reused by the next spawn, and generation is bumped
+    every time a slot gets a new obstacle so views can tell them apart.
+
+    With use_spatial_hash the living obstacles are also kept in a uniform
+    grid, so collision queries only test the obstacles near the query.
+    Obstacles not spawned on the edge stay harmless for harmless_time
+    seconds, until a timer on timers, a TimerWheel, makes them harmful.
+    Every batch of obstacles spawned together gets one timer. Without
+    timers the field keeps its own wheel and advances it in update().
+    Obstacles that leave bounds, the (left, bottom, right, top) of the
+    area simulated, are killed.
+    """
+
+    def __init__(self, capacity=256, seed=None, use_spatial_hash=True,
+                 spatial_hash_cell_size=2 * MAX_OBSTACLE_RADIUS, harmless_time=OBSTACLE_HARMLESS_TIME,
+                 bounds=SCREEN_BOUNDS, timers=None):
+        self.rng = np.random.default_rng(seed)
+        self.harmless_time = harmless_time
+        self.bounds = bounds
+
+        self.own_timers = timers is None
+        self.timers = TimerWheel() if timers is None else timers
+        # pending timers of the batches still harmless, by batch number
+        self.harmless_timers = {}
+        self.batches = 0
+
+        self.spatial_hash = None
+        if use_spatial_hash:
+            self.spatial_hash = SpatialHash(spatial_hash_cell_size, margin=MAX_OBSTACLE_RADIUS)
+
+        self.size = 0
+        self.count = 0
+        self.capacity = 0
+
+        # spawns into already allocated slots and spawns that had to grow the arrays
+        self.slots_reused = 0
+        self.slots_added = 0
+
+        self.type = np.zeros(0, dtype=np.int8)
+        for name in _FLOAT_FIELDS:
+            setattr(self, name, np.zeros(0))
+        self.is_harmless = np.zeros(0, dtype=bool)
+        self.alive = np.zeros(0, dtype=bool)
+        self.generation = np.zeros(0, dtype=np.int64)
+
+        self._grow(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def _grow(self, capacity):
+        """
+        Make room for at least capacity obstacles
+        """
+        new_capacity = max(capacity, self.capacity * 2)
+        for name in _FLOAT_FIELDS + ("type", "is_harmless", "alive", "generation"):
+            old = getattr(self, name)
+            new = np.zeros(new_capacity, dtype=old.dtype)
+            new[:self.capacity] = old
+            setattr(self, name, new)
+        self.capacity = new_capacity
+
+    def _free_slots(self, count):
+        """
+        Indices of count slots to spawn into, reusing killed slots first
+        """
+        free = np.flatnonzero(~self.alive[:self.size])[:count]
+        missing = count - len(free)
+        added = 0
+        if missing > 0:
+            start = self.size
+            added = max(start + missing - self.capacity, 0)
+            if added:
+                self._grow(start + missing)
+            self.size = start + missing
+            free = np.concatenate((free, np.arange(start, self.size)))
+        self.slots_added += added
+        self.slots_reused += count - added
+        return free
+
+    def clear(self):
+        """
+        Remove all obstacles
+        """
+        self.alive[:self.size] = False
+        self.size = 0
+        self.count = 0
+        if self.spatial_hash is not None:
+            self.spatial_hash.clear()
+        for timer in self.harmless_timers.values():
+            timer.cancel()
+        self.harmless_timers.clear()
+
+    def kill(self, slots):
+        """
+        Remove the obstacles in the given slots
+        """
+        slots = slots[self.alive[slots]]
+        self.alive[slots] = False
+        self.count -= len(slots)
+        if self.spatial_hash is not None:
+            self.spatial_hash.remove(slots)
+
+    def split(self, slots):
+        """
+        Kill the obstacles in the given slots. Those that are not fragments
+        already break into two fragments of the same scale, flying off 45
+        degrees to either side. Returns the slots of the fragments.
+        """
+        slots = np.unique(slots)
+        slots = slots[self.alive[slots]]
+        breaking = slots[self.type[slots] != FRAGMENT_TYPE]
+        self.kill(slots)
+        count = 2 * len(breaking)
+        if count == 0:
+            return np.zeros(0, dtype=np.intp)
+
+        table = SpawnTable()
+        # fragments are as dangerous as what they broke off
+        table.spawn_on_edge = True
+        table.type = np.full(count, FRAGMENT_TYPE)
+        table.scale = np.repeat(self.scale[breaking], 2)
+        table.center_x = np.repeat(self.center_x[breaking], 2)
+        table.center_y = np.repeat(self.center_y[breaking], 2)
+        speed_x = self.speed_x[breaking]
+        speed_y = self.speed_y[breaking]
+        table.speed_x = np.column_stack((speed_x - speed_y, speed_x + speed_y)).ravel()
+        table.speed_y = np.column_stack((speed_y + speed_x, speed_y - speed_x)).ravel()
+        table.speed_noise = np.repeat(self.speed_noise[breaking], 2)
+        table.change_angle = self.rng.uniform(-1, 1, count)
+        return self.materialize(table)
+
+    def spawn(self, count, speed, spawn_on_edge=False):
+        """
+        Add count obstacles of random types.
+
+        Obstacles spawned on the edge of the bounds are harmful right away,
+        the others start harmless and fade in.
+        """
+        if count <= 0:
+            return np.zeros(0, dtype=np.intp)
+        return self.materialize(generate_spawn_table(self.rng, count, spawn_on_edge, self.bounds))
+
+    def freeze(self, slots):
+        """
+        Take the obstacles in the given slots out of the field, returning
+        all there is to know about them for thaw()
+        """
+        slots = slots[self.alive[slots]]
+        frozen = FrozenObstacles()
+        for name in FrozenObstacles.__slots__:
+            setattr(frozen, name, getattr(self, name)[slots].copy())
+        self.kill(slots)
+        return frozen
+
+    def thaw(self, frozen, elapsed=0.0, region=None):
+        """
+        Put frozen obstacles back into the field. They are moved on by the
+        elapsed seconds they spent frozen in one go, wrapping around inside
+        region, a (left, bottom, right, top) rectangle, so they stay where
+        they were frozen. Harmless ones become harmful when they would
+        have if they had never been frozen.
+        """
+        count = len(frozen)
+        if count == 0:
+            return np.zeros(0, dtype=np.intp)
+        slots = self._free_slots(count)
+        for name in FrozenObstacles.__slots__:
+            getattr(self, name)[slots] = getattr(frozen, name)
+
+        if elapsed > 0:
+            steps = elapsed * STEP_RATE
+            x = self.center_x[slots] + self.change_x[slots] * steps
+            y = self.center_y[slots] + self.change_y[slots] * steps
+            if region is not None:
+                left, bottom, right, top = region
+                x = left + np.mod(x - left, right - left)
+                y = bottom + np.mod(y - bottom, top - bottom)
+            self.center_x[slots] = x
+            self.center_y[slots] = y
+            self.angle[slots] += self.spin[slots] * steps
+
+        self.alive[slots] = True
+        self.generation[slots] += 1
+        self.count += count
+        if self.spatial_hash is not None:
+            self.spatial_hash.insert(slots, self.center_x[slots], self.center_y[slots])
+
+        harmless = slots[self.is_harmless[slots]]
+        if len(harmless):
+            due = self.harmful_at[harmless]
+            self._become_harmful(harmless[due <= self.timers.now], None)
+            for at in np.unique(due[due > self.timers.now]):
+                self.schedule_harmful(harmless[due == at], int(at))
+        return slots
+
+    def schedule_harmful(self, slots, due, generations=None):
+        """
+        Make the obstacles in slots harmful in step due, unless their slots
+        hold other obstacles by then, or by the time the obstacles of the
+        given generations were in them
+        """
+        if generations is None:
+            generations = self.generation[slots].copy()
+        self.batches += 1
+        self.harmless_timers[self.batches] = self.timers.at(
+            due, self._become_harmful, slots, generations, self.batches
+        )
+
+    def _become_harmful(self, slots, generations, batch=None):
+        if generations is not None:
+            slots = slots[(self.generation[slots] == generations) & self.alive[slots]]
+        self.harmless_timers.pop(batch, None)
+        self.is_harmless[slots] = False
+        self.alpha[slots] = 255
+        self.change_x[slots] = self.speed_x[slots]
+        self.change_y[slots] = self.speed_y[slots]
+        self.spin[slots] = self.change_angle[slots]
+
+    def harmless_time_left(self, slots):
+        """
+        Seconds until the obstacles in slots become harmful, 0 for the
+        harmful ones
+        """
+        time_left = (self.harmful_at[slots] - self.timers.now) * self.timers.step_time
+        return np.where(self.is_harmless[slots], time_left, 0.0)
+
+    def materialize(self, table, start=0, stop=None):
+        """
+        Add the obstacles in rows start to stop of a SpawnTable
+        """
+        if stop is None:
+            stop = len(table)
+        count = stop - start
+        if count <= 0:
+            return np.zeros(0, dtype=np.intp)
+
+        slots = self._free_slots(count)
+        rows = slice(start, stop)
+
+        types = table.type[rows]
+        scale = table.scale[rows]
+        self.type[slots] = types
+        self.scale[slots] = scale
+        self.half_width[slots], self.half_height[slots] = obstacle_half_size(types, scale)
+        self.radius[slots] = (self.half_width[slots] + self.half_height[slots]) / 2
+        self.reach[slots] = np.hypot(self.half_width[slots], self.half_height[slots])
+
+        x = table.center_x[rows]
+        y = table.center_y[rows]
+        self.center_x[slots] = x
+        self.center_y[slots] = y
+        self.speed_x[slots] = table.speed_x[rows]
+        self.speed_y[slots] = table.speed_y[rows]
+        self.speed_noise[slots] = table.speed_noise[rows]
+        self.angle[slots] = 0
+        self.change_angle[slots] = table.change_angle[rows]
+
+        # harmless obstacles drift in slowed down and faded out
+        factor = 1.0 if table.spawn_on_edge else OBSTACLE_HARMLESS_SPEED_FACTOR
+        self.change_x[slots] = self.speed_x[slots] * factor
+        self.change_y[slots] = self.speed_y[slots] * factor
+        self.spin[slots] = self.change_angle[slots] * factor
+        self.alpha[slots] = 255 if table.spawn_on_edge else OBSTACLE_HARMLESS_ALPHA
+        self.is_harmless[slots] = not table.spawn_on_edge
+
+        self.alive[slots] = True
+        self.generation[slots] += 1
+        self.count += count
+
+        if self.spatial_hash is not None:
+            self.spatial_hash.insert(slots, x, y)
+
+        if not table.spawn_on_edge:
+            due = self.timers.now + self.timers.ticks(self.harmless_time)
+            self.harmful_at[slots] = due
+            self.schedule_harmful(slots, due)
+
+        return slots
+
+    def update(self, delta_time):
+        """
+        Move, fade and rotate every obstacle, killing those that left the bounds
+        """
+        if self.own_timers:
+            self.timers.advance(delta_time)
+
+        n = self.size
+        if n == 0:
+            return
+
+        center_x = self.center_x[:n]
+        center_y = self.center_y[:n]
+        half_width = self.half_width[:n]
+        half_height = self.half_height[:n]
+        alive = self.alive[:n]
+
+        # speeds are per step at STEP_RATE
+        steps = delta_time * STEP_RATE
+        if steps == 1:
+            center_x += self.change_x[:n]
+            center_y += self.change_y[:n]
+        else:
+            center_x += self.change_x[:n] * steps
+            center_y += self.change_y[:n] * steps
+
+        left, bottom, right, top = self.bounds
+        gone = center_x - half_width > right
+        gone |= center_x + half_width < left
+        gone |= center_y - half_height > top
+        gone |= center_y + half_height < bottom
+        gone &= alive
+        if gone.any():
+            alive[gone] = False
+            self.count -= int(np.count_nonzero(gone))
+            if self.spatial_hash is not None:
+                self.spatial_hash.remove(np.flatnonzero(gone))
+
+        if self.spatial_hash is not None:
+            self.spatial_hash.move(center_x, center_y)
+
+        if self.harmless_timers:
+            # fade in the harmless ones as their time runs out
+            fading = self.is_harmless[:n] & alive
+            alpha = self.alpha[:n]
+            time_left = (self.harmful_at[:n] - self.timers.now) * self.timers.step_time
+            np.divide(255, time_left, out=alpha, where=fading)
+            np.minimum(alpha, 255, out=alpha)
+
+        self.angle[:n] += self.spin[:n] * steps
+
+    def nearby(self, x, y, radius):
+        """
+        Slots of the living obstacles that could touch a circle, a
+        superset of the ones that do
+        """
+        if self.spatial_hash is not None:
+            return self.spatial_hash.query(x, y, radius)
+        return np.flatnonzero(self.alive[:self.size])
+
+    def colliding(self, x, y, radius, harmful_only=False):
+        """
+        Slots of the living obstacles touching a circle
+        """
+        slots = self.nearby(x, y, radius)
+        if len(slots) == 0:
+            return slots
+        dx = self.center_x[slots] - x
+        dy = self.center_y[slots] - y
+        reach = self.radius[slots] + radius
+        hit = dx * dx + dy * dy < reach * reach
+        if harmful_only:
+            hit &= ~self.is_harmless[slots]
+        return slots[hit]
+
+    def _paths(self, x0, y0, x1, y1, reach, steps, harmful_only):
+        """
+        Slots of the living obstacles that could have come within reach
+        of a point moving from (x0, y0) to (x1, y1) during the last update
+        of steps steps, where they were relative to the point at the start
+        of it and how that changed over it
+        """
+        path = math.hypot(x1 - x0, y1 - y0)
+        slots = self.nearby((x0 + x1) / 2, (y0 + y1) / 2, reach + path / 2 + MAX_OBSTACLE_STEP * steps)
+        if harmful_only and len(slots):
+            slots = slots[~self.is_harmless[slots]]
+        if len(slots) == 0:
+            return slots, None, None, None, None
+        move_x = self.change_x[slots] * steps
+        move_y = self.change_y[slots] * steps
+        return (
+            slots,
+            self.center_x[slots] - move_x - x0, self.center_y[slots] - move_y - y0,
+            move_x - (x1 - x0), move_y - (y1 - y0),
+        )
+
+    def sweeping(self, x0, y0, x1, y1, radius, steps, harmful_only=False):
+        """
+        Slots of the living obstacles a circle touched on its way from
+        (x0, y0) to (x1, y1) during the last update, of steps steps at
+        STEP_RATE, in which the obstacles moved too
+        """
+        slots, x, y, dx, dy = self._paths(x0, y0, x1, y1, radius, steps, harmful_only)
+        if len(slots) == 0:
+            return slots
+        _, distance2 = closest_approach(x, y, dx, dy)
+        reach = self.radius[slots] + radius
+        return slots[distance2 < reach * reach]
+
+    def sweeping_hit_box(self, x0, y0, x1, y1, points, normals, reach, hit_boxes, steps, harmful_only=False):
+        """
+        Slots of the living obstacles whose hit boxes overlapped a convex
+        hit box on its way from (x0, y0) to (x1, y1) during the last
+        update, like colliding_hit_box() does for one place. The hit boxes
+        keep their angles of now and are swept along the whole way.
+        """
+        slots, x, y, dx, dy = self._paths(
+            x0, y0, x1, y1, reach + MAX_OBSTACLE_REACH - MAX_OBSTACLE_RADIUS, steps, harmful_only
+        )
+        if len(slots) == 0:
+            return slots
+
+        # bounding circles first, most candidates fail those
+        _, distance2 = closest_approach(x, y, dx, dy)
+        bound = self.reach[slots] + reach
+        close = distance2 < bound * bound
+        if not close.any():
+            return slots[close]
+        slots = slots[close]
+
+        shapes = hit_boxes.obstacle_shapes(self.type[slots], self.scale[slots])
+        others, other_normals = hit_boxes.obstacle_polygons(shapes, self.angle[slots])
+        offsets = np.stack((x[close], y[close]), axis=-1)[:, None, :]
+        moves = np.stack((dx[close], dy[close]), axis=-1)
+        return slots[hit_boxes.sweeping(points, normals, others + offsets, other_normals, moves)]
+
+    def colliding_hit_box(self, x, y, points, normals, reach, hit_boxes, harmful_only=False):
+        """
+        Slots of the living obstacles whose hit boxes overlap a convex hit
+        box around (x, y) that gets at most reach away from it. points and
+        normals come from hit_boxes, a HitBoxCache, as do the obstacles'.
+        """
+        # the grid's margin only covers the circles of the obstacles
+        slots = self.nearby(x, y, reach + MAX_OBSTACLE_REACH - MAX_OBSTACLE_RADIUS)
+        if harmful_only and len(slots):
+            slots = slots[~self.is_harmless[slots]]
+        if len(slots) == 0:
+            return slots
+
+        # bounding circles first, most candidates fail those
+        dx = self.center_x[slots] - x
+        dy = self.center_y[slots] - y
+        bound = self.reach[slots] + reach
+        close = dx * dx + dy * dy < bound * bound
+        if not close.any():
+            return slots[close]
+        slots = slots[close]
+
+        shapes = hit_boxes.obstacle_shapes(self.type[slots], self.scale[slots])
+        others, other_normals = hit_boxes.obstacle_polygons(shapes, self.angle[slots])
+        offsets = np.stack((dx[close], dy[close]), axis=-1)[:, None, :]
+        return slots[hit_boxes.overlapping(points, normals, others + offsets, other_normals)]
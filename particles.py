@@ -0,0 +1,150 @@
+"""
+Preallocated store for the particles of the effects.
+
+Damage, dashes and things being shot down throw off short lived particles
+animated with the fire and shield frames in images/Effects. Like the shots
+they are slots in NumPy arrays allocated once and kept packed at the front,
+so aging them, picking their animation frame and fading them out is a
+handful of batched operations per step. The pool never holds more than its
+budget, which a LoadGovernor lowers when frames run long, so effects are
+the first thing to give when the machine is struggling. Particles are only
+for show, nothing in the game depends on them.
+"""
+
+import numpy as np
+
+from constants import (
+    SPRITE_SCALING, STEP_RATE, MAX_PARTICLES, PARTICLE_SCALING, PARTICLE_SPEED, PARTICLE_LIFETIME,
+    FIRE_GRAPHICS, SHIELD_GRAPHICS,
+)
+
+# kinds of particles
+FIRE = 0
+SHIELD = 1
+
+PARTICLE_KINDS = {
+    FIRE: {
+        "graphics": FIRE_GRAPHICS,
+        "scale": PARTICLE_SCALING,
+    },
+    SHIELD: {
+        "graphics": SHIELD_GRAPHICS,
+        "scale": SPRITE_SCALING,
+    },
+}
+
+# animation frames per kind, indexed by the kind
+_FRAMES = np.array([len(PARTICLE_KINDS[kind]["graphics"]) for kind in sorted(PARTICLE_KINDS)])
+
+_FLOAT_FIELDS = ("center_x", "center_y", "change_x", "change_y", "angle", "age", "lifetime", "alpha")
+_INT_FIELDS = ("kind", "frame")
+
+
+class ParticlePool:
+    """
+    Up to budget particles, the live ones in slots 0 to count
+    """
+
+    def __init__(self, capacity=MAX_PARTICLES, seed=None):
+        """
+        seed decides the directions, speeds and lifetimes of the particles
+        """
+        self.capacity = capacity
+        self.budget = capacity
+        self.count = 0
+        for name in _FLOAT_FIELDS:
+            setattr(self, name, np.zeros(capacity))
+        for name in _INT_FIELDS:
+            setattr(self, name, np.zeros(capacity, dtype=np.int64))
+        self.rng = np.random.default_rng(seed)
+
+        # particles emitted, and particles not emitted because the budget was used up
+        self.emitted = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def emit(self, x, y, count, kind=FIRE, speed=PARTICLE_SPEED, lifetime=PARTICLE_LIFETIME,
+             angle=0, spread=360, change_x=0, change_y=0):
+        """
+        Throw off count particles from (x, y), or from each of the points
+        when x and y are arrays. They fly at up to speed pixels per step
+        in directions spread degrees around angle, 0 pointing up like the
+        player's angle, carried along by (change_x, change_y), and live up
+        to lifetime seconds. Returns the number of particles emitted,
+        fewer than asked when the budget is used up.
+        """
+        x = np.repeat(np.atleast_1d(np.asarray(x, dtype=float)), count)
+        y = np.repeat(np.atleast_1d(np.asarray(y, dtype=float)), count)
+        room = max(min(self.budget, self.capacity) - self.count, 0)
+        if len(x) > room:
+            self.dropped += len(x) - room
+            x = x[:room]
+            y = y[:room]
+        count = len(x)
+        if count == 0:
+            return 0
+        new = slice(self.count, self.count + count)
+        rng = self.rng
+
+        directions = angle + rng.uniform(-spread / 2, spread / 2, count)
+        radians = np.radians(directions)
+        speeds = speed * rng.uniform(0.3, 1.0, count)
+        self.center_x[new] = x
+        self.center_y[new] = y
+        self.change_x[new] = change_x - np.sin(radians) * speeds
+        self.change_y[new] = change_y + np.cos(radians) * speeds
+        # flames trail behind the way they fly
+        self.angle[new] = directions + 180
+        self.age[new] = 0
+        self.lifetime[new] = lifetime * rng.uniform(0.6, 1.0, count)
+        self.alpha[new] = 255
+        self.kind[new] = kind
+        self.frame[new] = 0
+
+        self.count += count
+        self.emitted += count
+        return count
+
+    def update(self, delta_time):
+        """
+        Move and age every particle, removing the ones that burnt out, and
+        pick the animation frame and fade of the rest
+        """
+        n = self.count
+        if n == 0:
+            return
+        steps = delta_time * STEP_RATE
+        center_x = self.center_x[:n]
+        center_y = self.center_y[:n]
+        center_x += self.change_x[:n] * steps
+        center_y += self.change_y[:n] * steps
+        age = self.age[:n]
+        age += delta_time
+
+        gone = age >= self.lifetime[:n]
+        if gone.any():
+            keep = ~gone
+            n = int(np.count_nonzero(keep))
+            for name in _FLOAT_FIELDS + _INT_FIELDS:
+                values = getattr(self, name)
+                values[:n] = values[:self.count][keep]
+            self.count = n
+
+        # the animation runs once over the life of a particle
+        progress = self.age[:n] / self.lifetime[:n]
+        frames = _FRAMES[self.kind[:n]]
+        self.frame[:n] = np.minimum((progress * frames).astype(np.int64), frames - 1)
+        self.alpha[:n] = 255 * (1 - progress)
+
+    def stats(self):
+        return {
+            "particles": self.count,
+            "budget": self.budget,
+            "emitted": self.emitted,
+            "dropped": self.dropped,
+        }
@@ -0,0 +1,92 @@
+"""
+Object pools.
+
+A pool hands out objects that were released earlier instead of allocating
+new ones. Pooled objects take the same arguments in reset() as in their
+constructor, reset() is called every time an object is reused.
+"""
+
+
+class Pool:
+    """
+    Recycles objects made by factory.
+
+    At most max_size released objects are kept for reuse, the high-water
+    mark; releasing more than that discards them. on_release is called with
+    every object that goes back into the pool and on_discard with every
+    object that is dropped because the pool is full.
+    """
+
+    def __init__(self, factory, max_size=1000, on_release=None, on_discard=None):
+        self.factory = factory
+        self.max_size = max_size
+        self.on_release = on_release
+        self.on_discard = on_discard
+        self.free = []
+
+        self.created = 0
+        self.reused = 0
+        self.released = 0
+        self.discarded = 0
+
+    def __len__(self):
+        return len(self.free)
+
+    def prefill(self, count, *args):
+        """
+        Create objects up front so the first acquires do not allocate
+        """
+        while len(self.free) < min(count, self.max_size):
+            self.created += 1
+            obj = self.factory(*args)
+            if self.on_release is not None:
+                self.on_release(obj)
+            self.free.append(obj)
+
+    def acquire(self, *args):
+        """
+        An object set up with args, reused when possible
+        """
+        if self.free:
+            self.reused += 1
+            obj = self.free.pop()
+            obj.reset(*args)
+            return obj
+
+        self.created += 1
+        return self.factory(*args)
+
+    def release(self, obj):
+        """
+        Give an object back to the pool
+        """
+        self.released += 1
+        if len(self.free) < self.max_size:
+            if self.on_release is not None:
+                self.on_release(obj)
+            self.free.append(obj)
+        else:
+            self.discarded += 1
+            if self.on_discard is not None:
+                self.on_discard(obj)
+
+    @property
+    def reuse_rate(self):
+        """
+        Share of acquires that were served by a reused object
+        """
+        acquired = self.reused + self.created
+        if acquired == 0:
+            return 0.0
+        return self.reused / acquired
+
+    def stats(self):
+        return {
+            "free": len(self.free),
+            "max_size": self.max_size,
+            "created": self.created,
+            "reused": self.reused,
+            "released": self.released,
+            "discarded": self.discarded,
+            "reuse_rate": self.reuse_rate,
+        }
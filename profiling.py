@@ -0,0 +1,178 @@
+"""
+Frame timing instrumentation.
+
+Named sections of the update and draw code are timed with
+
+    with profiler.section("collisions"):
+        ...
+
+Every section keeps its most recent samples in a ring buffer, from which
+rolling percentiles are computed on demand and which can be written to CSV
+or JSON. A disabled profiler hands out a shared do-nothing section, so the
+instrumentation can stay in the game loop at next to no cost.
+
+A profiler can be shared by the simulation and draw threads as long as they
+time sections of different names.
+"""
+
+import csv
+import json
+import threading
+import time
+
+import numpy as np
+
+# percentiles reported by summary()
+PERCENTILES = (50, 90, 99)
+
+
+class RingBuffer:
+    """
+    The last size values added
+    """
+
+    __slots__ = ("values", "index", "count")
+
+    def __init__(self, size):
+        self.values = [0.0] * size
+        self.index = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, value):
+        values = self.values
+        values[self.index] = value
+        self.index = (self.index + 1) % len(values)
+        if self.count < len(values):
+            self.count += 1
+
+    def samples(self):
+        """
+        The values in the order they were added, oldest first
+        """
+        if self.count < len(self.values):
+            return self.values[:self.count]
+        return self.values[self.index:] + self.values[:self.index]
+
+
+class Section:
+    """
+    Times the code in a with block and keeps the durations
+    """
+
+    __slots__ = ("name", "samples", "start")
+
+    def __init__(self, name, size):
+        self.name = name
+        self.samples = RingBuffer(size)
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.samples.add(time.perf_counter() - self.start)
+        return False
+
+
+class _NullSection:
+    """
+    Section handed out by a disabled profiler
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SECTION = _NullSection()
+
+
+class FrameProfiler:
+    """
+    Times named sections of the game loop
+    """
+
+    def __init__(self, enabled=False, size=600):
+        """
+        size is the number of samples kept per section
+        """
+        self.enabled = enabled
+        self.size = size
+        self.sections = {}
+        # held while sections are added or read, they can be added from
+        # another thread while a summary is made
+        self._lock = threading.Lock()
+
+    def section(self, name):
+        """
+        Context manager timing the code inside it as section name
+        """
+        if not self.enabled:
+            return _NULL_SECTION
+        section = self.sections.get(name)
+        if section is None:
+            with self._lock:
+                section = self.sections.setdefault(name, Section(name, self.size))
+        return section
+
+    def clear(self):
+        with self._lock:
+            self.sections.clear()
+
+    def _sections(self):
+        with self._lock:
+            return list(self.sections.items())
+
+    def summary(self):
+        """
+        Sample count, mean, percentiles and maximum of every section, in
+        milliseconds
+        """
+        result = {}
+        for name, section in self._sections():
+            samples = np.array(section.samples.samples()) * 1000
+            if len(samples) == 0:
+                continue
+            stats = {"count": len(samples), "mean": float(samples.mean())}
+            for percentile, value in zip(PERCENTILES, np.percentile(samples, PERCENTILES)):
+                stats["p{}".format(percentile)] = float(value)
+            stats["max"] = float(samples.max())
+            result[name] = stats
+        return result
+
+    def to_json(self, path):
+        """
+        Write the summary and the raw samples, in milliseconds, as JSON
+        """
+        data = {
+            "summary": self.summary(),
+            "samples": {
+                name: [value * 1000 for value in section.samples.samples()]
+                for name, section in self._sections()
+            },
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
+
+    def to_csv(self, path):
+        """
+        Write the summary as CSV, one row per section
+        """
+        columns = ["count", "mean"] + ["p{}".format(p) for p in PERCENTILES] + ["max"]
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["section"] + [column + ("" if column == "count" else "_ms") for column in columns])
+            for name, stats in self.summary().items():
+                writer.writerow([name] + [stats[column] for column in columns])
+
+
+# profiler used when none is given, it never measures anything
+NULL_PROFILER = FrameProfiler(enabled=False)
@@ -0,0 +1,204 @@
+"""
+Preallocated store for the player's shots.
+
+A bullet hell keeps thousands of shots in the air, each living a few
+seconds, so they are slots in a set of NumPy arrays allocated once instead
+of objects. The live shots are always packed in the first count slots:
+moving them is one batched operation per array, and shots that hit
+something, expired or left the screen are removed together by compacting
+the arrays once per step. Collisions with the obstacles are found for all
+shots at once through a dense grid, see spatial_hash.grid_pairs.
+"""
+
+import math
+
+import numpy as np
+
+from constants import (
+    SPRITE_SCALING, SCREEN_BOUNDS, STEP_RATE, PLAYER_SHOT_GRAPHICS, MAX_SHOTS,
+)
+from images import image_size
+from obstacle_field import MAX_OBSTACLE_RADIUS
+from spatial_hash import grid_pairs
+
+_SHOT_WIDTH, _SHOT_HEIGHT = image_size(PLAYER_SHOT_GRAPHICS)
+# circle standing in for a shot, like the circles of the obstacles
+SHOT_RADIUS = (_SHOT_WIDTH + _SHOT_HEIGHT) * SPRITE_SCALING / 4
+
+_FIELDS = ("center_x", "center_y", "change_x", "change_y", "angle", "lifetime")
+
+
+class ProjectilePool:
+    """
+    Up to capacity shots, the live ones in slots 0 to count
+    """
+
+    def __init__(self, capacity=MAX_SHOTS):
+        self.capacity = capacity
+        self.count = 0
+        for name in _FIELDS:
+            setattr(self, name, np.zeros(capacity))
+
+        # shots fired, and shots not fired because the pool was full
+        self.fired = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def fire(self, x, y, angles, speed, lifetime):
+        """
+        Fire shots from (x, y) in the given directions, in degrees with 0
+        pointing up like the player's angle. speed is in pixels per step.
+        Returns the number of shots fired, less than asked when the pool
+        is full.
+        """
+        angles = np.asarray(angles, dtype=float)
+        room = self.capacity - self.count
+        if len(angles) > room:
+            self.dropped += len(angles) - room
+            angles = angles[:room]
+        new = slice(self.count, self.count + len(angles))
+
+        radians = np.radians(angles)
+        self.center_x[new] = x
+        self.center_y[new] = y
+        self.change_x[new] = -np.sin(radians) * speed
+        self.change_y[new] = np.cos(radians) * speed
+        self.angle[new] = angles
+        self.lifetime[new] = lifetime
+
+        self.count += len(angles)
+        self.fired += len(angles)
+        return len(angles)
+
+    def update(self, delta_time, bounds=SCREEN_BOUNDS):
+        """
+        Move every shot, removing the expired ones and those that left
+        bounds, the (left, bottom, right, top) of the screen
+        """
+        n = self.count
+        if n == 0:
+            return
+        steps = delta_time * STEP_RATE
+        center_x = self.center_x[:n]
+        center_y = self.center_y[:n]
+        center_x += self.change_x[:n] * steps
+        center_y += self.change_y[:n] * steps
+        lifetime = self.lifetime[:n]
+        lifetime -= delta_time
+
+        left, bottom, right, top = bounds
+        gone = lifetime <= 0
+        gone |= center_x < left - SHOT_RADIUS
+        gone |= center_x > right + SHOT_RADIUS
+        gone |= center_y < bottom - SHOT_RADIUS
+        gone |= center_y > top + SHOT_RADIUS
+        self._remove(gone)
+
+    def remove(self, shots):
+        """
+        Remove the shots with the given indices. The remaining shots move
+        down to stay packed, so earlier indices are no longer valid.
+        """
+        gone = np.zeros(self.count, dtype=bool)
+        gone[shots] = True
+        self._remove(gone)
+
+    def _remove(self, gone):
+        if not gone.any():
+            return
+        keep = ~gone
+        n = self.count
+        kept = int(np.count_nonzero(keep))
+        for name in _FIELDS:
+            values = getattr(self, name)
+            values[:kept] = values[:n][keep]
+        self.count = kept
+
+    def colliding(self, field, bounds=SCREEN_BOUNDS):
+        """
+        Which shots hit which obstacles of an ObstacleField, with the shots
+        inside bounds.
+
+        Every shot hits at most one obstacle. Returns the shot indices and
+        the slots they hit, an obstacle can be hit by several shots.
+        """
+        slots = np.flatnonzero(field.alive[:field.size])
+        shots, hit = self.colliding_circles(
+            field.center_x[slots], field.center_y[slots], field.radius[slots], MAX_OBSTACLE_RADIUS, bounds
+        )
+        return shots, slots[hit]
+
+    def colliding_circles(self, center_x, center_y, radius, max_radius, bounds=SCREEN_BOUNDS):
+        """
+        Which shots hit which of a batch of circles, no bigger than
+        max_radius. radius can be one radius for all of them. The shots
+        are inside bounds, so circles too far outside are left out.
+
+        Every shot hits at most one circle. Returns the shot indices and
+        the indices of the circles they hit.
+        """
+        n = self.count
+        if n == 0 or len(center_x) == 0:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty
+
+        x = self.center_x[:n]
+        y = self.center_y[:n]
+        reach = max_radius + SHOT_RADIUS
+        left, bottom, right, top = bounds
+        inside = np.flatnonzero(
+            (center_x > left - reach) & (center_x < right + reach)
+            & (center_y > bottom - reach) & (center_y < top + reach)
+        )
+        shots, candidates = grid_pairs(x, y, center_x[inside], center_y[inside], reach, bounds)
+        candidates = inside[candidates]
+        dx = center_x[candidates] - x[shots]
+        dy = center_y[candidates] - y[shots]
+        reach = np.broadcast_to(radius, center_x.shape)[candidates] + SHOT_RADIUS
+        hit = dx * dx + dy * dy < reach * reach
+        shots = shots[hit]
+        candidates = candidates[hit]
+
+        # pairs come ordered by shot, keep the first circle of every shot
+        first = np.ones(len(shots), dtype=bool)
+        first[1:] = shots[1:] != shots[:-1]
+        return shots[first], candidates[first]
+
+
+def positions_at(shots, alpha, step_time):
+    """
+    Positions to draw the shots of a ProjectilePool, or a snapshot of one,
+    alpha of the way from the last step to the current one. A step moves a
+    shot by its current velocity, so its position at the last step is the
+    current one less a step of movement. The same goes for the UFOs of a
+    Flock.
+    """
+    n = shots.count
+    back = (1 - alpha) * step_time * STEP_RATE
+    return shots.center_x[:n] - shots.change_x[:n] * back, shots.center_y[:n] - shots.change_y[:n] * back
+
+
+def volley_angles(angle, shots, spread):
+    """
+    Directions of a volley of shots fanned out over spread degrees around angle
+    """
+    if shots == 1:
+        return [angle]
+    return [angle - spread / 2 + spread * i / (shots - 1) for i in range(shots)]
+
+
+def volleys_due(timer, delta_time, rate):
+    """
+    Volleys to fire this step at rate volleys per second and the timer for
+    the next step
+    """
+    timer -= delta_time
+    if timer > 0:
+        return 0, timer
+    due = math.floor(-timer * rate) + 1
+    return due, timer + due / rate
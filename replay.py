@@ -0,0 +1,274 @@
+"""
+Input recording and headless replay.
+
+A replay holds the seed and settings a GameSimulation was created with and
+the input and delta time of every step, which is all it takes to run the
+exact same game again. Replays are compact binary files:
+
+    header  magic b"DGRP", format version, seed, spawn_per_step, hit box
+            angle step, whether the player can shoot, whether there are
+            UFOs, whether the game scrolls through a world
+    step    two flag bytes with the keys, the action, fire and what follows,
+            the delta time as a double when it changed since the last step,
+            the two joystick axes as doubles when a joystick was connected,
+            the obstacle cap and refill limit of a LoadGovernor as two ints
+            when they changed
+
+so a minute of keyboard play at a steady frame rate is a few kilobytes.
+Playing a replay back needs no window and runs as fast as the machine
+allows:
+
+    python replay.py game.replay --slowest 10
+"""
+
+import argparse
+import struct
+import time
+
+from constants import HIT_BOX_ANGLE_STEP
+from simulation import GameSimulation, InputState
+from profiling import FrameProfiler, NULL_PROFILER
+
+MAGIC = b"DGRP"
+VERSION = 1
+
+# magic, version, seed, spawn_per_step (-1 for None), hit box angle step (0 for circles), shooting, ufos,
+# world
+HEADER = struct.Struct("<4sBQid???")
+FLAGS = struct.Struct("<H")
+DELTA_TIME = struct.Struct("<d")
+JOYSTICK = struct.Struct("<dd")
+# obstacle_cap, refill_per_step (-1 for None)
+LIMITS = struct.Struct("<ii")
+
+# bits of the flags of a step
+LEFT = 1
+RIGHT = 2
+UP = 4
+DOWN = 8
+ACTION = 16
+HAS_JOYSTICK = 32
+NEW_DELTA_TIME = 64
+NEW_LIMITS = 128
+FIRE = 256
+
+NO_LIMITS = (None, None)
+
+
+class ReplayError(Exception):
+    """
+    A file that is not a replay this version can read
+    """
+
+
+class ReplayRecorder:
+    """
+    Writes the steps of a game to a replay file
+    """
+
+    def __init__(self, path, seed, spawn_per_step=None, hit_box_angle_step=HIT_BOX_ANGLE_STEP, shooting=False,
+                 ufos=False, world=False):
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(
+            MAGIC, VERSION, seed, -1 if spawn_per_step is None else spawn_per_step,
+            hit_box_angle_step or 0, shooting, ufos, world,
+        ))
+        self.delta_time = None
+        self.limits = NO_LIMITS
+        self.steps = 0
+
+    @classmethod
+    def for_simulation(cls, path, simulation):
+        """
+        Recorder for a GameSimulation that has not been stepped yet
+        """
+        return cls(
+            path, simulation.seed, simulation.spawn_scheduler.per_step, simulation.hit_box_angle_step,
+            simulation.shooting, simulation.ufos_enabled, simulation.world is not None,
+        )
+
+    def record(self, delta_time, inputs, limits=NO_LIMITS):
+        """
+        Add the delta time and input of one step, and the (obstacle_cap,
+        refill_per_step) limits the simulation had for it
+        """
+        flags = (
+            LEFT * bool(inputs.left) | RIGHT * bool(inputs.right) | UP * bool(inputs.up)
+            | DOWN * bool(inputs.down) | ACTION * bool(inputs.action) | FIRE * bool(inputs.fire)
+        )
+        if inputs.joystick_x is not None:
+            flags |= HAS_JOYSTICK
+        if delta_time != self.delta_time:
+            flags |= NEW_DELTA_TIME
+            self.delta_time = delta_time
+        if limits != self.limits:
+            flags |= NEW_LIMITS
+            self.limits = limits
+
+        write = self.file.write
+        write(FLAGS.pack(flags))
+        if flags & NEW_DELTA_TIME:
+            write(DELTA_TIME.pack(delta_time))
+        if flags & HAS_JOYSTICK:
+            write(JOYSTICK.pack(inputs.joystick_x, inputs.joystick_y))
+        if flags & NEW_LIMITS:
+            write(LIMITS.pack(*(-1 if limit is None else limit for limit in limits)))
+        self.steps += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+class Replay:
+    """
+    A recorded game: its seed, spawn_per_step, hit_box_angle_step,
+    shooting, ufos and world, a list of (delta_time, InputState) steps and a dict from step index to the
+    (obstacle_cap, refill_per_step) limits set from that step on
+    """
+
+    def __init__(self, seed, spawn_per_step, steps, limits=None, hit_box_angle_step=HIT_BOX_ANGLE_STEP,
+                 shooting=False, ufos=False, world=False):
+        self.seed = seed
+        self.spawn_per_step = spawn_per_step
+        self.hit_box_angle_step = hit_box_angle_step
+        self.shooting = shooting
+        self.ufos = ufos
+        self.world = world
+        self.steps = steps
+        self.limits = {} if limits is None else limits
+
+    def __len__(self):
+        return len(self.steps)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            data = f.read()
+
+        if len(data) < HEADER.size:
+            raise ReplayError("{} is too short for a replay".format(path))
+        magic, version, seed, spawn_per_step, hit_box_angle_step, shooting, ufos, world = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ReplayError("{} is not a replay".format(path))
+        if version != VERSION:
+            raise ReplayError("{} is replay version {}, expected {}".format(path, version, VERSION))
+        hit_box_angle_step = hit_box_angle_step or None
+
+        steps = []
+        limits = {}
+        delta_time = None
+        offset = HEADER.size
+        # a recorder that was not closed cleanly can leave a cut off last step
+        try:
+            while offset < len(data):
+                flags, = FLAGS.unpack_from(data, offset)
+                offset += FLAGS.size
+                if flags & NEW_DELTA_TIME:
+                    delta_time, = DELTA_TIME.unpack_from(data, offset)
+                    offset += DELTA_TIME.size
+                joystick_x = joystick_y = None
+                if flags & HAS_JOYSTICK:
+                    joystick_x, joystick_y = JOYSTICK.unpack_from(data, offset)
+                    offset += JOYSTICK.size
+                if flags & NEW_LIMITS:
+                    cap, refill = LIMITS.unpack_from(data, offset)
+                    offset += LIMITS.size
+                    limits[len(steps)] = (None if cap < 0 else cap, None if refill < 0 else refill)
+                steps.append((delta_time, InputState(
+                    left=bool(flags & LEFT),
+                    right=bool(flags & RIGHT),
+                    up=bool(flags & UP),
+                    down=bool(flags & DOWN),
+                    action=bool(flags & ACTION),
+                    joystick_x=joystick_x,
+                    joystick_y=joystick_y,
+                    fire=bool(flags & FIRE),
+                )))
+        except struct.error:
+            pass
+
+        return cls(
+            seed, None if spawn_per_step < 0 else spawn_per_step, steps, limits, hit_box_angle_step,
+            shooting, ufos, world,
+        )
+
+    def simulation(self, profiler=NULL_PROFILER):
+        """
+        A fresh GameSimulation set up like the recorded one
+        """
+        return GameSimulation(
+            seed=self.seed, spawn_per_step=self.spawn_per_step, profiler=profiler,
+            hit_box_angle_step=self.hit_box_angle_step, shooting=self.shooting,
+            ufos=self.ufos, world=self.world,
+        )
+
+    def play(self, simulation=None, stop=None, step_times=None):
+        """
+        Step a simulation through the replay, up to step stop, and return
+        it. The duration of every step is appended to step_times if given.
+        """
+        if simulation is None:
+            simulation = self.simulation()
+        step = simulation.step
+        limits = self.limits
+        for index, (delta_time, inputs) in enumerate(self.steps[:stop]):
+            if index in limits:
+                simulation.obstacle_cap, simulation.refill_per_step = limits[index]
+            if step_times is None:
+                step(delta_time, inputs)
+            else:
+                start = time.perf_counter()
+                step(delta_time, inputs)
+                step_times.append(time.perf_counter() - start)
+        return simulation
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a replay back without a window.")
+    parser.add_argument("path")
+    parser.add_argument("--stop", type=int, help="stop after this many steps")
+    parser.add_argument("--slowest", type=int, default=0, help="list the slowest steps")
+    parser.add_argument("--profile", help="write the timings of the parts of a step to this file, without extension")
+    args = parser.parse_args()
+
+    replay = Replay.load(args.path)
+    profiler = FrameProfiler(enabled=True, size=max(len(replay), 1)) if args.profile else NULL_PROFILER
+    simulation = replay.simulation(profiler)
+    step_times = []
+
+    start = time.perf_counter()
+    replay.play(simulation, args.stop, step_times)
+    elapsed = time.perf_counter() - start
+    simulation.close()
+
+    game_time = sum(delta_time for delta_time, _ in replay.steps[:args.stop])
+    print("seed {}, {} steps, {:.1f} s of game time".format(replay.seed, len(step_times), game_time))
+    print("replayed in {:.2f} s, {:.0f} steps/s, {:.0f}x real time".format(
+        elapsed, len(step_times) / elapsed if elapsed else 0, game_time / elapsed if elapsed else 0
+    ))
+    print("mode {}, level {}, final score {}".format(simulation.mode, simulation.current_level, simulation.final_score))
+    if simulation.player is not None:
+        print("lives {}, score {}".format(simulation.player.player_lives, int(simulation.player.score) * 10))
+    print("timers: {timers} pending, {fired} fired, {cancelled} cancelled".format(**simulation.timers.stats()))
+
+    if args.slowest:
+        print("slowest steps:")
+        slowest = sorted(range(len(step_times)), key=step_times.__getitem__, reverse=True)[:args.slowest]
+        for index in slowest:
+            print("  step {:>8}  {:8.3f} ms".format(index, step_times[index] * 1000))
+
+    if args.profile:
+        profiler.to_csv(args.profile + ".csv")
+        profiler.to_json(args.profile + ".json")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,663 @@
+"""
+Binary save states of a whole GameSimulation.
+
+save() packs everything a game needs to go on exactly where it left off
+into one compact buffer: a header of scalars (the mode, level, score,
+pending timers and the state of every random number stream) followed by
+the packed arrays of the obstacles, shots, UFOs, particles and power ups,
+each at an offset aligned for its type. Copying the arrays is most of the
+work, so a field of 10k obstacles is saved in well under a millisecond.
+
+SaveState reads a buffer back without copying anything: its arrays are
+NumPy views straight into the buffer, which may be a memory mapped file.
+restore() copies them into the arrays a simulation already has. Arrays
+are stored by name, so a save state only has to be restored into a
+simulation of the same version of the game, not of the same capacities.
+
+RewindBuffer keeps save states of the last few seconds of a game in a
+ring of reused buffers, to rewind to, and the one of the start of the
+game, to restart it right away.
+"""
+
+import math
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from constants import (
+    SCREEN_BOUNDS, IN_START_SCREEN, IN_GAME, DEATH_SCREEN, REWIND_INTERVAL, REWIND_STATES,
+)
+from obstacle_field import FrozenObstacles, SpawnTable
+from simulation import GameSimulation, PlayerState, PowerUpState, Difficulty, LIFE_UP, SCORE_UP
+from world import ChunkedWorld
+
+MAGIC = b"MDSV"
+VERSION = 1
+
+# magic, version, size of the scalars, number of arrays
+HEADER = struct.Struct("<4sHxxII")
+# name, dtype, rows, columns (0 for one dimensional arrays)
+ENTRY = struct.Struct("<40s8sqq")
+# every array starts at a multiple of this
+ALIGNMENT = 8
+
+MODES = (IN_START_SCREEN, IN_GAME, DEATH_SCREEN)
+POWER_UP_KINDS = (LIFE_UP, SCORE_UP)
+
+# None is stored as -1 in integers and as NaN in floats
+_SCALAR_FIELDS = (
+    ("seed", "Q"), ("tick", "q"), ("mode", "B"),
+    ("current_level", "q"), ("number_of_obstacles", "q"), ("obstacle_speed", "d"),
+    ("final_score", "q"), ("final_level", "q"),
+    ("damage_events", "q"), ("power_ups_picked", "q"), ("obstacles_shot", "q"), ("ufos_shot", "q"),
+    ("dashes", "q"),
+    ("volley_timer", "d"), ("shooting", "?"), ("ufos_enabled", "?"), ("effects", "?"), ("swept_collisions", "?"),
+    ("obstacle_cap", "q"), ("refill_per_step", "q"), ("hit_box_angle_step", "d"),
+    ("difficulty_obstacle_speed", "d"), ("difficulty_level_time", "d"), ("difficulty_obstacle_harmless_time", "d"),
+    ("difficulty_start_number_of_obstacles", "q"), ("difficulty_obstacle_growth", "d"),
+    ("timers_now", "q"), ("timers_step_time", "d"), ("timers_fired", "q"), ("timers_cancelled", "q"),
+    ("level_up_due", "q"), ("power_up_due", "q"),
+    ("rng_gauss", "d"), ("power_up_rng_gauss", "d"),
+    ("has_player", "?"),
+    ("player_center_x", "d"), ("player_center_y", "d"), ("player_change_x", "d"), ("player_change_y", "d"),
+    ("player_angle", "d"), ("player_wanted_angle", "d"), ("player_alpha", "d"), ("player_score", "d"),
+    ("player_lives", "q"), ("player_is_dashing", "?"),
+    ("player_damage_due", "q"), ("player_dash_due", "q"), ("player_dash_cooldown_due", "q"),
+    ("co_op", "?"), ("wingman_volley_timer", "d"), ("has_wingman", "?"),
+    ("wingman_center_x", "d"), ("wingman_center_y", "d"), ("wingman_change_x", "d"), ("wingman_change_y", "d"),
+    ("wingman_angle", "d"), ("wingman_wanted_angle", "d"), ("wingman_alpha", "d"), ("wingman_score", "d"),
+    ("wingman_lives", "q"), ("wingman_is_dashing", "?"),
+    ("wingman_damage_due", "q"), ("wingman_dash_due", "q"), ("wingman_dash_cooldown_due", "q"),
+    ("obstacles_size", "q"), ("obstacles_count", "q"), ("obstacles_slots_reused", "q"),
+    ("obstacles_slots_added", "q"), ("obstacles_harmless_time", "d"),
+    ("obstacles_left", "d"), ("obstacles_bottom", "d"), ("obstacles_right", "d"), ("obstacles_top", "d"),
+    ("shots_count", "q"), ("shots_fired", "q"), ("shots_dropped", "q"),
+    ("ufos_count", "q"), ("ufos_neighbor_pairs", "q"),
+    ("particles_count", "q"), ("particles_budget", "q"), ("particles_emitted", "q"), ("particles_dropped", "q"),
+    ("level_generator_hits", "q"), ("level_generator_misses", "q"),
+    ("level_table_spawn_on_edge", "b"), ("scheduled_spawn_on_edge", "b"),
+    ("scheduler_cursor", "q"), ("scheduler_stop", "q"),
+    ("has_world", "?"), ("world_seed", "Q"), ("world_width", "q"), ("world_height", "q"),
+    ("world_chunk_size", "q"), ("world_margin", "q"), ("world_frozen_chunks", "q"),
+    ("world_level", "q"), ("world_density", "q"),
+    ("world_camera_x", "d"), ("world_camera_y", "d"), ("world_time", "d"),
+    ("world_first_column", "q"), ("world_first_row", "q"), ("world_last_column", "q"), ("world_last_row", "q"),
+    ("world_generated", "q"), ("world_thawed", "q"),
+)
+SCALARS = struct.Struct("<" + "".join(code for _, code in _SCALAR_FIELDS))
+SCALAR_NAMES = tuple(name for name, _ in _SCALAR_FIELDS)
+
+_SPAWN_TABLE_FIELDS = tuple(name for name in SpawnTable.__slots__ if name != "spawn_on_edge")
+# PCG64 states are 128 bit numbers, stored as two 64 bit halves
+_MASK64 = (1 << 64) - 1
+
+
+def _aligned(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _or_none(value, none):
+    return none if value is None else value
+
+
+def _int_or_none(value):
+    return None if value < 0 else int(value)
+
+
+def _due(timer):
+    """
+    Step a timer is due in, -1 if there is none pending
+    """
+    if timer is None or not timer.pending:
+        return -1
+    return timer.due
+
+
+def _pool_arrays(pool):
+    """
+    The arrays of a pool or field holding one value per slot, by name
+    """
+    return {
+        name: values for name, values in vars(pool).items()
+        if isinstance(values, np.ndarray) and len(values) == pool.capacity
+    }
+
+
+def _generator_state(generator):
+    state = generator.bit_generator.state
+    inner = state["state"]
+    return [
+        inner["state"] & _MASK64, inner["state"] >> 64, inner["inc"] & _MASK64, inner["inc"] >> 64,
+        state["has_uint32"], state["uinteger"],
+    ]
+
+
+def _set_generator_state(generator, values):
+    values = [int(value) for value in values]
+    generator.bit_generator.state = {
+        "bit_generator": "PCG64",
+        "state": {"state": values[0] | values[1] << 64, "inc": values[2] | values[3] << 64},
+        "has_uint32": values[4],
+        "uinteger": values[5],
+    }
+
+
+def _random_states(simulation):
+    return simulation.rng, simulation.power_up_rng
+
+
+def _generators(simulation):
+    return (
+        simulation.obstacles.rng, simulation.level_generator.rng, simulation.ufos.rng, simulation.particles.rng,
+    )
+
+
+def _ship_scalars(scalars, prefix, ship):
+    """
+    Put the scalars of the PlayerState ship in scalars, named after prefix
+    """
+    for name in ("center_x", "center_y", "change_x", "change_y", "angle", "wanted_angle", "alpha", "score"):
+        scalars[prefix + name] = getattr(ship, name)
+    scalars[prefix + "lives"] = ship.player_lives
+    scalars[prefix + "is_dashing"] = ship.is_dashing
+    scalars[prefix + "damage_due"] = _due(ship.damage_timer)
+    scalars[prefix + "dash_due"] = _due(ship.dash_timer)
+    scalars[prefix + "dash_cooldown_due"] = _due(ship.dash_cooldown_timer)
+
+
+def _collect(simulation):
+    """
+    The scalars and named arrays of a save state of simulation
+    """
+    player = simulation.player
+    wingman = simulation.wingman
+    field = simulation.obstacles
+    shots = simulation.shots
+    ufos = simulation.ufos
+    particles = simulation.particles
+    timers = simulation.timers
+    difficulty = simulation.difficulty
+    level_table = simulation.level_generator.peek()
+    scheduler = simulation.spawn_scheduler
+    world = simulation.world
+    rng_state = simulation.rng.getstate()
+    power_up_rng_state = simulation.power_up_rng.getstate()
+
+    scalars = {
+        "seed": simulation.seed,
+        "tick": simulation.tick,
+        "mode": MODES.index(simulation.mode),
+        "current_level": simulation.current_level,
+        "number_of_obstacles": simulation.number_of_obstacles,
+        "obstacle_speed": simulation.obstacle_speed,
+        "final_score": _or_none(simulation.final_score, -1),
+        "final_level": _or_none(simulation.final_level, -1),
+        "damage_events": simulation.damage_events,
+        "power_ups_picked": simulation.power_ups_picked,
+        "obstacles_shot": simulation.obstacles_shot,
+        "ufos_shot": simulation.ufos_shot,
+        "dashes": simulation.dashes,
+        "volley_timer": simulation.volley_timer,
+        "wingman_volley_timer": simulation.wingman_volley_timer,
+        "co_op": simulation.co_op,
+        "shooting": simulation.shooting,
+        "ufos_enabled": simulation.ufos_enabled,
+        "effects": simulation.effects,
+        "swept_collisions": simulation.swept_collisions,
+        "obstacle_cap": _or_none(simulation.obstacle_cap, -1),
+        "refill_per_step": _or_none(simulation.refill_per_step, -1),
+        "hit_box_angle_step": _or_none(simulation.hit_box_angle_step, math.nan),
+        "difficulty_obstacle_speed": difficulty.obstacle_speed,
+        "difficulty_level_time": difficulty.level_time,
+        "difficulty_obstacle_harmless_time": difficulty.obstacle_harmless_time,
+        "difficulty_start_number_of_obstacles": difficulty.start_number_of_obstacles,
+        "difficulty_obstacle_growth": difficulty.obstacle_growth,
+        "timers_now": timers.now,
+        "timers_step_time": timers.step_time,
+        "timers_fired": timers.fired,
+        "timers_cancelled": timers.cancelled,
+        "level_up_due": _due(simulation.level_up_timer),
+        "power_up_due": _due(simulation.power_up_timer),
+        "rng_gauss": _or_none(rng_state[2], math.nan),
+        "power_up_rng_gauss": _or_none(power_up_rng_state[2], math.nan),
+        "has_player": player is not None,
+        "has_wingman": wingman is not None,
+        "obstacles_size": field.size,
+        "obstacles_count": field.count,
+        "obstacles_slots_reused": field.slots_reused,
+        "obstacles_slots_added": field.slots_added,
+        "obstacles_harmless_time": field.harmless_time,
+        "shots_count": shots.count,
+        "shots_fired": shots.fired,
+        "shots_dropped": shots.dropped,
+        "ufos_count": ufos.count,
+        "ufos_neighbor_pairs": ufos.neighbor_pairs,
+        "particles_count": particles.count,
+        "particles_budget": particles.budget,
+        "particles_emitted": particles.emitted,
+        "particles_dropped": particles.dropped,
+        "level_generator_hits": simulation.level_generator.hits,
+        "level_generator_misses": simulation.level_generator.misses,
+        "level_table_spawn_on_edge": -1 if level_table is None else level_table.spawn_on_edge,
+        "scheduled_spawn_on_edge": -1 if scheduler.table is None else scheduler.table.spawn_on_edge,
+        "scheduler_cursor": scheduler.cursor,
+        "scheduler_stop": scheduler.stop,
+        "has_world": world is not None,
+    }
+    (scalars["obstacles_left"], scalars["obstacles_bottom"],
+     scalars["obstacles_right"], scalars["obstacles_top"]) = field.bounds
+    if player is not None:
+        _ship_scalars(scalars, "player_", player)
+    if wingman is not None:
+        _ship_scalars(scalars, "wingman_", wingman)
+    if world is not None:
+        for name in ("seed", "width", "height", "chunk_size", "margin", "frozen_chunks", "level", "density",
+                     "time", "generated", "thawed"):
+            scalars["world_" + name] = getattr(world, name)
+        scalars["world_camera_x"], scalars["world_camera_y"] = world.camera
+        active = (-1, -1, -1, -1) if world.active is None else world.active
+        (scalars["world_first_column"], scalars["world_first_row"],
+         scalars["world_last_column"], scalars["world_last_row"]) = active
+
+    arrays = [
+        ("random_states", np.array([rng_state[1], power_up_rng_state[1]], dtype=np.uint32)),
+        ("generator_states", np.array(
+            [_generator_state(generator) for generator in _generators(simulation)], dtype=np.uint64
+        )),
+    ]
+    for prefix, pool, count in (
+        ("obstacles", field, field.size), ("shots", shots, shots.count),
+        ("ufos", ufos, ufos.count), ("particles", particles, particles.count),
+    ):
+        for name, values in _pool_arrays(pool).items():
+            arrays.append((prefix + "." + name, values[:count]))
+
+    # the batches of obstacles still harmless, by the step they turn harmful in
+    batches = [timer for timer in field.harmless_timers.values() if timer.pending]
+    arrays.append(("harmless.batches", np.array(
+        [(timer.due, len(timer.args[0])) for timer in batches], dtype=np.int64
+    ).reshape(-1, 2)))
+    arrays.append(("harmless.slots", np.concatenate(
+        [timer.args[0] for timer in batches] or [np.zeros(0, dtype=np.int64)]
+    ).astype(np.int64)))
+    arrays.append(("harmless.generations", np.concatenate(
+        [timer.args[1] for timer in batches] or [np.zeros(0, dtype=np.int64)]
+    ).astype(np.int64)))
+
+    power_ups = [power_up for power_up in simulation.power_ups if power_up.alive]
+    arrays.append(("power_ups", np.array([
+        (power_up.center_x, power_up.center_y, POWER_UP_KINDS.index(power_up.kind), power_up.despawn_timer.due)
+        for power_up in power_ups
+    ], dtype=float).reshape(-1, 4)))
+
+    for prefix, table in (("level_table", level_table), ("scheduled", scheduler.table)):
+        if table is not None:
+            for name in _SPAWN_TABLE_FIELDS:
+                arrays.append((prefix + "." + name, getattr(table, name)))
+
+    if world is not None:
+        frozen = list(world.frozen.items())
+        arrays.append(("frozen.chunks", np.array(
+            [(column, row, len(obstacles)) for (column, row), (obstacles, _) in frozen], dtype=np.int64
+        ).reshape(-1, 3)))
+        arrays.append(("frozen.times", np.array([frozen_at for _, (_, frozen_at) in frozen], dtype=float)))
+        for name in FrozenObstacles.__slots__:
+            dtype = getattr(field, name).dtype
+            arrays.append(("frozen." + name, np.concatenate(
+                [getattr(obstacles, name) for _, (obstacles, _) in frozen] or [np.zeros(0, dtype=dtype)]
+            ).astype(dtype, copy=False)))
+
+    return scalars, arrays
+
+
+def save(simulation, buffer=None):
+    """
+    Pack the state of simulation between two steps into buffer, a
+    bytearray that is reused if it is big enough. Returns a memoryview of
+    the packed bytes, whose obj is the bytearray they are in.
+    """
+    scalars, arrays = _collect(simulation)
+
+    entries = HEADER.size + SCALARS.size
+    offset = _aligned(entries + ENTRY.size * len(arrays))
+    layout = []
+    for name, values in arrays:
+        values = np.ascontiguousarray(values)
+        layout.append((name, values, offset))
+        offset = _aligned(offset + values.nbytes)
+    total = offset
+
+    if buffer is None or len(buffer) < total:
+        buffer = bytearray(total)
+    HEADER.pack_into(buffer, 0, MAGIC, VERSION, SCALARS.size, len(arrays))
+    SCALARS.pack_into(buffer, HEADER.size, *(scalars.get(name, 0) for name in SCALAR_NAMES))
+    for index, (name, values, offset) in enumerate(layout):
+        columns = values.shape[1] if values.ndim == 2 else 0
+        ENTRY.pack_into(
+            buffer, entries + index * ENTRY.size, name.encode(), values.dtype.str.encode(), len(values), columns
+        )
+        if values.size:
+            np.frombuffer(buffer, values.dtype, values.size, offset)[:] = values.ravel()
+    return memoryview(buffer)[:total]
+
+
+def write(path, simulation):
+    """
+    Save the state of simulation to a file. The file is replaced in one
+    go, so a save state mapped from it before stays readable.
+    """
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as f:
+        f.write(save(simulation))
+    os.replace(temporary, path)
+
+
+def read(path):
+    """
+    The SaveState in a file, mapped into memory rather than read
+    """
+    with open(path, "rb") as f:
+        return SaveState(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class SaveState:
+    """
+    A save state read from a buffer, its arrays views into the buffer
+    """
+
+    def __init__(self, data):
+        """
+        data is anything with the buffer protocol: bytes, a bytearray, a
+        memoryview or an mmap. It must not change while this is in use.
+        """
+        magic, version, scalars_size, count = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("not a save state")
+        if version != VERSION:
+            raise ValueError("unsupported save state version {}".format(version))
+        self.data = data
+        self.version = version
+        self.scalars = dict(zip(SCALAR_NAMES, SCALARS.unpack_from(data, HEADER.size)))
+
+        entries = HEADER.size + scalars_size
+        offset = _aligned(entries + ENTRY.size * count)
+        self.arrays = {}
+        for index in range(count):
+            name, dtype, rows, columns = ENTRY.unpack_from(data, entries + index * ENTRY.size)
+            dtype = np.dtype(dtype.rstrip(b"\0").decode())
+            values = np.frombuffer(data, dtype, rows * max(columns, 1), offset)
+            if columns:
+                values = values.reshape(rows, columns)
+            self.arrays[name.rstrip(b"\0").decode()] = values
+            offset = _aligned(offset + values.nbytes)
+
+    def difficulty(self):
+        scalars = self.scalars
+        return Difficulty(
+            obstacle_speed=scalars["difficulty_obstacle_speed"],
+            level_time=scalars["difficulty_level_time"],
+            obstacle_harmless_time=scalars["difficulty_obstacle_harmless_time"],
+            start_number_of_obstacles=scalars["difficulty_start_number_of_obstacles"],
+            obstacle_growth=scalars["difficulty_obstacle_growth"],
+        )
+
+    def simulation(self, **kwargs):
+        """
+        A new GameSimulation in this state. kwargs go to GameSimulation.
+        """
+        scalars = self.scalars
+        hit_box_angle_step = scalars["hit_box_angle_step"]
+        simulation = GameSimulation(
+            seed=scalars["seed"], difficulty=self.difficulty(),
+            hit_box_angle_step=None if math.isnan(hit_box_angle_step) else hit_box_angle_step,
+            shooting=scalars["shooting"], ufos=scalars["ufos_enabled"], effects=scalars["effects"],
+            world=scalars["has_world"], co_op=bool(scalars["co_op"]), **kwargs
+        )
+        self.restore(simulation)
+        return simulation
+
+    def _restore_pool(self, prefix, pool, count):
+        if count > pool.capacity:
+            raise ValueError("{} {} do not fit in a capacity of {}".format(count, prefix, pool.capacity))
+        for name, values in _pool_arrays(pool).items():
+            saved = self.arrays.get(prefix + "." + name)
+            if saved is not None:
+                values[:count] = saved
+
+    def _spawn_table(self, prefix, spawn_on_edge):
+        if spawn_on_edge < 0:
+            return None
+        table = SpawnTable()
+        table.spawn_on_edge = bool(spawn_on_edge)
+        for name in _SPAWN_TABLE_FIELDS:
+            setattr(table, name, self.arrays[prefix + "." + name].copy())
+        return table
+
+    def restore(self, simulation):
+        """
+        Put simulation in this state. Its hit boxes and difficulty are
+        kept, everything else is replaced.
+        """
+        scalars = self.scalars
+        arrays = self.arrays
+        timers = simulation.timers
+        # every pending timer belongs to the state being replaced
+        timers.clear()
+        timers.now = scalars["timers_now"]
+        timers.step_time = scalars["timers_step_time"]
+
+        simulation.seed = scalars["seed"]
+        simulation.tick = scalars["tick"]
+        simulation.mode = MODES[scalars["mode"]]
+        for name in ("current_level", "number_of_obstacles", "obstacle_speed", "damage_events",
+                     "power_ups_picked", "obstacles_shot", "ufos_shot", "volley_timer", "shooting",
+                     "ufos_enabled", "effects", "swept_collisions"):
+            setattr(simulation, name, scalars[name])
+        simulation.dashes = scalars["dashes"]
+        simulation.co_op = bool(scalars["co_op"])
+        simulation.wingman_volley_timer = scalars["wingman_volley_timer"]
+        simulation.final_score = _int_or_none(scalars["final_score"])
+        simulation.final_level = _int_or_none(scalars["final_level"])
+        simulation.obstacle_cap = _int_or_none(scalars["obstacle_cap"])
+        simulation.refill_per_step = _int_or_none(scalars["refill_per_step"])
+
+        random_states = arrays["random_states"].tolist()
+        for rng, state, gauss in zip(
+            _random_states(simulation), random_states, (scalars["rng_gauss"], scalars["power_up_rng_gauss"])
+        ):
+            rng.setstate((3, tuple(state), None if math.isnan(gauss) else gauss))
+        for generator, state in zip(_generators(simulation), arrays["generator_states"]):
+            _set_generator_state(generator, state)
+
+        world = None
+        if scalars["has_world"]:
+            world = simulation.world
+            shape = tuple(
+                scalars["world_" + name] for name in ("width", "height", "chunk_size", "margin", "frozen_chunks")
+            )
+            if world is None or (world.width, world.height, world.chunk_size, world.margin,
+                                 world.frozen_chunks) != shape:
+                world = ChunkedWorld(scalars["world_seed"], *shape)
+            self._restore_world(world)
+        simulation.world = world
+
+        field = simulation.obstacles
+        size = scalars["obstacles_size"]
+        field.clear()
+        if size > field.capacity:
+            field._grow(size)
+        self._restore_pool("obstacles", field, size)
+        field.alive[size:] = False
+        field.size = size
+        field.count = scalars["obstacles_count"]
+        field.slots_reused = scalars["obstacles_slots_reused"]
+        field.slots_added = scalars["obstacles_slots_added"]
+        field.harmless_time = scalars["obstacles_harmless_time"]
+        field.bounds = (
+            scalars["obstacles_left"], scalars["obstacles_bottom"], scalars["obstacles_right"], scalars["obstacles_top"],
+        )
+        if field.spatial_hash is not None:
+            slots = np.flatnonzero(field.alive[:size])
+            field.spatial_hash.insert(slots, field.center_x[slots], field.center_y[slots])
+        start = 0
+        slots = arrays["harmless.slots"]
+        generations = arrays["harmless.generations"]
+        for due, count in arrays["harmless.batches"].tolist():
+            field.schedule_harmful(slots[start:start + count].copy(), due, generations[start:start + count].copy())
+            start += count
+
+        for prefix, pool in (("shots", simulation.shots), ("ufos", simulation.ufos),
+                             ("particles", simulation.particles)):
+            count = scalars[prefix + "_count"]
+            self._restore_pool(prefix, pool, count)
+            pool.count = count
+        simulation.shots.fired = scalars["shots_fired"]
+        simulation.shots.dropped = scalars["shots_dropped"]
+        simulation.ufos.neighbor_pairs = scalars["ufos_neighbor_pairs"]
+        for name in ("budget", "emitted", "dropped"):
+            setattr(simulation.particles, name, scalars["particles_" + name])
+
+        level_generator = simulation.level_generator
+        level_generator.put(self._spawn_table("level_table", scalars["level_table_spawn_on_edge"]))
+        level_generator.hits = scalars["level_generator_hits"]
+        level_generator.misses = scalars["level_generator_misses"]
+        scheduler = simulation.spawn_scheduler
+        scheduler.table = self._spawn_table("scheduled", scalars["scheduled_spawn_on_edge"])
+        scheduler.cursor = scalars["scheduler_cursor"]
+        scheduler.stop = scalars["scheduler_stop"]
+
+        bounds = SCREEN_BOUNDS if world is None else world.bounds
+        simulation.power_ups = [
+            PowerUpState(None, timers, bounds, saved=(x, y, POWER_UP_KINDS[int(kind)], int(due)))
+            for x, y, kind, due in arrays["power_ups"].tolist()
+        ]
+
+        simulation.player = self._ship("player_", timers, bounds) if scalars["has_player"] else None
+        simulation.wingman = self._ship("wingman_", timers, bounds) if scalars["has_wingman"] else None
+
+        simulation.level_up_timer = None
+        simulation.power_up_timer = None
+        simulation.resume_timers(_int_or_none(scalars["level_up_due"]), _int_or_none(scalars["power_up_due"]))
+        timers.fired = scalars["timers_fired"]
+        timers.cancelled = scalars["timers_cancelled"]
+
+    def _ship(self, prefix, timers, bounds):
+        """
+        The PlayerState saved in the scalars named after prefix
+        """
+        scalars = self.scalars
+        ship = PlayerState(timers, scalars[prefix + "center_x"], scalars[prefix + "center_y"], bounds)
+        for name in ("change_x", "change_y", "angle", "wanted_angle", "alpha", "score"):
+            setattr(ship, name, scalars[prefix + name])
+        ship.player_lives = scalars[prefix + "lives"]
+        ship.is_dashing = scalars[prefix + "is_dashing"]
+        ship.resume_timers(
+            _int_or_none(scalars[prefix + "damage_due"]), _int_or_none(scalars[prefix + "dash_due"]),
+            _int_or_none(scalars[prefix + "dash_cooldown_due"]),
+        )
+        return ship
+
+    def _restore_world(self, world):
+        scalars = self.scalars
+        arrays = self.arrays
+        for name in ("seed", "level", "density", "time", "generated", "thawed"):
+            setattr(world, name, scalars["world_" + name])
+        world.camera = (scalars["world_camera_x"], scalars["world_camera_y"])
+        active = (
+            scalars["world_first_column"], scalars["world_first_row"],
+            scalars["world_last_column"], scalars["world_last_row"],
+        )
+        world.active = None if active[0] < 0 else active
+
+        world.frozen.clear()
+        start = 0
+        for (column, row, count), frozen_at in zip(arrays["frozen.chunks"].tolist(), arrays["frozen.times"].tolist()):
+            obstacles = FrozenObstacles()
+            for name in FrozenObstacles.__slots__:
+                setattr(obstacles, name, arrays["frozen." + name][start:start + count].copy())
+            world.frozen[column, row] = (obstacles, frozen_at)
+            start += count
+
+
+class RewindBuffer:
+    """
+    Save states of the last steps of a game, to rewind to, and of the
+    start of the game, to restart it
+    """
+
+    def __init__(self, capacity=REWIND_STATES, interval=REWIND_INTERVAL):
+        """
+        A save state is kept every interval steps, the last capacity of
+        them, so rewinding reaches capacity * interval steps back
+        """
+        self.interval = interval
+        self.buffers = [None] * capacity
+        # length of the save state in every buffer and the step it was saved at
+        self.lengths = [0] * capacity
+        self.ticks = [None] * capacity
+        self.index = 0
+        self.start = None
+        self.start_length = 0
+        self.last_mode = None
+
+    def __len__(self):
+        return sum(tick is not None for tick in self.ticks)
+
+    def record(self, simulation):
+        """
+        Keep the state of simulation if it is time to, call after every step
+        """
+        if simulation.mode == IN_GAME and self.last_mode != IN_GAME:
+            # a game started, keep its first step to restart from
+            view = save(simulation, self.start)
+            self.start = view.obj
+            self.start_length = len(view)
+        self.last_mode = simulation.mode
+
+        if simulation.tick % self.interval:
+            return
+        index = self.index
+        view = save(simulation, self.buffers[index])
+        self.buffers[index] = view.obj
+        self.lengths[index] = len(view)
+        self.ticks[index] = simulation.tick
+        self.index = (index + 1) % len(self.buffers)
+
+    def rewind(self, simulation, steps):
+        """
+        Go back to the newest save state at least steps before now,
+        forgetting the ones after it. Returns the steps actually gone
+        back, 0 if there is nothing that old.
+        """
+        target = simulation.tick - steps
+        capacity = len(self.buffers)
+        for back in range(1, capacity + 1):
+            index = (self.index - back) % capacity
+            tick = self.ticks[index]
+            if tick is None:
+                return 0
+            if tick <= target:
+                now = simulation.tick
+                SaveState(memoryview(self.buffers[index])[:self.lengths[index]]).restore(simulation)
+                self.last_mode = simulation.mode
+                # the next save state goes right after this one
+                self.index = (index + 1) % capacity
+                for newer in range(back - 1):
+                    self.ticks[(index + 1 + newer) % capacity] = None
+                return now - tick
+        return 0
+
+    def restart(self, simulation):
+        """
+        Go back to the start of the current game, True if there was one
+        """
+        if self.start is None:
+            return False
+        SaveState(memoryview(self.start)[:self.start_length]).restore(simulation)
+        self.last_mode = simulation.mode
+        # the ring starts over with the game
+        self.ticks = [None] * len(self.buffers)
+        self.index = 0
+        return True
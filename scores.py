@@ -0,0 +1,343 @@
+"""
+High scores and what happened in every game played.
+
+ScoreStore keeps a row for every game in an SQLite database in WAL mode.
+Recording a game only puts its row on a queue, a writer thread of the
+store takes the rows from there and writes them in batches, a transaction
+per batch, so the game loop never waits on the disk. Reading the
+leaderboard goes through an index on the score, so the top ten take the
+same time with a thousand games recorded as with millions.
+
+The rank of a score counts the games ahead of it, so it costs more the
+further down the score is, tens of milliseconds far down a million games. The
+game asks for it with request_rank(), answered by the writer thread like
+request_top(), and never waits on it.
+
+Session collects the row of one game while it is played: how far it got,
+what happened in it and how long its frames took. It reads the game from a
+GameSimulation or a Snapshot of one, so a game on the simulation thread
+is recorded from the same snapshots the window draws. Print the
+leaderboard with
+
+    python scores.py
+    python scores.py scores.db --top 20
+"""
+
+import argparse
+import array
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from constants import SCORES_PATH, SCORES_BATCH_SIZE, SCORES_FLUSH_INTERVAL, LEADERBOARD_SIZE
+
+# bumped, with a way to migrate, whenever the table changes
+SCHEMA_VERSION = 1
+
+# columns of a game, in the order of the rows recorded
+COLUMNS = (
+    ("started_at", "REAL"), ("duration", "REAL"), ("seed", "INTEGER"),
+    ("score", "INTEGER"), ("level", "INTEGER"), ("steps", "INTEGER"),
+    ("damage_events", "INTEGER"), ("dashes", "INTEGER"), ("power_ups", "INTEGER"),
+    ("obstacles_shot", "INTEGER"), ("ufos_shot", "INTEGER"),
+    ("frames", "INTEGER"), ("frame_mean_ms", "REAL"), ("frame_p50_ms", "REAL"), ("frame_p99_ms", "REAL"),
+    ("frame_max_ms", "REAL"),
+    ("shooting", "INTEGER"), ("ufos", "INTEGER"), ("world", "INTEGER"),
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS sessions (id INTEGER PRIMARY KEY, {})".format(
+        ", ".join("{} {} NOT NULL".format(name, kind) for name, kind in COLUMNS)
+    ),
+    # the leaderboard walks this from the top, ties go to the earlier game
+    "CREATE INDEX IF NOT EXISTS sessions_by_score ON sessions (score DESC, id)",
+)
+INSERT = "INSERT INTO sessions ({}) VALUES ({})".format(
+    ", ".join(COLUMN_NAMES), ", ".join("?" * len(COLUMN_NAMES))
+)
+TOP = "SELECT id, {} FROM sessions ORDER BY score DESC, id LIMIT ?".format(", ".join(COLUMN_NAMES))
+# counts the games ahead through the score index, one index entry each
+RANK = "SELECT count(*) FROM sessions WHERE score > ?"
+
+# counters of a GameSimulation that count what happened in all its games,
+# a session records how much they grew while it was played
+COUNTERS = ("damage_events", "dashes", "power_ups_picked", "obstacles_shot", "ufos_shot")
+
+# seconds to wait for a database another process is writing
+BUSY_TIMEOUT = 5.0
+
+# asks the writer thread to stop once everything before it is written,
+# anything else on its queue that is not a row is called with its connection
+_STOP = object()
+
+
+class ScoreRow(tuple):
+    """
+    A recorded game, its columns by name
+    """
+
+    __slots__ = ()
+
+    def __getattr__(self, name):
+        try:
+            return self[_ROW_INDEX[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+_ROW_INDEX = {name: index for index, name in enumerate(("id",) + COLUMN_NAMES)}
+
+
+def _rank(connection, score):
+    (higher,) = connection.execute(RANK, (score,)).fetchone()
+    return higher + 1
+
+
+def connect(path):
+    """
+    A connection to the database at path in WAL mode, with the table in it
+    """
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # in WAL mode a crash can lose the last transactions but never corrupt
+    # the database, and commits do not wait for the disk
+    connection.execute("PRAGMA synchronous=NORMAL")
+    with connection:
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version > SCHEMA_VERSION:
+            connection.close()
+            raise ValueError("scores database version {} is newer than this game".format(version))
+        for statement in SCHEMA:
+            connection.execute(statement)
+        connection.execute("PRAGMA user_version = {}".format(SCHEMA_VERSION))
+    return connection
+
+
+class Session:
+    """
+    The row of one game, collected while it is played
+    """
+
+    def __init__(self, game):
+        """
+        Starts counting from where game, a GameSimulation or a Snapshot of
+        one, is now
+        """
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.seed = game.seed
+        self.tick = game.tick
+        self.counters = [getattr(game, name) for name in COUNTERS]
+        self.frame_times = array.array("d")
+
+    def frame(self, delta_time):
+        """
+        Count a frame that took delta_time seconds
+        """
+        self.frame_times.append(delta_time)
+
+    def finish(self, game, score=None, level=None):
+        """
+        The row of the game just finished, with its final score and level
+        unless given
+        """
+        if score is None:
+            score = game.final_score
+        if level is None:
+            level = game.final_level
+        # rewinding can take the counters back to before the session
+        counters = [max(getattr(game, name) - start, 0) for name, start in zip(COUNTERS, self.counters)]
+
+        frame_times = np.frombuffer(self.frame_times, dtype=np.float64) * 1000
+        if len(frame_times):
+            p50, p99 = np.percentile(frame_times, (50, 99))
+            frame_summary = [float(frame_times.mean()), float(p50), float(p99), float(frame_times.max())]
+        else:
+            frame_summary = [0.0] * 4
+
+        return (
+            self.started_at, time.perf_counter() - self._start, self.seed,
+            int(score or 0), int(level or 0), max(game.tick - self.tick, 0),
+            *counters,
+            len(frame_times), *frame_summary,
+            int(game.shooting), int(game.ufos_enabled), int(game.world_size is not None),
+        )
+
+
+class ScoreStore:
+    """
+    Games recorded to an SQLite database by a writer thread
+    """
+
+    def __init__(self, path=SCORES_PATH, batch_size=SCORES_BATCH_SIZE, flush_interval=SCORES_FLUSH_INTERVAL):
+        """
+        Rows are written once batch_size of them wait, or once the first
+        one waited flush_interval seconds.
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        # the table is made here, so it is there for reading right away
+        self._reader = connect(path)
+        self._read_lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+
+        # rows written, and rows lost to errors with the last error
+        self.written = 0
+        self.failed = 0
+        self.error = None
+
+        self._thread = threading.Thread(target=self._run, name="score-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, row):
+        """
+        Write row, a Session.finish() result, without waiting for it
+        """
+        self._queue.put(row)
+
+    def flush(self):
+        """
+        Wait until everything recorded so far is written
+        """
+        future = Future()
+        self._queue.put(lambda connection: future.set_result(None))
+        future.result()
+
+    def _request(self, read):
+        """
+        A Future of read(connection), called by the writer thread once
+        everything recorded so far is written
+        """
+        future = Future()
+
+        def call(connection):
+            try:
+                future.set_result(read(connection))
+            except Exception as error:
+                future.set_exception(error)
+
+        self._queue.put(call)
+        return future
+
+    def request_top(self, n=LEADERBOARD_SIZE):
+        """
+        A Future of top(n), read by the writer thread once everything
+        recorded so far is written, for code that must not wait on the disk
+        """
+        return self._request(lambda connection: [ScoreRow(row) for row in connection.execute(TOP, (n,))])
+
+    def request_rank(self, score):
+        """
+        A Future of rank(score), read by the writer thread like
+        request_top()
+        """
+        return self._request(lambda connection: _rank(connection, score))
+
+    def top(self, n=LEADERBOARD_SIZE):
+        """
+        The n best games as ScoreRows, best first
+        """
+        with self._read_lock:
+            return [ScoreRow(row) for row in self._reader.execute(TOP, (n,))]
+
+    def rank(self, score):
+        """
+        Place on the leaderboard of a game that scored score, 1 for the
+        best. Waits for the count of the games ahead, the game uses
+        request_rank() instead.
+        """
+        with self._read_lock:
+            return _rank(self._reader, score)
+
+    def count(self):
+        with self._read_lock:
+            (count,) = self._reader.execute("SELECT count(*) FROM sessions").fetchone()
+        return count or 0
+
+    def close(self):
+        """
+        Write what is still waiting and stop the writer thread
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        self._reader.close()
+
+    def _write(self, connection, rows):
+        try:
+            with connection:
+                connection.executemany(INSERT, rows)
+            self.written += len(rows)
+        except Exception as error:
+            self.failed += len(rows)
+            self.error = error
+
+    def _run(self):
+        connection = connect(self.path)
+        rows = []
+        deadline = None
+        try:
+            while True:
+                try:
+                    if deadline is None:
+                        item = self._queue.get()
+                    else:
+                        item = self._queue.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    item = None
+
+                if isinstance(item, tuple):
+                    rows.append(item)
+                    if deadline is None:
+                        deadline = time.perf_counter() + self.flush_interval
+                    if len(rows) < self.batch_size:
+                        continue
+                    item = None
+
+                # time is up, the batch is full or something waits for it
+                if rows:
+                    self._write(connection, rows)
+                    rows = []
+                deadline = None
+
+                if item is _STOP:
+                    break
+                # a request that fails must not stop the writer, or flush()
+                # would wait forever and what is queued after it be lost
+                if item is not None:
+                    try:
+                        item(connection)
+                    except Exception as error:
+                        self.error = error
+        finally:
+            connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print the best games.")
+    parser.add_argument("path", nargs="?", default=SCORES_PATH, help="scores database")
+    parser.add_argument("--top", type=int, default=LEADERBOARD_SIZE, help="games listed")
+    args = parser.parse_args()
+
+    store = ScoreStore(args.path)
+    print("{:>4} {:>8} {:>6} {:>8} {:>7} {:>7} {:>20}".format(
+        "rank", "score", "level", "seconds", "damage", "dashes", "played"
+    ))
+    for rank, row in enumerate(store.top(args.top), 1):
+        print("{:>4} {:>8} {:>6} {:>8.1f} {:>7} {:>7} {:>20}".format(
+            rank, row.score, row.level, row.duration, row.damage_events, row.dashes,
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row.started_at)),
+        ))
+    print("{} games recorded".format(store.count()))
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Headless game server.
+
+GameServer runs the only GameSimulation of a networked game at a fixed
+rate and streams its state to any number of clients over UDP, in the wire
+format of netcode.py. The first client that asks to fly gets the ship, in
+a co-op game the second one the wingman, and everyone else watches. A
+client that goes quiet for NET_CLIENT_TIMEOUT seconds is dropped, and its
+ship is free for the next one to ask.
+
+    python server.py --port 7777
+    python my_game.py --connect 127.0.0.1:7777
+    python my_game.py --connect 127.0.0.1:7777 --spectate
+    python server.py --port 7777 --co-op
+
+--latency, --jitter and --loss make the server's own packets late and
+lost, to see how the game holds up on a bad network.
+"""
+
+import argparse
+import collections
+import itertools
+import time
+
+from constants import (
+    SIMULATION_RATE, NET_PORT, NET_SEND_EVERY, NET_CLIENT_TIMEOUT, NET_HISTORY, NET_MAX_CLIENTS,
+)
+from netcode import (
+    HELLO, WELCOME, INPUT, BYE, PILOT, SPECTATOR, WINGMAN, HELLO_BODY, WELCOME_BODY, PACKET_OVERHEAD,
+    ProtocolError, LossySocket, WireState, header, movement_steps, packet_kind, receive, state_packets,
+    udp_socket, unpack, unpack_input,
+)
+from simulation import GameSimulation, InputState, NO_INPUT
+
+ROLE_NAMES = {PILOT: "pilot", SPECTATOR: "spectator", WINGMAN: "wingman"}
+
+
+class ClientConnection:
+    """
+    What the server knows about one client
+    """
+
+    __slots__ = (
+        "id", "address", "role", "last_heard", "sequence", "presses", "inputs", "action", "ack",
+        "bytes_sent", "packets_sent", "states_sent", "full_states",
+    )
+
+    def __init__(self, id, address, role, now):
+        self.id = id
+        self.address = address
+        self.role = role
+        self.last_heard = now
+        # newest input packet taken and the action presses it counted
+        self.sequence = 0
+        self.presses = 0
+        self.inputs = NO_INPUT
+        # an action press not yet stepped
+        self.action = False
+        # newest state the client acknowledged, None before the first
+        self.ack = None
+
+        self.bytes_sent = 0
+        self.packets_sent = 0
+        self.states_sent = 0
+        self.full_states = 0
+
+
+class GameServer:
+    """
+    Steps a GameSimulation and streams its state to the clients
+    """
+
+    def __init__(self, simulation, sock=None, rate=SIMULATION_RATE, send_every=NET_SEND_EVERY,
+                 timeout=NET_CLIENT_TIMEOUT, max_clients=NET_MAX_CLIENTS, clock=time.perf_counter):
+        """
+        sock is a bound non-blocking UDP socket, or a LossySocket around
+        one, a new one on a free localhost port by default. A state is
+        sent every send_every steps of 1 / rate seconds. clock gives the
+        time clients time out by.
+        """
+        self.simulation = simulation
+        self.sock = udp_socket() if sock is None else sock
+        self.rate = rate
+        self.step_time = 1 / rate
+        self.send_every = send_every
+        self.timeout = timeout
+        self.max_clients = max_clients
+        self.clock = clock
+
+        self.clients = {}
+        self.pilot = None
+        # the client flying the wingman of a co-op game
+        self.wingman = None
+        self._ids = itertools.count(1)
+        # states sent lately by tick, what the clients acknowledge and the
+        # next ones are sent as differences to
+        self.history = collections.OrderedDict()
+
+        self.bad_packets = 0
+
+    @property
+    def address(self):
+        return self.sock.getsockname()
+
+    def poll(self):
+        """
+        Take the packets the clients sent and drop the ones gone quiet
+        """
+        for packet, address in receive(self.sock):
+            try:
+                self._handle(packet, address)
+            except ProtocolError:
+                self.bad_packets += 1
+
+        now = self.clock()
+        for client in [client for client in self.clients.values() if now - client.last_heard > self.timeout]:
+            self._drop(client)
+
+    def _handle(self, packet, address):
+        kind = packet_kind(packet)
+        client = self.clients.get(address)
+        if kind == HELLO:
+            (role,) = unpack(HELLO_BODY, packet)
+            if client is None:
+                if len(self.clients) >= self.max_clients:
+                    return
+                if role == PILOT and self.pilot is None:
+                    client = self.pilot = ClientConnection(next(self._ids), address, PILOT, self.clock())
+                elif role == PILOT and self.simulation.co_op and self.wingman is None:
+                    client = self.wingman = ClientConnection(next(self._ids), address, WINGMAN, self.clock())
+                else:
+                    client = ClientConnection(next(self._ids), address, SPECTATOR, self.clock())
+                self.clients[address] = client
+            # sent for every hello, the last welcome may have been lost
+            self._send(client, header(WELCOME) + WELCOME_BODY.pack(
+                client.id, client.role, self.rate, self.send_every
+            ))
+            return
+
+        if client is None:
+            return
+        client.last_heard = self.clock()
+        if kind == INPUT:
+            sequence, ack, presses, inputs = unpack_input(packet)
+            if ack is not None and (client.ack is None or ack > client.ack):
+                client.ack = ack
+            if sequence <= client.sequence:
+                # came in late, a newer input was taken already
+                return
+            client.sequence = sequence
+            if client is self.pilot or client is self.wingman:
+                if presses != client.presses:
+                    client.action = True
+                client.presses = presses
+                client.inputs = inputs
+        elif kind == BYE:
+            self._drop(client)
+
+    def _drop(self, client):
+        del self.clients[client.address]
+        if client is self.pilot:
+            self.pilot = None
+        elif client is self.wingman:
+            self.wingman = None
+
+    def _send(self, client, packet):
+        self.sock.sendto(packet, client.address)
+        client.bytes_sent += len(packet) + PACKET_OVERHEAD
+        client.packets_sent += 1
+
+    def _inputs_of(self, client):
+        """
+        The input to step client's ship with, with a press not yet stepped
+        as the action
+        """
+        if client is None:
+            return NO_INPUT
+        inputs = client.inputs
+        if client.action:
+            client.action = False
+            inputs = InputState(
+                inputs.left, inputs.right, inputs.up, inputs.down, True, inputs.joystick_x, inputs.joystick_y,
+                inputs.fire,
+            )
+        return inputs
+
+    def step(self):
+        """
+        Step the simulation with the input of the pilot, and the wingman's
+        in co-op, and send the state if it is time to
+        """
+        self.simulation.step(self.step_time, self._inputs_of(self.pilot), self._inputs_of(self.wingman))
+        if self.simulation.tick % self.send_every == 0:
+            self.send_state()
+
+    def send_state(self):
+        """
+        Send every client the current state, as a difference to the newest
+        one it acknowledged if that is still kept
+        """
+        state = WireState.of(self.simulation)
+        history = self.history
+        history[state.tick] = state
+        while len(history) > NET_HISTORY:
+            history.popitem(last=False)
+
+        # clients that acknowledged the same state get the same packets
+        packets = {}
+        for client in self.clients.values():
+            base = None if client.ack is None else history.get(client.ack)
+            base_tick = None if base is None else base.tick
+            if base_tick not in packets:
+                if base is None:
+                    data = state.encode()
+                else:
+                    data = state.encode(base, movement_steps(state.tick - base.tick, self.rate))
+                packets[base_tick] = state_packets(state.tick, base_tick, data)
+            for packet in packets[base_tick]:
+                self._send(client, packet)
+            client.states_sent += 1
+            if base is None:
+                client.full_states += 1
+
+    def stats(self):
+        return {
+            "clients": len(self.clients),
+            "pilot": None if self.pilot is None else self.pilot.id,
+            "wingman": None if self.wingman is None else self.wingman.id,
+            "bytes_sent": sum(client.bytes_sent for client in self.clients.values()),
+            "bad_packets": self.bad_packets,
+        }
+
+    def close(self):
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the game for networked clients.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on, 0.0.0.0 for every one")
+    parser.add_argument("--port", type=int, default=NET_PORT)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--rate", type=int, default=SIMULATION_RATE, help="simulation steps per second")
+    parser.add_argument("--send-every", type=int, default=NET_SEND_EVERY, help="steps per state sent")
+    parser.add_argument("--shooting", action="store_true", help="let the ships fire at the meteors")
+    parser.add_argument("--ufos", action="store_true", help="add flocks of UFOs chasing the player")
+    parser.add_argument("--world", action="store_true", help="scroll through a world many screens big")
+    parser.add_argument("--co-op", action="store_true", help="let a second client fly a wingman")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every packet sent is held back")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds, at random")
+    parser.add_argument("--loss", type=float, default=0.0, help="fraction of the packets sent that are lost")
+    parser.add_argument("--stats-every", type=float, default=5.0, help="seconds between bandwidth reports")
+    args = parser.parse_args()
+    if args.co_op and args.world:
+        parser.error("co-op is played on a single screen, not in a world")
+
+    sock = udp_socket((args.host, args.port))
+    if args.latency or args.jitter or args.loss:
+        sock = LossySocket(sock, args.latency, args.jitter, args.loss)
+    simulation = GameSimulation(
+        seed=args.seed, level_thread=True, shooting=args.shooting, ufos=args.ufos, world=args.world,
+        co_op=args.co_op,
+    )
+    server = GameServer(simulation, sock, args.rate, args.send_every)
+    print("serving seed {} on {}:{}".format(simulation.seed, *server.address))
+
+    step_time = server.step_time
+    next_step = time.perf_counter()
+    next_report = next_step + args.stats_every
+    sent = {}
+    try:
+        while True:
+            server.poll()
+            server.step()
+            now = time.perf_counter()
+            if now >= next_report:
+                for client in server.clients.values():
+                    rate = (client.bytes_sent - sent.get(client.id, 0)) / args.stats_every / 1024
+                    sent[client.id] = client.bytes_sent
+                    print("client {} {}: {:.1f} KB/s, {} of {} states full".format(
+                        client.id, ROLE_NAMES[client.role], rate,
+                        client.full_states, client.states_sent,
+                    ))
+                next_report += args.stats_every
+            next_step += step_time
+            delay = next_step - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_step = time.perf_counter()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        simulation.close()
+
+
+if __name__ == "__main__":
+    main()
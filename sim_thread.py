@@ -0,0 +1,348 @@
+"""
+Running the simulation on its own thread.
+
+SimulationThread steps a GameSimulation at a fixed rate away from the
+window's event loop, so a heavy step does not hold up drawing or input.
+The two threads share no mutable state:
+
+* input goes to the simulation through a deque, whose append and popleft
+  are atomic, so the event loop never waits on a lock to hand it over
+* anything else that has to touch the simulation, like restoring a save
+  state, is handed over the same way, as a function the simulation thread
+  calls in between two steps
+* so are the draw times for the load governor, which only the simulation
+  thread updates, and it publishes the governor's state in the snapshots
+* after every step the simulation thread builds a new read-only Snapshot of
+  everything drawing needs while the window keeps drawing the previous
+  one, then publishes it by swapping a single reference
+
+A snapshot also carries the positions from before its step, so the window
+can draw in between steps just like the single threaded loop does.
+"""
+
+import collections
+import threading
+import time
+
+from constants import SIMULATION_RATE, MAX_STEPS_PER_FRAME
+from scores import COUNTERS
+from simulation import InputState, NO_INPUT
+from timestep import Interpolation
+
+
+def _frozen(values):
+    values = values.copy()
+    values.setflags(write=False)
+    return values
+
+
+class PlayerSnapshot:
+    """
+    The parts of a PlayerState that are drawn
+    """
+
+    __slots__ = ("center_x", "center_y", "angle", "alpha", "taking_damage_timer", "player_lives", "score")
+
+    def __init__(self, player):
+        for name in self.__slots__:
+            setattr(self, name, getattr(player, name))
+
+
+class PowerUpSnapshot:
+    """
+    The parts of a PowerUpState that are drawn
+    """
+
+    __slots__ = ("center_x", "center_y", "kind")
+
+    def __init__(self, power_up):
+        for name in self.__slots__:
+            setattr(self, name, getattr(power_up, name))
+
+
+class ObstacleSnapshot:
+    """
+    Read-only copy of the slots of an ObstacleField, drawn like the field
+    """
+
+    __slots__ = ("size", "alive", "generation", "type", "scale", "center_x", "center_y", "angle", "alpha")
+
+    def __init__(self, field):
+        size = field.size
+        self.size = size
+        for name in self.__slots__[1:]:
+            setattr(self, name, _frozen(getattr(field, name)[:size]))
+
+
+class ShotSnapshot:
+    """
+    Read-only copy of the live shots of a ProjectilePool
+    """
+
+    __slots__ = ("count", "center_x", "center_y", "change_x", "change_y", "angle")
+
+    def __init__(self, shots):
+        count = shots.count
+        self.count = count
+        for name in self.__slots__[1:]:
+            setattr(self, name, _frozen(getattr(shots, name)[:count]))
+
+
+class FlockSnapshot:
+    """
+    Read-only copy of the UFOs of a Flock
+    """
+
+    __slots__ = ("count", "center_x", "center_y", "change_x", "change_y", "color")
+
+    def __init__(self, flock):
+        count = flock.count
+        self.count = count
+        for name in self.__slots__[1:]:
+            setattr(self, name, _frozen(getattr(flock, name)[:count]))
+
+
+class ParticleSnapshot:
+    """
+    Read-only copy of the particles of a ParticlePool
+    """
+
+    __slots__ = ("count", "center_x", "center_y", "change_x", "change_y", "angle", "alpha", "kind", "frame")
+
+    def __init__(self, particles):
+        count = particles.count
+        self.count = count
+        for name in self.__slots__[1:]:
+            setattr(self, name, _frozen(getattr(particles, name)[:count]))
+
+
+def _between(ship, position, alpha):
+    """
+    Where to draw ship, alpha of the way from position before the step
+    """
+    if position is None:
+        return ship.center_x, ship.center_y, ship.angle
+    x, y, angle = position
+    return (
+        x + (ship.center_x - x) * alpha,
+        y + (ship.center_y - y) * alpha,
+        angle + (ship.angle - angle) * alpha,
+    )
+
+
+class Snapshot:
+    """
+    What the window needs to draw one step of the game, and to record it
+    with a scores.Session
+    """
+
+    __slots__ = (
+        "tick", "time", "mode", "player", "wingman", "obstacles", "shots", "ufos", "particles", "power_ups",
+        "level_timer", "current_level", "final_score", "world_size", "load_state", "previous", "same_player",
+        "same_wingman", "seed", "final_level", "shooting", "ufos_enabled",
+    ) + COUNTERS
+
+    def __init__(self, simulation, previous=None, power_ups=None, load_state=None):
+        """
+        previous is an Interpolation captured right before the step.
+        power_ups maps the PowerUpStates of the last snapshot to their
+        PowerUpSnapshots, which are reused for as long as a power up is
+        there, so the window keeps drawing it with the same sprite, and is
+        updated to this one's. load_state is the state of the load
+        governor, if any.
+        """
+        self.time = time.perf_counter()
+        self.tick = simulation.tick
+        self.mode = simulation.mode
+        self.player = None if simulation.player is None else PlayerSnapshot(simulation.player)
+        self.wingman = None if simulation.wingman is None else PlayerSnapshot(simulation.wingman)
+        self.obstacles = ObstacleSnapshot(simulation.obstacles)
+        self.shots = ShotSnapshot(simulation.shots)
+        self.ufos = FlockSnapshot(simulation.ufos)
+        self.particles = ParticleSnapshot(simulation.particles)
+        # power ups never move once spawned, so a copy stays right as long
+        # as the power up is alive
+        known = {} if power_ups is None else power_ups
+        current = {
+            power_up: known.get(power_up) or PowerUpSnapshot(power_up)
+            for power_up in simulation.power_ups if power_up.alive
+        }
+        if power_ups is not None:
+            power_ups.clear()
+            power_ups.update(current)
+        self.power_ups = tuple(current.values())
+        self.level_timer = simulation.level_timer
+        self.current_level = simulation.current_level
+        self.final_score = simulation.final_score
+        self.world_size = simulation.world_size
+        self.load_state = load_state
+        self.seed = simulation.seed
+        self.final_level = simulation.final_level
+        self.shooting = simulation.shooting
+        self.ufos_enabled = simulation.ufos_enabled
+        for name in COUNTERS:
+            setattr(self, name, getattr(simulation, name))
+
+        self.previous = previous
+        self.same_player = previous is not None and previous.player is simulation.player
+        self.same_wingman = (
+            previous is not None and simulation.wingman is not None and previous.wingman is simulation.wingman
+        )
+
+    def alpha(self, step_time):
+        """
+        How far drawing now is from this step to the next, 0 to 1
+        """
+        return min((time.perf_counter() - self.time) / step_time, 1.0)
+
+    def player_at(self, alpha):
+        return _between(self.player, self.previous.player_position if self.same_player else None, alpha)
+
+    def wingman_at(self, alpha):
+        return _between(self.wingman, self.previous.wingman_position if self.same_wingman else None, alpha)
+
+    def obstacles_at(self, alpha):
+        obstacles = self.obstacles
+        if self.previous is None:
+            return obstacles.center_x, obstacles.center_y, obstacles.angle
+        return self.previous.obstacles_at(obstacles, alpha)
+
+
+class SimulationThread:
+    """
+    Steps a GameSimulation at rate steps per second on a thread of its own
+    """
+
+    def __init__(self, simulation, rate=SIMULATION_RATE, recorder=None, max_steps=MAX_STEPS_PER_FRAME,
+                 governor=None, rewind=None):
+        """
+        Every step is recorded with recorder if given, and kept to rewind
+        to by rewind, a RewindBuffer, if given. When the thread falls more
+        than max_steps behind it skips ahead instead of catching up. A
+        LoadGovernor, if given, gets the time of every step and the draw
+        times handed over with record_draw, and sets the limits of the next
+        step.
+        """
+        self.simulation = simulation
+        self.step_time = 1 / rate
+        self.recorder = recorder
+        self.max_steps = max_steps
+        self.governor = governor
+        self.rewind = rewind
+
+        self.inputs = collections.deque()
+        self.calls = collections.deque()
+        self.draw_times = collections.deque()
+        # the PowerUpSnapshots of the last snapshot, only used by the
+        # simulation thread once it runs
+        self._power_ups = {}
+        self.snapshot = self._snapshot()
+
+        # steps skipped because the thread fell behind
+        self.skipped_steps = 0
+
+        self._held = NO_INPUT
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="simulation", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop stepping and wait for the thread to finish its step
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def send(self, inputs):
+        """
+        Hand the current input to the simulation, from any thread
+        """
+        self.inputs.append(inputs)
+
+    def record_draw(self, seconds):
+        """
+        Hand the time a frame took to draw to the governor, from any thread
+        """
+        self.draw_times.append(seconds)
+
+    def call(self, function):
+        """
+        Have function(simulation) called in between two steps, from any
+        thread
+        """
+        self.calls.append(function)
+
+    def _next_inputs(self):
+        """
+        The newest input sent, with the action set if any input since the
+        last step had it
+        """
+        inputs = self._held
+        action = False
+        queue = self.inputs
+        while queue:
+            inputs = queue.popleft()
+            action = action or inputs.action
+        self._held = inputs
+        if action != inputs.action:
+            inputs = InputState(
+                inputs.left, inputs.right, inputs.up, inputs.down, action,
+                inputs.joystick_x, inputs.joystick_y, inputs.fire,
+            )
+        elif inputs.action:
+            # the held state must not dash again next step
+            self._held = InputState(
+                inputs.left, inputs.right, inputs.up, inputs.down,
+                joystick_x=inputs.joystick_x, joystick_y=inputs.joystick_y, fire=inputs.fire,
+            )
+        return inputs
+
+    def _snapshot(self, previous=None):
+        governor = self.governor
+        return Snapshot(
+            self.simulation, previous, self._power_ups, None if governor is None else governor.state
+        )
+
+    def _run(self):
+        simulation = self.simulation
+        step_time = self.step_time
+        governor = self.governor
+        next_step = time.perf_counter()
+
+        while not self._stop.is_set():
+            if self.calls:
+                while self.calls:
+                    self.calls.popleft()(simulation)
+                # whatever the calls changed is not in between two steps
+                self.snapshot = self._snapshot()
+
+            start = time.perf_counter()
+            if governor is not None:
+                draw_times = self.draw_times
+                while draw_times:
+                    governor.record_draw(draw_times.popleft())
+                governor.apply(simulation, step_time)
+            inputs = self._next_inputs()
+            if self.recorder is not None:
+                self.recorder.record(step_time, inputs, (simulation.obstacle_cap, simulation.refill_per_step))
+
+            previous = Interpolation()
+            previous.capture(simulation)
+            simulation.step(step_time, inputs)
+            if self.rewind is not None:
+                self.rewind.record(simulation)
+            self.snapshot = self._snapshot(previous)
+            if governor is not None:
+                governor.record_update(time.perf_counter() - start)
+
+            next_step += step_time
+            delay = next_step - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif -delay > self.max_steps * step_time:
+                skipped = int(-delay / step_time)
+                self.skipped_steps += skipped
+                next_step += skipped * step_time
@@ -0,0 +1,848 @@
+"""
+Window-free game logic.
+
+Everything that decides what happens in the game lives here: the player,
+the obstacles, the power ups, the level timer, the score and the mode
+transitions. MyGame in my_game.py drives a GameSimulation and only draws
+its state, so the simulation can be stepped without arcade, a window or an
+OpenGL context.
+"""
+
+import math
+import random
+
+import numpy as np
+
+from constants import (
+    SPRITE_SCALING, SCREEN_BOUNDS,
+    PLAYER_LIVES, PLAYER_SPEED_X, PLAYER_SPEED_Y, PLAYER_START_X, PLAYER_START_Y, CO_OP_SPACING,
+    STEP_RATE, OBSTACLE_SPEED, OBSTACLE_HARMLESS_TIME, DASHING_TIME, DASHING_SPEED, DASH_COOLDOWN, LEVEL_TIME,
+    TAKING_DAMAGE_TIME, LIVES_TAKING_DAMAGE, LIVES_GOTTEN_BY_POWER_UP,
+    DASH_ALPHA, POWER_UP_SCALING, POWER_UP_DESPAWN_TIME, POWER_UP_RESPAWN_TIME,
+    SCORE_GOTTEN_BY_POWER_UP, START_NUMBER_OF_OBSTACLES,
+    PLAYER_NORMAL_GRAPHICS, LIFE_UP_GRAPHICS, HIT_BOX_ANGLE_STEP, PLAYER_SHOT_SPEED,
+    SHOT_VOLLEYS_PER_SECOND, SHOTS_PER_VOLLEY, SHOT_SPREAD, SHOT_LIFETIME, SCORE_PER_OBSTACLE_SHOT,
+    UFOS_PER_LEVEL, SCORE_PER_UFO_SHOT, PARTICLES_PER_EXPLOSION, PARTICLES_PER_DAMAGE, PARTICLES_PER_DASH,
+    PARTICLES_PER_DASH_STEP, SHIELD_LIFETIME, SWEEP_MIN_MOVE,
+    IN_START_SCREEN, IN_GAME, DEATH_SCREEN,
+)
+from enemies import Flock, UFO_RADIUS
+from hitboxes import hit_box_cache
+from images import image_size
+from level_generator import LevelGenerator, SpawnScheduler
+from obstacle_field import ObstacleField, MAX_OBSTACLE_STEP
+from particles import ParticlePool, SHIELD
+from profiling import NULL_PROFILER
+from timers import TimerWheel
+from world import ChunkedWorld
+from projectiles import ProjectilePool, volley_angles, volleys_due
+
+OBSTACLE_MAX_SPEED = 3
+
+# angle the player turns to for each direction of movement
+WANTED_ANGLES = {
+    (1, 0): -90,
+    (1, 1): -45,
+    (0, 1): 0,
+    (-1, 0): 90,
+    (0, -1): 180,
+    (-1, -1): 225,
+    (-1, 1): 45,
+    (1, -1): -135,
+}
+
+LIFE_UP = "life_up"
+SCORE_UP = "score_up"
+
+
+def _sign(value):
+    return (value > 0) - (value < 0)
+
+
+class InputState:
+    """
+    The input for a single simulation step
+    """
+
+    __slots__ = ("left", "right", "up", "down", "action", "joystick_x", "joystick_y", "fire")
+
+    def __init__(self, left=False, right=False, up=False, down=False, action=False,
+                 joystick_x=None, joystick_y=None, fire=False):
+        self.left = left
+        self.right = right
+        self.up = up
+        self.down = down
+        # the dash / start key was pressed since the last step
+        self.action = action
+        # joystick axes, None when no joystick is connected
+        self.joystick_x = joystick_x
+        self.joystick_y = joystick_y
+        # the fire key is held, in games with shooting
+        self.fire = fire
+
+
+NO_INPUT = InputState()
+
+
+class PlayerState:
+    """
+    The player
+    """
+
+    __slots__ = (
+        "center_x", "center_y", "change_x", "change_y", "angle", "wanted_angle",
+        "alpha", "half_width", "half_height", "radius", "damage_timer",
+        "player_lives", "score", "is_dashing", "dash_timer", "dash_cooldown_timer", "bounds", "timers",
+    )
+
+    def __init__(self, timers, center_x=PLAYER_START_X, center_y=PLAYER_START_Y, bounds=SCREEN_BOUNDS):
+        """
+        Setup new PlayerState object, kept inside bounds, the (left,
+        bottom, right, top) of the playfield. Dashes and recovering from
+        damage end through timers on the TimerWheel timers.
+        """
+        self.timers = timers
+        self.bounds = bounds
+        width, height = image_size(PLAYER_NORMAL_GRAPHICS)
+        self.half_width = width * SPRITE_SCALING / 2
+        self.half_height = height * SPRITE_SCALING / 2
+        # circle standing in for the hit box of the sprite
+        self.radius = (self.half_width + self.half_height) / 2
+
+        self.center_x = center_x
+        self.center_y = center_y
+        self.change_x = 0
+        self.change_y = 0
+        self.angle = 0
+        self.wanted_angle = 0
+        self.alpha = 255
+
+        self.player_lives = PLAYER_LIVES
+        self.score = 0
+
+        self.is_dashing = False
+        # pending Timers, None when nothing is pending
+        self.damage_timer = None
+        self.dash_timer = None
+        self.dash_cooldown_timer = None
+
+    @property
+    def taking_damage_timer(self):
+        """
+        Seconds left to recover from the last hit
+        """
+        return 0 if self.damage_timer is None else self.damage_timer.time_left
+
+    @property
+    def dashing_time_left(self):
+        return 0 if self.dash_timer is None else self.dash_timer.time_left
+
+    @property
+    def dash_cooldown(self):
+        """
+        Seconds until the next dash, the cooldown only starts when a dash ends
+        """
+        if self.is_dashing:
+            return DASH_COOLDOWN
+        return 0 if self.dash_cooldown_timer is None else self.dash_cooldown_timer.time_left
+
+    def dash(self):
+        """
+        Enable Dashing, True if a dash started
+        """
+        if not self.is_dashing and self.dash_cooldown_timer is None:
+            self.is_dashing = True
+            self.dash_timer = self.timers.after(DASHING_TIME, self._end_dash)
+            self.alpha = DASH_ALPHA
+            return True
+        return False
+
+    def _end_dash(self):
+        self.is_dashing = False
+        self.dash_timer = None
+        self.alpha = 255
+        self.dash_cooldown_timer = self.timers.after(DASH_COOLDOWN, self._end_dash_cooldown)
+
+    def _end_dash_cooldown(self):
+        self.dash_cooldown_timer = None
+
+    def taking_damage(self):
+        """
+        Lose a life unless still recovering from the last hit, True if one
+        was lost
+        """
+        if self.damage_timer is None:
+            self.damage_timer = self.timers.after(TAKING_DAMAGE_TIME, self._recovered)
+            self.player_lives -= LIVES_TAKING_DAMAGE
+            return True
+        return False
+
+    def _recovered(self):
+        self.damage_timer = None
+
+    def resume_timers(self, damage_due=None, dash_due=None, dash_cooldown_due=None):
+        """
+        Schedule the timers of a player restored from a save state for the
+        steps they were due in, None for timers that were not pending
+        """
+        timers = self.timers
+        if damage_due is not None:
+            self.damage_timer = timers.at(damage_due, self._recovered)
+        if dash_due is not None:
+            self.dash_timer = timers.at(dash_due, self._end_dash)
+        if dash_cooldown_due is not None:
+            self.dash_cooldown_timer = timers.at(dash_cooldown_due, self._end_dash_cooldown)
+
+    def cancel_timers(self):
+        """
+        Stop the pending timers, for a player that left the game
+        """
+        for timer in (self.damage_timer, self.dash_timer, self.dash_cooldown_timer):
+            if timer is not None:
+                timer.cancel()
+
+    def getting_life(self, number_of_lives):
+        self.player_lives += number_of_lives
+
+    def update(self, delta_time):
+        """
+        Move the player
+        """
+        # speeds are per step at STEP_RATE
+        steps = delta_time * STEP_RATE
+
+        self.angle -= (self.angle - self.wanted_angle) / 10 * steps
+
+        if self.is_dashing:
+            steps *= DASHING_SPEED
+        self.center_x += self.change_x * steps
+        self.center_y += self.change_y * steps
+
+        # Don't let the player move off-screen, or out of the world
+        left, bottom, right, top = self.bounds
+        if self.center_x - self.half_width < left:
+            self.center_x = left + self.half_width
+        elif self.center_x + self.half_width > right - 1:
+            self.center_x = right - 1 - self.half_width
+        elif self.center_y + self.half_height > top - 1:
+            self.center_y = top - 1 - self.half_height
+        elif self.center_y - self.half_height < bottom:
+            self.center_y = bottom + self.half_height
+
+
+class PowerUpState:
+    """
+    A pill the player can pick up
+    """
+
+    __slots__ = ("center_x", "center_y", "kind", "despawn_timer", "radius", "alive")
+
+    def __init__(self, rng, timers, bounds=SCREEN_BOUNDS, saved=None):
+        """
+        A power up somewhere in bounds that despawns through a timer on
+        the TimerWheel timers. saved is the (center_x, center_y, kind,
+        step it despawns in) of a power up restored from a save state,
+        which rolls nothing.
+        """
+        width, height = image_size(LIFE_UP_GRAPHICS)
+        self.radius = (width + height) * POWER_UP_SCALING / 4
+        self.alive = True
+
+        if saved is not None:
+            self.center_x, self.center_y, self.kind, despawn_due = saved
+            self.despawn_timer = timers.at(despawn_due, self.despawn)
+            return
+
+        left, bottom, right, top = bounds
+        self.center_x = rng.randint(int(left), int(right))
+        self.center_y = rng.randint(int(bottom), int(top))
+        self.kind = rng.choice([LIFE_UP, SCORE_UP])
+        self.despawn_timer = timers.after(POWER_UP_DESPAWN_TIME, self.despawn)
+
+    @property
+    def power_up_despawn_cooldown(self):
+        return self.despawn_timer.time_left
+
+    def despawn(self):
+        """
+        Remove the power up, cancelling its timer if it is still pending
+        """
+        self.alive = False
+        self.despawn_timer.cancel()
+
+    def apply(self, player, team=None):
+        """
+        Give player what the power up holds, a score up goes to team, the
+        ship keeping the score of a co-op game, if given
+        """
+        if self.kind == SCORE_UP:
+            (player if team is None else team).score += SCORE_GOTTEN_BY_POWER_UP
+        else:
+            player.getting_life(LIVES_GOTTEN_BY_POWER_UP)
+
+
+class Difficulty:
+    """
+    The numbers that decide how hard the game is
+    """
+
+    __slots__ = (
+        "obstacle_speed", "level_time", "obstacle_harmless_time",
+        "start_number_of_obstacles", "obstacle_growth",
+    )
+
+    def __init__(self, obstacle_speed=OBSTACLE_SPEED, level_time=LEVEL_TIME,
+                 obstacle_harmless_time=OBSTACLE_HARMLESS_TIME,
+                 start_number_of_obstacles=START_NUMBER_OF_OBSTACLES, obstacle_growth=1):
+        """
+        Every new level adds obstacle_growth times the number of the level
+        before it to the number of obstacles
+        """
+        self.obstacle_speed = obstacle_speed
+        self.level_time = level_time
+        self.obstacle_harmless_time = obstacle_harmless_time
+        self.start_number_of_obstacles = start_number_of_obstacles
+        self.obstacle_growth = obstacle_growth
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def growth(self, level):
+        """
+        Obstacles added when the level after level starts
+        """
+        return int(round(level * self.obstacle_growth))
+
+
+DEFAULT_DIFFICULTY = Difficulty()
+
+
+def _touching(a, b, move_x=0.0, move_y=0.0):
+    """
+    Whether the circles of a and b touch, or touched while a moved by
+    (move_x, move_y) to where it is
+    """
+    dx = a.center_x - move_x - b.center_x
+    dy = a.center_y - move_y - b.center_y
+    speed2 = move_x * move_x + move_y * move_y
+    if speed2 > 0:
+        t = min(max(-(dx * move_x + dy * move_y) / speed2, 0.0), 1.0)
+        dx += move_x * t
+        dy += move_y * t
+    r = a.radius + b.radius
+    return dx * dx + dy * dy < r * r
+
+
+class GameSimulation:
+    """
+    The complete game state, advanced one step at a time with step()
+    """
+
+    def __init__(self, seed=None, level_thread=False, spawn_per_step=None, profiler=NULL_PROFILER,
+                 difficulty=DEFAULT_DIFFICULTY, hit_box_angle_step=HIT_BOX_ANGLE_STEP, shooting=False,
+                 ufos=False, effects=False, world=False, co_op=False):
+        """
+        Initializer
+
+        seed decides everything random in the game, a random one is picked
+        when it is None and kept in self.seed so the game can be replayed.
+        With level_thread the spawn table of the next level is rolled on a
+        worker thread. spawn_per_step limits how many obstacles of a new
+        level are spawned per step, by default all of them at once.
+        profiler times the parts of every step. difficulty replaces the
+        difficulty constants, for tuning them. The player and the obstacles
+        collide by their cached hit boxes, rotated in steps of
+        hit_box_angle_step degrees, or by circles when it is None. With
+        shooting the player fires volleys of shots that break the meteors
+        they hit while the fire input is held. With ufos every level brings a few more UFOs
+        that flock together and chase the player. With effects damage,
+        dashes and anything shot down throw off particles, which are only
+        there to be drawn. With world the game plays in a ChunkedWorld many
+        screens big, with the camera following the player. With co_op a
+        second ship, the wingman, flies along on the input given to step()
+        for it. Each ship has lives of its own and the game goes on until
+        both are out of them, but they play for one score, kept by the
+        first ship. Co-op is played on a single screen, not in a world.
+        """
+        if co_op and world:
+            raise ValueError("co-op is played on a single screen, not in a world")
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(63)
+        self.seed = seed
+        # Every subsystem draws from its own stream split off this one, so
+        # adding a random call to one does not shift the numbers of another
+        self.rng = random.Random(seed)
+        self.power_up_rng = random.Random(self.rng.getrandbits(64))
+        self.profiler = profiler
+        self.difficulty = difficulty
+        self.hit_box_angle_step = hit_box_angle_step
+        self.hit_boxes = None if hit_box_angle_step is None else hit_box_cache(hit_box_angle_step)
+
+        self.mode = None
+        self.tick = 0
+        # every countdown of the game, advanced once per step
+        self.timers = TimerWheel()
+        # pending Timers for the next level and the next power up
+        self.level_up_timer = None
+        self.power_up_timer = None
+
+        self.obstacles = ObstacleField(
+            seed=self.rng.getrandbits(64), harmless_time=difficulty.obstacle_harmless_time, timers=self.timers
+        )
+        self.level_generator = LevelGenerator(seed=self.rng.getrandbits(64), use_thread=level_thread)
+        self.ufos_enabled = ufos
+        self.ufos = Flock(seed=self.rng.getrandbits(64))
+        self.effects = effects
+        # collisions are tested along the paths of the last step, with
+        # False only where things are at the end of it, to compare against
+        self.swept_collisions = True
+        self.particles = ParticlePool(seed=self.rng.getrandbits(64))
+        self.world = ChunkedWorld(seed=self.rng.getrandbits(63)) if world else None
+        self.spawn_scheduler = SpawnScheduler(per_step=spawn_per_step)
+        self.power_ups = []
+        self.shooting = shooting
+        self.shots = ProjectilePool()
+        self.volley_timer = 0.0
+        self.wingman_volley_timer = 0.0
+        self.number_of_obstacles = None
+        self.obstacle_speed = None
+        self.current_level = None
+
+        self.player = None
+        self.co_op = co_op
+        # the second ship of a co-op game, None otherwise
+        self.wingman = None
+
+        # score and level of the last game, set when the ships run out of lives
+        self.final_score = None
+        self.final_level = None
+
+        # what happened in all games so far
+        self.damage_events = 0
+        self.power_ups_picked = 0
+        self.obstacles_shot = 0
+        self.ufos_shot = 0
+        self.dashes = 0
+
+        # limits a LoadGovernor sets to protect the frame rate, None for no
+        # limit: the most obstacles on the field and the most refilled per step
+        self.obstacle_cap = None
+        self.refill_per_step = None
+
+        self.setup()
+
+    def setup(self):
+        """ Set up the game and initialize the variables. """
+        self.mode = IN_START_SCREEN
+
+        self.timers.clear()
+        self.obstacles.clear()
+        self.spawn_scheduler.clear()
+        self.shots.clear()
+        self.volley_timer = 0.0
+        self.wingman_volley_timer = 0.0
+        self.ufos.clear()
+        self.particles.clear()
+        if self.world is not None:
+            self.world.clear(self.obstacles)
+        # creating a power up when you start the game
+        self.power_ups = [PowerUpState(self.power_up_rng, self.timers, self.view_bounds)]
+
+        self.current_level = 0
+        self.obstacle_speed = self.difficulty.obstacle_speed
+        self.number_of_obstacles = self.difficulty.start_number_of_obstacles
+
+        self.level_generator.prepare(self.number_of_obstacles)
+
+    def close(self):
+        """
+        Stop the level generator thread
+        """
+        self.level_generator.close()
+
+    def set_mode(self, new_mode):
+        if self.mode == IN_GAME and new_mode != IN_GAME:
+            # nothing counts down outside of a game but the power ups
+            self.level_up_timer.cancel()
+            self.power_up_timer.cancel()
+            self.player.cancel_timers()
+            if self.wingman is not None:
+                self.wingman.cancel_timers()
+
+        if new_mode == IN_GAME:
+            if self.co_op:
+                self.player = PlayerState(self.timers, PLAYER_START_X - CO_OP_SPACING / 2)
+                self.wingman = PlayerState(self.timers, PLAYER_START_X + CO_OP_SPACING / 2)
+            elif self.world is None:
+                self.player = PlayerState(self.timers)
+            else:
+                world = self.world
+                self.player = PlayerState(self.timers, world.width / 2, world.height / 2, world.bounds)
+                world.follow(self.player.center_x, self.player.center_y, 0)
+            self.shots.clear()
+            self.ufos.clear()
+            self.new_level()
+            self.power_ups.append(PowerUpState(self.power_up_rng, self.timers, self.view_bounds))
+            self.power_up_timer = self.timers.after(POWER_UP_RESPAWN_TIME, self._respawn_power_up)
+
+        self.mode = new_mode
+
+    @property
+    def level_timer(self):
+        """
+        Seconds until the next level, None before the first game
+        """
+        if self.level_up_timer is None:
+            return None
+        return self.level_up_timer.time_left
+
+    def _level_up(self):
+        with self.profiler.section("new_level"):
+            self.new_level()
+
+    def resume_timers(self, level_up_due=None, power_up_due=None):
+        """
+        Schedule the level and power up timers of a game restored from a
+        save state for the steps they were due in, None for timers that
+        were not pending
+        """
+        if level_up_due is not None:
+            self.level_up_timer = self.timers.at(level_up_due, self._level_up)
+        if power_up_due is not None:
+            self.power_up_timer = self.timers.at(power_up_due, self._respawn_power_up)
+
+    def _respawn_power_up(self):
+        self.power_ups.append(PowerUpState(self.power_up_rng, self.timers, self.view_bounds))
+        self.power_up_timer = self.timers.after(POWER_UP_RESPAWN_TIME, self._respawn_power_up)
+
+    def new_level(self):
+        if self.level_up_timer is not None:
+            self.level_up_timer.cancel()
+        self.level_up_timer = self.timers.after(self.difficulty.level_time, self._level_up)
+
+        self.number_of_obstacles += self.difficulty.growth(self.current_level)
+        self.current_level += 1
+
+        # Increases obstacle_speed with 50%
+        self.obstacle_speed *= 1.5
+
+        if self.world is not None:
+            # the chunks around the camera, as dense as a screen of the level
+            self.world.start_level(self.obstacles, self.current_level, self.number_of_obstacles, self.obstacle_cap)
+        else:
+            # swap in the level prepared during the previous one and start
+            # rolling the next
+            self.obstacles.clear()
+            self.spawn_scheduler.start(
+                self.obstacles, self.level_generator.take(self.number_of_obstacles), self.obstacle_cap
+            )
+            self.level_generator.prepare(self.number_of_obstacles + self.difficulty.growth(self.current_level))
+
+        # UFOs shot down in the last level come back with the new ones
+        if self.ufos_enabled:
+            self.ufos.spawn(UFOS_PER_LEVEL * self.current_level - len(self.ufos), self.view_bounds)
+
+    @property
+    def view_bounds(self):
+        """
+        (left, bottom, right, top) of what is on the screen
+        """
+        if self.world is None:
+            return SCREEN_BOUNDS
+        return self.world.view_bounds
+
+    @property
+    def world_size(self):
+        """
+        Width and height of the world, None for a game that fits the screen
+        """
+        if self.world is None:
+            return None
+        return self.world.width, self.world.height
+
+    def step(self, delta_time, inputs=NO_INPUT, wingman_inputs=NO_INPUT):
+        """
+        Advance the game by delta_time seconds, with wingman_inputs for
+        the wingman of a co-op game, who can start the game too
+        """
+        timers = self.timers
+        if timers.active:
+            with self.profiler.section("timers"):
+                timers.advance(delta_time)
+        else:
+            # between games often nothing at all is pending
+            timers.advance(delta_time)
+
+        if inputs.action or wingman_inputs.action:
+            if self.mode == IN_START_SCREEN:
+                self.set_mode(IN_GAME)
+            elif self.mode == IN_GAME:
+                for ship, ship_inputs in ((self.player, inputs), (self.wingman, wingman_inputs)):
+                    if ship_inputs.action and ship is not None and ship.player_lives > 0 and ship.dash():
+                        self.dashes += 1
+                        if self.effects:
+                            self.particles.emit(ship.center_x, ship.center_y, PARTICLES_PER_DASH)
+            elif self.mode == DEATH_SCREEN:
+                self.set_mode(IN_START_SCREEN)
+
+        if self.mode == IN_GAME:
+            self._update_game(delta_time, inputs, wingman_inputs)
+
+        if self.effects:
+            with self.profiler.section("particles"):
+                self.particles.update(delta_time)
+
+        if not all(power_up.alive for power_up in self.power_ups):
+            self.power_ups = [power_up for power_up in self.power_ups if power_up.alive]
+
+        self.tick += 1
+
+    def _update_game(self, delta_time, inputs, wingman_inputs):
+        player = self.player
+        profiler = self.profiler
+        # the ships with lives left and their input, only in co-op can the
+        # player be out while the wingman flies on
+        ships = [
+            (ship, ship_inputs) for ship, ship_inputs in ((player, inputs), (self.wingman, wingman_inputs))
+            if ship is not None and ship.player_lives > 0
+        ]
+        starts = [(ship.center_x, ship.center_y) for ship, _ in ships]
+
+        with profiler.section("player_update"):
+            for ship, ship_inputs in ships:
+                self._move_player(ship, delta_time, ship_inputs)
+
+        if self.effects:
+            for ship, _ in ships:
+                if ship.is_dashing:
+                    # a trail of flames behind the ship
+                    self.particles.emit(
+                        ship.center_x, ship.center_y, PARTICLES_PER_DASH_STEP, angle=ship.angle + 180, spread=40
+                    )
+
+        if self.world is not None:
+            with profiler.section("streaming"):
+                self.world.follow(player.center_x, player.center_y, delta_time)
+                self.world.stream(self.obstacles)
+
+        with profiler.section("spawning"):
+            # add the next part of a staggered level, then any missing obstacles
+            if self.world is not None:
+                wanted = self.world.wanted_obstacles()
+            else:
+                wanted = self.number_of_obstacles
+            if self.obstacle_cap is not None:
+                wanted = min(wanted, self.obstacle_cap)
+                self.spawn_scheduler.limit(wanted - len(self.obstacles))
+            self.spawn_scheduler.step(self.obstacles)
+            missing = wanted - len(self.obstacles) - self.spawn_scheduler.pending
+            if self.refill_per_step is not None:
+                missing = min(missing, self.refill_per_step)
+            self.obstacles.spawn(missing, speed=self.obstacle_speed, spawn_on_edge=True)
+
+        with profiler.section("obstacle_update"):
+            self.obstacles.update(delta_time)
+
+        if self.ufos_enabled:
+            with profiler.section("ufos"):
+                # after the first ship still flying
+                target = ships[0][0]
+                self.ufos.steer(target.center_x, target.center_y, delta_time, self.view_bounds)
+
+        with profiler.section("collisions"):
+            for (ship, _), (start_x, start_y) in zip(ships, starts):
+                if self.swept_collisions:
+                    self._check_for_collisions(ship, start_x, start_y, delta_time * STEP_RATE)
+                else:
+                    self._check_for_collisions(ship, ship.center_x, ship.center_y, 0)
+
+        if self.shooting:
+            with profiler.section("shots"):
+                self._update_shots(delta_time, ships)
+
+        if self.obstacle_speed > OBSTACLE_MAX_SPEED:
+            self.obstacle_speed = OBSTACLE_MAX_SPEED
+
+        # score system: time = more score, as many points per second at any step rate
+        player.score += int((10.0 / STEP_RATE) * 10) * delta_time * STEP_RATE
+
+        if all(ship.player_lives < 1 for ship, _ in ships):
+            self.final_score = int(player.score * 10)
+            self.final_level = self.current_level
+            self.set_mode(DEATH_SCREEN)
+            player.player_lives = PLAYER_LIVES
+            if self.wingman is not None:
+                self.wingman.player_lives = PLAYER_LIVES
+            self.current_level = 0
+
+    def _fire(self, ship, inputs, volley_timer, delta_time):
+        """
+        Fire the volleys of ship due in this step, returns its volley timer
+        """
+        if inputs.fire:
+            volleys, volley_timer = volleys_due(volley_timer, delta_time, SHOT_VOLLEYS_PER_SECOND)
+        else:
+            # pressing fire again fires right away, but never faster than the rate
+            volleys = 0
+            volley_timer = max(volley_timer - delta_time, 0.0)
+        for _ in range(volleys):
+            self.shots.fire(
+                ship.center_x, ship.center_y, volley_angles(ship.angle, SHOTS_PER_VOLLEY, SHOT_SPREAD),
+                PLAYER_SHOT_SPEED, SHOT_LIFETIME,
+            )
+        return volley_timer
+
+    def _update_shots(self, delta_time, ships):
+        player = self.player
+        shots = self.shots
+
+        for ship, ship_inputs in ships:
+            if ship is player:
+                self.volley_timer = self._fire(ship, ship_inputs, self.volley_timer, delta_time)
+            else:
+                self.wingman_volley_timer = self._fire(ship, ship_inputs, self.wingman_volley_timer, delta_time)
+        bounds = self.view_bounds
+        shots.update(delta_time, bounds)
+
+        hits, slots = shots.colliding(self.obstacles, bounds)
+        if len(hits):
+            shots.remove(hits)
+            slots = np.unique(slots)
+            shot_down = len(slots)
+            self._explode(self.obstacles.center_x[slots], self.obstacles.center_y[slots])
+            self.obstacles.split(slots)
+            self.obstacles_shot += shot_down
+            player.score += SCORE_PER_OBSTACLE_SHOT * shot_down
+
+        ufos = self.ufos
+        if len(ufos):
+            hits, shot = shots.colliding_circles(
+                ufos.center_x[:ufos.count], ufos.center_y[:ufos.count], UFO_RADIUS, UFO_RADIUS, bounds
+            )
+            if len(hits):
+                shots.remove(hits)
+                shot = np.unique(shot)
+                shot_down = len(shot)
+                self._explode(ufos.center_x[shot], ufos.center_y[shot])
+                ufos.remove(shot)
+                self.ufos_shot += shot_down
+                player.score += SCORE_PER_UFO_SHOT * shot_down
+
+    def _explode(self, x, y):
+        """
+        Particles flying off everything shot down at the points (x, y)
+        """
+        if self.effects:
+            self.particles.emit(x, y, PARTICLES_PER_EXPLOSION)
+
+    def _damage_player(self, player):
+        if not player.taking_damage():
+            return
+        self.damage_events += 1
+        if self.effects:
+            # flames all around and a flash of the shield, carried along with the player
+            self.particles.emit(
+                player.center_x, player.center_y, PARTICLES_PER_DAMAGE,
+                change_x=player.change_x, change_y=player.change_y,
+            )
+            self.particles.emit(
+                player.center_x, player.center_y, 1, kind=SHIELD, speed=0, lifetime=SHIELD_LIFETIME,
+                angle=player.angle + 180, spread=0, change_x=player.change_x, change_y=player.change_y,
+            )
+
+    def _move_player(self, player, delta_time, inputs):
+
+        # Calculate player speed based on the keys pressed, until then it
+        # is the speed of the last step
+        player.change_x = 0
+        player.change_y = 0
+
+        # Move player with keyboard
+        if inputs.left and not inputs.right:
+            player.change_x = -PLAYER_SPEED_X
+        if inputs.right and not inputs.left:
+            player.change_x = PLAYER_SPEED_X
+        if inputs.up and not inputs.down:
+            player.change_y = PLAYER_SPEED_Y
+        if inputs.down and not inputs.up:
+            player.change_y = -PLAYER_SPEED_Y
+
+        wanted_angle = WANTED_ANGLES.get((_sign(player.change_x), _sign(player.change_y)))
+        if wanted_angle is not None:
+            player.wanted_angle = wanted_angle
+
+        # Move player with joystick if present
+        if inputs.joystick_x is not None:
+            x = round(inputs.joystick_x)
+            y = round(inputs.joystick_y)
+            player.change_x = x * PLAYER_SPEED_X
+            player.change_y = y * PLAYER_SPEED_Y * -1
+            if x == 1:
+                player.angle = -90
+            elif x == -1:
+                player.angle = 90
+            elif y == 1:
+                player.angle = 180
+            elif y == -1:
+                player.angle = 0
+
+        player.update(delta_time)
+
+    def _check_for_collisions(self, player, start_x, start_y, steps):
+        """
+        Find everything the ship player ran into on the way from (start_x,
+        start_y) during the last steps steps, in which the obstacles and
+        UFOs moved too, so nothing slips through between two steps. The
+        obstacles are only swept when they and the player move far enough
+        in a step to slip through each other.
+        """
+        x = player.center_x
+        y = player.center_y
+
+        move_x = x - start_x
+        move_y = y - start_y
+
+        if not player.is_dashing:
+            obstacles = self.obstacles
+            # too slow to slip through a meteor, where everything is now is enough
+            swept = math.hypot(move_x, move_y) + MAX_OBSTACLE_STEP * steps >= SWEEP_MIN_MOVE
+            hit_boxes = self.hit_boxes
+            if hit_boxes is None:
+                if swept:
+                    hits = obstacles.sweeping(start_x, start_y, x, y, player.radius, steps, harmful_only=True)
+                else:
+                    hits = obstacles.colliding(x, y, player.radius, harmful_only=True)
+            else:
+                points, normals = hit_boxes.polygon(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING, player.angle)
+                reach = hit_boxes.reach(PLAYER_NORMAL_GRAPHICS, SPRITE_SCALING)
+                if swept:
+                    hits = obstacles.sweeping_hit_box(
+                        start_x, start_y, x, y, points, normals, reach, hit_boxes, steps, harmful_only=True,
+                    )
+                else:
+                    hits = obstacles.colliding_hit_box(x, y, points, normals, reach, hit_boxes, harmful_only=True)
+            if len(hits):
+                self._damage_player(player)
+
+            # a UFO that rams the player is destroyed
+            rammed = self.ufos.sweeping(start_x, start_y, x, y, player.radius, steps)
+            if len(rammed):
+                self._explode(self.ufos.center_x[rammed], self.ufos.center_y[rammed])
+                self.ufos.remove(rammed)
+                self._damage_player(player)
+
+        # from the middle of the way, power ups further than half of it and
+        # both radii are out of reach
+        middle_x = x - move_x / 2
+        middle_y = y - move_y / 2
+        half_path = math.hypot(move_x, move_y) / 2
+        for power_up in self.power_ups:
+            dx = middle_x - power_up.center_x
+            dy = middle_y - power_up.center_y
+            reach = player.radius + power_up.radius + half_path
+            if dx * dx + dy * dy >= reach * reach:
+                continue
+            if power_up.alive and _touching(player, power_up, move_x, move_y):
+                power_up.apply(player, self.player)
+                power_up.despawn()
+                self.power_ups_picked += 1
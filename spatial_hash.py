@@ -0,0 +1,199 @@
+"""
+Uniform grid broad phase for collision queries.
+
+Entities are put in the grid cell holding their center. A query walks the
+cells within reach of a point and returns the entities found there, so the
+exact collision test only runs on nearby candidates no matter how many
+entities there are in total.
+"""
+
+import itertools
+import math
+
+import numpy as np
+
+# cell coordinates are packed into one integer key per cell
+_OFFSET = 1 << 15
+_STRIDE = 1 << 16
+
+
+class SpatialHash:
+    """
+    Grid of cells holding the slots of the entities whose center is inside.
+
+    The grid is kept up to date incrementally: insert() on spawn, remove()
+    on kill and move() after the entities moved, which only touches the
+    entities that crossed into another cell.
+    """
+
+    def __init__(self, cell_size, margin=0):
+        """
+        margin is added to the reach of every query and should be the
+        largest radius of the entities in the grid, since they are filed
+        by their center only.
+        """
+        self.cell_size = cell_size
+        self._inverse_cell_size = 1 / cell_size
+        self.margin = margin
+        # slots in every cell, keyed by the packed cell coordinates
+        self.buckets = {}
+        # cell key of every slot, -1 for slots not in the grid
+        self.cells = np.full(0, -1, dtype=np.int64)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.cells >= 0))
+
+    def _keys(self, x, y):
+        # floor(x * inverse) is much cheaper than floor_divide on floats
+        cell_x = np.floor(x * self._inverse_cell_size).astype(np.int64)
+        cell_y = np.floor(y * self._inverse_cell_size).astype(np.int64)
+        cell_x += _OFFSET
+        cell_y += _OFFSET
+        cell_x *= _STRIDE
+        cell_x += cell_y
+        return cell_x
+
+    def _ensure_capacity(self, capacity):
+        if capacity > len(self.cells):
+            cells = np.full(max(capacity, len(self.cells) * 2), -1, dtype=np.int64)
+            cells[:len(self.cells)] = self.cells
+            self.cells = cells
+
+    def clear(self):
+        self.buckets.clear()
+        self.cells.fill(-1)
+
+    def insert(self, slots, x, y):
+        """
+        Add the entities in slots, at the positions x and y
+        """
+        if len(slots) == 0:
+            return
+        self._ensure_capacity(int(slots.max()) + 1)
+        keys = self._keys(x, y)
+        self.cells[slots] = keys
+
+        # sorted by cell, every cell's slots are filed in one go, which
+        # matters when a whole field is filed at once, in any order
+        order = np.argsort(keys)
+        keys = keys[order]
+        bounds = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+        starts = [0] + bounds.tolist()
+        ends = bounds.tolist() + [len(keys)]
+        slots = slots[order].tolist()
+        buckets = self.buckets
+        for key, start, end in zip(keys[starts].tolist(), starts, ends):
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = set(slots[start:end])
+            else:
+                bucket.update(slots[start:end])
+
+    def remove(self, slots):
+        """
+        Remove the entities in slots
+        """
+        if len(slots) == 0:
+            return
+        keys = self.cells[slots]
+        buckets = self.buckets
+        for slot, key in zip(slots.tolist(), keys.tolist()):
+            if key >= 0:
+                buckets[key].discard(slot)
+        self.cells[slots] = -1
+
+    def move(self, x, y):
+        """
+        Refile the entities that crossed into another cell.
+
+        x and y hold the new position of every slot, starting at slot 0.
+        """
+        n = len(x)
+        self._ensure_capacity(n)
+        old_keys = self.cells[:n]
+        keys = self._keys(x, y)
+        moved = np.flatnonzero((keys != old_keys) & (old_keys >= 0))
+        if len(moved) == 0:
+            return
+
+        buckets = self.buckets
+        new_keys = keys[moved]
+        for slot, old_key, key in zip(moved.tolist(), old_keys[moved].tolist(), new_keys.tolist()):
+            buckets[old_key].discard(slot)
+            bucket = buckets.get(key)
+            if bucket is None:
+                buckets[key] = {slot}
+            else:
+                bucket.add(slot)
+        self.cells[moved] = new_keys
+
+    def query(self, x, y, radius):
+        """
+        Slots of the entities that could touch a circle
+        """
+        reach = radius + self.margin
+        inverse = self._inverse_cell_size
+        first_x = math.floor((x - reach) * inverse) + _OFFSET
+        last_x = math.floor((x + reach) * inverse) + _OFFSET
+        first_y = math.floor((y - reach) * inverse) + _OFFSET
+        last_y = math.floor((y + reach) * inverse) + _OFFSET
+
+        buckets = self.buckets
+        found = []
+        for cell_x in range(first_x, last_x + 1):
+            row = cell_x * _STRIDE
+            for cell_y in range(first_y, last_y + 1):
+                bucket = buckets.get(row + cell_y)
+                if bucket:
+                    found.append(bucket)
+
+        if not found:
+            return np.zeros(0, dtype=np.intp)
+        return np.fromiter(itertools.chain.from_iterable(found), dtype=np.intp)
+
+
+def grid_pairs(query_x, query_y, x, y, cell_size, bounds):
+    """
+    Candidate pairs between query points and points, for many queries at once.
+
+    The points are counting sorted into a dense grid of cell_size covering
+    bounds, a (left, bottom, right, top) rectangle, with points outside it
+    filed in the border cells, and every query point is paired with the
+    points in its own and the eight neighboring cells. Every pair closer
+    than cell_size is among the candidates. Returns the query indices and the point indices of the
+    pairs, both ordered by query.
+    """
+    if len(query_x) == 0 or len(x) == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+
+    # a ring of empty cells around the grid keeps the neighbors of border
+    # cells in range
+    left, bottom, right, top = bounds
+    columns = int((right - left) // cell_size) + 3
+    rows = int((top - bottom) // cell_size) + 3
+
+    def cells(x, y):
+        inverse = 1 / cell_size
+        cell_x = np.clip(np.floor((x - left) * inverse), 0, columns - 3).astype(np.intp) + 1
+        cell_y = np.clip(np.floor((y - bottom) * inverse), 0, rows - 3).astype(np.intp) + 1
+        return cell_x * rows + cell_y
+
+    point_cells = cells(x, y)
+    order = np.argsort(point_cells, kind="stable")
+    counts = np.bincount(point_cells, minlength=columns * rows)
+    starts = np.cumsum(counts) - counts
+
+    offsets = np.array([dx * rows + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.intp)
+    neighbors = (cells(query_x, query_y)[:, None] + offsets).ravel()
+    run_counts = counts[neighbors]
+    run_starts = starts[neighbors]
+
+    total = int(run_counts.sum())
+    if total == 0:
+        empty = np.zeros(0, dtype=np.intp)
+        return empty, empty
+    queries = np.repeat(np.arange(len(neighbors)) // len(offsets), run_counts)
+    # walk every run of sorted points from its start
+    positions = np.arange(total) - np.repeat(np.cumsum(run_counts) - run_counts - run_starts, run_counts)
+    return queries, order[positions]
@@ -0,0 +1,194 @@
+"""
+Countdowns of the game as timers on a hierarchical timer wheel.
+
+Instead of every player, power up and obstacle counting its own timers
+down every step, whatever has to happen later is scheduled on a
+TimerWheel, keyed by simulation step, which calls it back when its step
+comes. Something with nothing scheduled costs nothing per step, and a
+step costs next to nothing when no timer is due.
+
+The wheel has a few levels of 64 buckets each. The first level holds
+the timers due in the next 64 steps, one bucket per step, the second the
+ones due in the next 64 * 64 steps, one bucket per 64 steps, and so on.
+Scheduling a timer and cancelling it are constant time. When the steps
+wrap around a bucket of a level, the timers in the next bucket of the
+level above are moved down to where they now belong, so every timer is
+only moved once per level on its way down.
+"""
+
+import math
+
+from constants import SIMULATION_RATE
+
+# buckets per level are 2 ** BITS
+BITS = 6
+LEVELS = 4
+BUCKETS = 1 << BITS
+MASK = BUCKETS - 1
+# steps covered by the levels, timers further out wait in an overflow list
+SPAN = 1 << (BITS * LEVELS)
+
+
+class Timer:
+    """
+    A callback scheduled on a TimerWheel, cancelled with cancel()
+    """
+
+    __slots__ = ("wheel", "due", "callback", "args", "pending")
+
+    def __init__(self, wheel, due, callback, args):
+        self.wheel = wheel
+        # step it is due in
+        self.due = due
+        self.callback = callback
+        self.args = args
+        # False once it fired or was cancelled
+        self.pending = True
+
+    def cancel(self):
+        """
+        Make sure the timer does not fire, does nothing if it already did
+        """
+        if self.pending:
+            self.pending = False
+            self.wheel.active -= 1
+            self.wheel.cancelled += 1
+
+    @property
+    def time_left(self):
+        """
+        Seconds until the timer fires, 0 once it did or was cancelled
+        """
+        if not self.pending:
+            return 0
+        return (self.due - self.wheel.now) * self.wheel.step_time
+
+
+class TimerWheel:
+    """
+    Timers due in a later step, fired by advance()
+    """
+
+    def __init__(self, step_time=1 / SIMULATION_RATE):
+        """
+        step_time is the length of a step in seconds until the first call
+        to advance(), which replaces it with the length of the actual steps
+        """
+        self.step_time = step_time
+        # steps advanced so far
+        self.now = 0
+        self.levels = [[[] for _ in range(BUCKETS)] for _ in range(LEVELS)]
+        self.overflow = []
+
+        # timers pending, fired and cancelled so far
+        self.active = 0
+        self.fired = 0
+        self.cancelled = 0
+
+    def __len__(self):
+        return self.active
+
+    def ticks(self, seconds):
+        """
+        Steps that make up at least seconds, and at least one
+        """
+        # the small slack keeps 0.3 s at 60 steps per second at 18 steps
+        return max(math.ceil(seconds / self.step_time - 1e-9), 1)
+
+    def after(self, seconds, callback, *args):
+        """
+        Call callback(*args) once seconds have passed
+        """
+        return self.at(self.now + self.ticks(seconds), callback, *args)
+
+    def at(self, due, callback, *args):
+        """
+        Call callback(*args) in step due, the next step if that is past
+        """
+        timer = Timer(self, max(due, self.now + 1), callback, args)
+        self._insert(timer)
+        self.active += 1
+        return timer
+
+    def _insert(self, timer):
+        delta = timer.due - self.now
+        if delta >= SPAN:
+            self.overflow.append(timer)
+            return
+        level = 0
+        while delta >= 1 << (BITS * (level + 1)):
+            level += 1
+        self.levels[level][(timer.due >> (BITS * level)) & MASK].append(timer)
+
+    def _cascade(self, level):
+        """
+        Move the timers of the current bucket of level down to the levels
+        below
+        """
+        buckets = self.levels[level]
+        index = (self.now >> (BITS * level)) & MASK
+        timers = buckets[index]
+        buckets[index] = []
+        for timer in timers:
+            if timer.pending:
+                self._insert(timer)
+
+    def advance(self, delta_time):
+        """
+        Move on by one step of delta_time seconds and fire the timers due
+        in it. Callbacks may schedule and cancel timers.
+        """
+        self.step_time = delta_time
+        self.now += 1
+        if not self.active:
+            # nothing can fire or needs moving down, what is left in the
+            # buckets was cancelled and is dropped when its bucket comes up
+            return
+        now = self.now
+
+        if now & MASK == 0:
+            # the first level wrapped, find how many levels above did too
+            # and move their timers down, the highest level first
+            level = 1
+            while level < LEVELS - 1 and (now >> (BITS * level)) & MASK == 0:
+                level += 1
+            if level == LEVELS - 1 and now % SPAN == 0 and self.overflow:
+                overflow = self.overflow
+                self.overflow = []
+                for timer in overflow:
+                    if timer.pending:
+                        self._insert(timer)
+            for cascading in range(level, 0, -1):
+                self._cascade(cascading)
+
+        buckets = self.levels[0]
+        timers = buckets[now & MASK]
+        if not timers:
+            return
+        buckets[now & MASK] = []
+        for timer in timers:
+            if timer.pending:
+                timer.pending = False
+                self.active -= 1
+                self.fired += 1
+                timer.callback(*timer.args)
+
+    def clear(self):
+        """
+        Cancel every timer
+        """
+        for buckets in self.levels:
+            for timers in buckets:
+                for timer in timers:
+                    timer.cancel()
+                timers.clear()
+        for timer in self.overflow:
+            timer.cancel()
+        self.overflow = []
+
+    def stats(self):
+        return {
+            "timers": self.active,
+            "fired": self.fired,
+            "cancelled": self.cancelled,
+        }
@@ -0,0 +1,136 @@
+"""
+Fixed timestep game loop helpers.
+
+The window gets frames at whatever rate the machine manages, the
+simulation wants steps of one fixed length. FixedTimestep collects the
+time of the frames and says how many whole steps to run, leaving the rest
+for the next frame. Drawing then happens somewhere between the last two
+steps, and Interpolation remembers the positions before the last step so
+the sprites can be drawn at the point in between that the leftover time
+points to. Nothing in here needs arcade.
+"""
+
+import numpy as np
+
+from constants import SIMULATION_RATE, MAX_STEPS_PER_FRAME
+
+
+class FixedTimestep:
+    """
+    Turns frame times into a number of fixed length simulation steps
+    """
+
+    def __init__(self, rate=SIMULATION_RATE, max_steps=MAX_STEPS_PER_FRAME):
+        """
+        rate is the number of steps per second. At most max_steps are run
+        for one frame, time beyond that is dropped.
+        """
+        self.rate = rate
+        self.step_time = 1 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+
+        # seconds that were dropped because a frame took too long
+        self.dropped_time = 0.0
+
+    def advance(self, delta_time):
+        """
+        Add the time of a frame, return how many steps to simulate for it
+        """
+        self.accumulator += delta_time
+        steps = int(self.accumulator / self.step_time)
+        if steps > self.max_steps:
+            self.dropped_time += self.accumulator - self.max_steps * self.step_time
+            self.accumulator = 0.0
+            return self.max_steps
+        self.accumulator -= steps * self.step_time
+        return steps
+
+    @property
+    def alpha(self):
+        """
+        How far the time drawn is from the last step to the next one, 0 to 1
+        """
+        return min(self.accumulator / self.step_time, 1.0)
+
+
+class Interpolation:
+    """
+    The ship and obstacle positions before the last simulation step
+    """
+
+    def __init__(self):
+        self.player = None
+        self.player_position = None
+        self.wingman = None
+        self.wingman_position = None
+
+        self.size = 0
+        self.generation = np.zeros(0, dtype=np.int64)
+        self.center_x = np.zeros(0)
+        self.center_y = np.zeros(0)
+        self.angle = np.zeros(0)
+
+    def capture(self, simulation):
+        """
+        Remember the positions, call right before stepping
+        """
+        player = simulation.player
+        self.player = player
+        if player is not None:
+            self.player_position = (player.center_x, player.center_y, player.angle)
+        wingman = simulation.wingman
+        self.wingman = wingman
+        if wingman is not None:
+            self.wingman_position = (wingman.center_x, wingman.center_y, wingman.angle)
+
+        field = simulation.obstacles
+        size = field.size
+        if len(self.generation) < size:
+            # grow like the field does, so this rarely allocates
+            capacity = max(size, 2 * len(self.generation))
+            self.generation = np.zeros(capacity, dtype=np.int64)
+            self.center_x = np.zeros(capacity)
+            self.center_y = np.zeros(capacity)
+            self.angle = np.zeros(capacity)
+        self.size = size
+        self.generation[:size] = field.generation[:size]
+        self.center_x[:size] = field.center_x[:size]
+        self.center_y[:size] = field.center_y[:size]
+        self.angle[:size] = field.angle[:size]
+
+    def player_at(self, player, alpha):
+        """
+        Position and angle to draw player at, the player or the wingman
+        """
+        if player is self.player:
+            position = self.player_position
+        elif player is self.wingman:
+            position = self.wingman_position
+        else:
+            position = None
+        if position is None:
+            return player.center_x, player.center_y, player.angle
+        x, y, angle = position
+        return (
+            x + (player.center_x - x) * alpha,
+            y + (player.center_y - y) * alpha,
+            angle + (player.angle - angle) * alpha,
+        )
+
+    def obstacles_at(self, field, alpha):
+        """
+        Positions and angles to draw the slots of field at, obstacles that
+        were not there before the last step are drawn where they are
+        """
+        size = field.size
+        center_x = field.center_x[:size].copy()
+        center_y = field.center_y[:size].copy()
+        angle = field.angle[:size].copy()
+
+        n = min(size, self.size)
+        same = self.generation[:n] == field.generation[:n]
+        for current, previous in ((center_x, self.center_x), (center_y, self.center_y), (angle, self.angle)):
+            before = previous[:n]
+            current[:n] = np.where(same, before + (current[:n] - before) * alpha, current[:n])
+        return center_x, center_y, angle
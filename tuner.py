@@ -0,0 +1,210 @@
+"""
+Monte Carlo difficulty tuning.
+
+Plays many seeded headless games with the DodgingBot for every point of a
+grid of Difficulty settings, spread over a pool of worker processes, and
+sums them up in a table: how long the bot survived, the level it reached,
+how often it was hit and how many power ups it picked up. Every grid point
+plays the same seeds, so differences between rows come from the settings
+and not from luck.
+
+The pool is started once and reused for every grid point and every run of
+a Tuner, so the workers pay for imports and image loading only once:
+
+    python tuner.py --level-time 3.5 5 --obstacle-growth 1 2 --games 500
+"""
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+from constants import IN_GAME
+from simulation import Difficulty, GameSimulation, InputState
+
+DELTA_TIME = 1 / 60
+# games are cut off after this many seconds in game
+MAX_GAME_TIME = 120
+
+START = InputState(action=True)
+
+# the bot of the current worker process
+_bot = None
+
+
+def _init_worker():
+    """
+    Load what every game needs once per worker
+    """
+    global _bot
+    from bot import DodgingBot
+    _bot = DodgingBot()
+    # read the image sizes now instead of in the first game
+    GameSimulation(seed=0).close()
+
+
+def play_game(seed, difficulty, max_time=MAX_GAME_TIME, bot=None):
+    """
+    Let the bot play one game, return what happened in it
+    """
+    if bot is None:
+        from bot import DodgingBot
+        bot = DodgingBot()
+
+    simulation = GameSimulation(seed=seed, difficulty=difficulty)
+    simulation.step(DELTA_TIME, START)
+    max_ticks = int(max_time / DELTA_TIME)
+    ticks = 0
+    while simulation.mode == IN_GAME and ticks < max_ticks:
+        simulation.step(DELTA_TIME, bot.act(simulation))
+        ticks += 1
+    simulation.close()
+
+    survived = simulation.mode == IN_GAME
+    return {
+        "seed": seed,
+        "survived": survived,
+        "survival_time": ticks * DELTA_TIME,
+        "level": simulation.current_level if survived else simulation.final_level,
+        "damage_events": simulation.damage_events,
+        "power_ups_picked": simulation.power_ups_picked,
+    }
+
+
+def _play_batch(task):
+    index, settings, seeds, max_time = task
+    difficulty = Difficulty(**settings)
+    return index, [play_game(seed, difficulty, max_time, _bot) for seed in seeds]
+
+
+def grid(**values):
+    """
+    A Difficulty for every combination of the given values, for example
+    grid(level_time=[3.5, 5], obstacle_growth=[1, 2])
+    """
+    names = list(values)
+    return [Difficulty(**dict(zip(names, combination))) for combination in itertools.product(*values.values())]
+
+
+def summarize(difficulty, games):
+    """
+    One row of the results table
+    """
+    survival = np.array([game["survival_time"] for game in games])
+    row = difficulty.as_dict()
+    row.update({
+        "games": len(games),
+        "survived": float(np.mean([game["survived"] for game in games])),
+        "survival_mean": float(survival.mean()),
+        "survival_p50": float(np.percentile(survival, 50)),
+        "level_mean": float(np.mean([game["level"] for game in games])),
+        "damage_mean": float(np.mean([game["damage_events"] for game in games])),
+        "pickups_mean": float(np.mean([game["power_ups_picked"] for game in games])),
+    })
+    return row
+
+
+class Tuner:
+    """
+    A pool of worker processes playing games for difficulty settings
+    """
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = multiprocessing.Pool(self.workers, initializer=_init_worker)
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def run(self, difficulties, games, first_seed=0, max_time=MAX_GAME_TIME, batch_size=None):
+        """
+        Play games seeded games for every Difficulty, return a results row
+        for each
+        """
+        seeds = list(range(first_seed, first_seed + games))
+        if batch_size is None:
+            # a few batches per worker keeps them all busy until the end
+            batch_size = max(1, min(games, len(difficulties) * games // (self.workers * 4)))
+
+        tasks = [
+            (index, difficulty.as_dict(), seeds[start:start + batch_size], max_time)
+            for index, difficulty in enumerate(difficulties)
+            for start in range(0, games, batch_size)
+        ]
+        results = [[] for _ in difficulties]
+        for index, batch in self.pool.imap_unordered(_play_batch, tasks):
+            results[index].extend(batch)
+        return [summarize(difficulty, games) for difficulty, games in zip(difficulties, results)]
+
+
+COLUMNS = [
+    ("obstacle_speed", "{:>8g}"), ("level_time", "{:>8g}"), ("obstacle_harmless_time", "{:>8g}"),
+    ("start_number_of_obstacles", "{:>6d}"), ("obstacle_growth", "{:>6g}"),
+    ("survived", "{:>8.0%}"), ("survival_mean", "{:>9.1f}"), ("survival_p50", "{:>9.1f}"),
+    ("level_mean", "{:>7.1f}"), ("damage_mean", "{:>7.1f}"), ("pickups_mean", "{:>8.1f}"),
+]
+HEADERS = ["speed", "level s", "harmless", "start", "growth", "survived", "mean s", "p50 s", "level", "hits", "pickups"]
+
+
+def print_table(rows):
+    widths = [len(format.format(0)) for _, format in COLUMNS]
+    print(" ".join("{:>{}}".format(header, width) for header, width in zip(HEADERS, widths)))
+    for row in rows:
+        print(" ".join(format.format(row[name]) for name, format in COLUMNS))
+
+
+def main():
+    defaults = Difficulty()
+    parser = argparse.ArgumentParser(description="Sweep difficulty settings with a bot playing headless games.")
+    parser.add_argument("--obstacle-speed", type=float, nargs="+", default=[defaults.obstacle_speed])
+    parser.add_argument("--level-time", type=float, nargs="+", default=[defaults.level_time])
+    parser.add_argument("--obstacle-harmless-time", type=float, nargs="+", default=[defaults.obstacle_harmless_time])
+    parser.add_argument("--start-number-of-obstacles", type=int, nargs="+",
+                        default=[defaults.start_number_of_obstacles])
+    parser.add_argument("--obstacle-growth", type=float, nargs="+", default=[defaults.obstacle_growth],
+                        help="obstacles added per level, times the level number")
+    parser.add_argument("--games", type=int, default=100, help="games per setting")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("--max-time", type=float, default=MAX_GAME_TIME, help="seconds after which a game is stopped")
+    parser.add_argument("--workers", type=int, help="worker processes, one per core by default")
+    parser.add_argument("--csv", help="also write the results table to this file")
+    args = parser.parse_args()
+
+    difficulties = grid(
+        obstacle_speed=args.obstacle_speed,
+        level_time=args.level_time,
+        obstacle_harmless_time=args.obstacle_harmless_time,
+        start_number_of_obstacles=args.start_number_of_obstacles,
+        obstacle_growth=args.obstacle_growth,
+    )
+
+    with Tuner(args.workers) as tuner:
+        start = time.perf_counter()
+        rows = tuner.run(difficulties, args.games, args.seed, args.max_time)
+        elapsed = time.perf_counter() - start
+
+    print_table(rows)
+    total = len(difficulties) * args.games
+    print("{} games on {} workers in {:.1f} s, {:.1f} games/s".format(total, tuner.workers, elapsed, total / elapsed))
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    main()
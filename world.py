@@ -0,0 +1,219 @@
+"""
+A world many screens big, streamed in chunks around the camera.
+
+The world is cut into square chunks and only the chunks near the screen
+are active: their obstacles are in the ObstacleField and simulated every
+step just like in a game that fits the screen. A chunk the camera leaves
+behind is frozen, its obstacles taken out of the field and put aside, and
+coming back thaws it, moving its obstacles on by the time they spent
+frozen in one go. Only the last few frozen chunks are kept. Any other
+chunk is generated when it becomes active, from the world seed, the level
+and where it is, so the same place always holds the same meteors and
+nothing is stored for the parts of the world nobody looked at. Memory and
+time per step grow with the size of the screen, not of the world.
+"""
+
+import collections
+import math
+import random
+
+import numpy as np
+
+from constants import (
+    SCREEN_WIDTH, SCREEN_HEIGHT, WORLD_WIDTH, WORLD_HEIGHT, CHUNK_SIZE, ACTIVE_CHUNK_MARGIN, FROZEN_CHUNKS,
+)
+from obstacle_field import generate_spawn_table
+
+
+def camera_origin(x, y, world_width, world_height):
+    """
+    Bottom left corner of a screen centered on (x, y), kept inside the world
+    """
+    left = min(max(x - SCREEN_WIDTH / 2, 0), world_width - SCREEN_WIDTH)
+    bottom = min(max(y - SCREEN_HEIGHT / 2, 0), world_height - SCREEN_HEIGHT)
+    return left, bottom
+
+
+class ChunkedWorld:
+    """
+    The obstacles of a world of width by height pixels, streamed into an
+    ObstacleField chunk by chunk as the camera moves
+    """
+
+    def __init__(self, seed=None, width=WORLD_WIDTH, height=WORLD_HEIGHT, chunk_size=CHUNK_SIZE,
+                 margin=ACTIVE_CHUNK_MARGIN, frozen_chunks=FROZEN_CHUNKS):
+        """
+        Chunks within margin pixels of the screen are active. Up to
+        frozen_chunks chunks that became inactive are kept as they were,
+        older ones are generated again from seed.
+        """
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(63)
+        self.seed = seed
+        self.width = width
+        self.height = height
+        self.bounds = (0, 0, width, height)
+        self.chunk_size = chunk_size
+        self.margin = margin
+        self.frozen_chunks = frozen_chunks
+        self.columns = math.ceil(width / chunk_size)
+        self.rows = math.ceil(height / chunk_size)
+
+        self.level = 0
+        # obstacles generated per chunk, for the density of the level
+        self.density = 0
+        self.camera = camera_origin(width / 2, height / 2, width, height)
+        # seconds of game time, to tell how long a chunk was frozen
+        self.time = 0.0
+
+        # first and last column and row of the active chunks, None before streaming
+        self.active = None
+        # (column, row) to (FrozenObstacles, time frozen), oldest first
+        self.frozen = collections.OrderedDict()
+
+        # chunks generated from the seed and chunks thawed
+        self.generated = 0
+        self.thawed = 0
+
+    @property
+    def view_bounds(self):
+        """
+        (left, bottom, right, top) of the screen
+        """
+        left, bottom = self.camera
+        return left, bottom, left + SCREEN_WIDTH, bottom + SCREEN_HEIGHT
+
+    @property
+    def active_bounds(self):
+        """
+        (left, bottom, right, top) of the active chunks, where obstacles are simulated
+        """
+        first_column, first_row, last_column, last_row = self.active
+        size = self.chunk_size
+        return (
+            first_column * size, first_row * size,
+            min((last_column + 1) * size, self.width), min((last_row + 1) * size, self.height),
+        )
+
+    @property
+    def active_chunks(self):
+        if self.active is None:
+            return 0
+        first_column, first_row, last_column, last_row = self.active
+        return (last_column - first_column + 1) * (last_row - first_row + 1)
+
+    def chunk_bounds(self, column, row):
+        size = self.chunk_size
+        return column * size, row * size, min((column + 1) * size, self.width), min((row + 1) * size, self.height)
+
+    def wanted_obstacles(self):
+        """
+        Obstacles the active chunks hold at the density of the level
+        """
+        return self.density * self.active_chunks
+
+    def clear(self, field):
+        """
+        Drop every chunk and center the camera on the world
+        """
+        field.clear()
+        self.active = None
+        self.frozen.clear()
+        self.camera = camera_origin(self.width / 2, self.height / 2, self.width, self.height)
+
+    def start_level(self, field, level, obstacles_per_screen, cap=None):
+        """
+        Replace the obstacles with the chunks of a new level, as dense as a
+        screen of obstacles_per_screen obstacles but with no more than cap
+        obstacles in the active chunks
+        """
+        self.level = level
+        self.density = math.ceil(obstacles_per_screen * self.chunk_size ** 2 / (SCREEN_WIDTH * SCREEN_HEIGHT))
+        field.clear()
+        self.active = None
+        self.frozen.clear()
+        if cap is not None:
+            first_column, first_row, last_column, last_row = self._wanted()
+            chunks = (last_column - first_column + 1) * (last_row - first_row + 1)
+            self.density = min(self.density, cap // chunks)
+        self.stream(field)
+
+    def follow(self, x, y, delta_time):
+        """
+        Center the camera on (x, y), delta_time seconds after the last step
+        """
+        self.camera = camera_origin(x, y, self.width, self.height)
+        self.time += delta_time
+
+    def _wanted(self):
+        left, bottom, right, top = self.view_bounds
+        size = self.chunk_size
+        margin = self.margin
+        return (
+            max(int((left - margin) // size), 0),
+            max(int((bottom - margin) // size), 0),
+            min(int((right + margin) // size), self.columns - 1),
+            min(int((top + margin) // size), self.rows - 1),
+        )
+
+    def stream(self, field):
+        """
+        Freeze the chunks the camera left behind and bring in the ones it
+        got near, then limit the field to the active chunks
+        """
+        wanted = self._wanted()
+        if wanted == self.active:
+            return
+        old = set() if self.active is None else self._chunks(self.active)
+        new = self._chunks(wanted)
+
+        leaving = old - new
+        if leaving:
+            slots = np.flatnonzero(field.alive[:field.size])
+            size = self.chunk_size
+            column = np.clip((field.center_x[slots] // size).astype(np.int64), 0, self.columns - 1)
+            row = np.clip((field.center_y[slots] // size).astype(np.int64), 0, self.rows - 1)
+            keys = column * self.rows + row
+            for chunk in sorted(leaving):
+                in_chunk = slots[keys == chunk[0] * self.rows + chunk[1]]
+                self.frozen[chunk] = (field.freeze(in_chunk), self.time)
+            while len(self.frozen) > self.frozen_chunks:
+                self.frozen.popitem(last=False)
+
+        for chunk in sorted(new - old):
+            frozen = self.frozen.pop(chunk, None)
+            if frozen is None:
+                self._generate(field, *chunk)
+            else:
+                obstacles, frozen_at = frozen
+                field.thaw(obstacles, self.time - frozen_at, self.chunk_bounds(*chunk))
+                self.thawed += 1
+
+        self.active = wanted
+        field.bounds = self.active_bounds
+
+    @staticmethod
+    def _chunks(active):
+        first_column, first_row, last_column, last_row = active
+        return {
+            (column, row)
+            for column in range(first_column, last_column + 1)
+            for row in range(first_row, last_row + 1)
+        }
+
+    def _generate(self, field, column, row):
+        rng = np.random.default_rng((self.seed, self.level, column, row))
+        table = generate_spawn_table(rng, self.density, bounds=self.chunk_bounds(column, row))
+        # spread over the chunk, but harmful right away like the obstacles
+        # coming in from the edges: nobody saw them appear
+        table.spawn_on_edge = True
+        field.materialize(table)
+        self.generated += 1
+
+    def stats(self):
+        return {
+            "active_chunks": self.active_chunks,
+            "frozen_chunks": len(self.frozen),
+            "generated": self.generated,
+            "thawed": self.thawed,
+        }